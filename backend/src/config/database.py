@@ -96,9 +96,54 @@ def init_database(app):
         # Criar tabelas se não existirem
         db.create_all()
         
+        # create_all não altera tabelas existentes: cria colunas e índices novos dos modelos
+        create_missing_columns()
+        create_missing_indexes()
+        
         # Criar dados iniciais
         create_initial_data()
 
+def create_missing_columns():
+    """
+    Adiciona as colunas declaradas nos modelos que ainda não existem no banco
+    
+    Colunas obrigatórias precisam de server_default, que preenche as linhas
+    já existentes.
+    """
+    from sqlalchemy import inspect, text
+    
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or (not column.nullable and column.server_default is None):
+                continue
+            
+            # SQL Server não usa a palavra COLUMN
+            add = 'ADD' if db.engine.dialect.name == 'mssql' else 'ADD COLUMN'
+            ddl = f"ALTER TABLE {table.name} {add} {column.name} {column.type.compile(dialect=db.engine.dialect)}"
+            if column.server_default is not None:
+                ddl += f" DEFAULT {column.server_default.arg}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+            with db.engine.begin() as connection:
+                connection.execute(text(ddl))
+
+def create_missing_indexes():
+    """Cria os índices declarados nos modelos que ainda não existem no banco"""
+    from sqlalchemy import inspect
+    
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+
 def create_initial_data():
     """Cria dados iniciais do sistema"""
     from ..models.user import User
@@ -126,6 +171,10 @@ def create_initial_data():
         ('email_from', 'atendimento@crc-es.org.br', 'Email Remetente'),
         ('whatsapp_profile_path', 'C:\\\\Users\\\\wmariano\\\\AppData\\\\Local\\\\Google\\\\Chrome\\\\User Data', 'Perfil Chrome WhatsApp'),
         ('boletos_folder', 'C:\\\\Users\\\\wmariano\\\\Downloads\\\\ANEXOS', 'Pasta de Boletos'),
+        ('whatsapp_initial_delay', '10', 'Intervalo inicial entre envios WhatsApp (s)'),
+        ('whatsapp_max_rate', '0.2', 'Taxa máxima de envios WhatsApp (por segundo)'),
+        ('email_initial_delay', '2', 'Intervalo inicial entre envios de email (s)'),
+        ('email_max_rate', '5', 'Taxa máxima de envios de email (por segundo)'),
     ]
     
     for key, value, description in configs:
@@ -13,6 +13,9 @@ load_dotenv()
 
 from src.config.database import init_database
 from src.routes import register_blueprints
+from src.services.audit_sink import audit_sink
+from src.services.versioned_cache import config_cache
+from src.services.template_renderer import template_cache
 
 def create_app():
     """Factory da aplicação Flask"""
@@ -32,6 +35,9 @@ def create_app():
     # Inicializar banco de dados
     init_database(app)
     
+    # Gravação dos logs de auditoria em segundo plano
+    audit_sink.init_app(app)
+    
     # Registrar blueprints
     register_blueprints(app)
     
@@ -43,7 +49,9 @@ def create_app():
             'success': True,
             'message': 'Sistema CRC-ES funcionando',
             'version': '1.0.0',
-            'status': 'healthy'
+            'status': 'healthy',
+            'config_cache': config_cache.get_stats(),
+            'template_cache': template_cache.get_stats()
         }), 200
     
     # Rota raiz
@@ -33,7 +33,9 @@ class AuditLog(db.Model):
     user_agent = db.Column(db.String(255))
     success = db.Column(db.Boolean, default=True)
     error_message = db.Column(db.Text)
+    event_count = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # Eventos idênticos agrupados
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_seen_at = db.Column(db.DateTime)  # Último evento, quando agrupado
     
     # Relacionamentos
     user = db.relationship('User', backref='audit_logs')
@@ -53,34 +55,65 @@ class AuditLog(db.Model):
             'user_agent': self.user_agent,
             'success': self.success,
             'error_message': self.error_message,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'event_count': self.event_count or 1,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'last_seen_at': self.last_seen_at.isoformat() if self.last_seen_at else None
         }
     
     @classmethod
     def log_action(cls, user_id, action, resource_type=None, resource_id=None, 
                    description=None, details=None, ip_address=None, user_agent=None,
-                   success=True, error_message=None):
-        """Registra uma ação no log"""
+                   success=True, error_message=None, durable=False):
+        """
+        Registra uma ação no log
+        
+        A gravação passa pelo audit_sink: login, logout, mudanças de
+        configuração e chamadas com durable=True são gravados na hora, os
+        demais em lote em segundo plano.
+        """
+        from ..services.audit_sink import audit_sink
+        
+        row = {
+            'user_id': user_id,
+            'action': action,
+            'resource_type': resource_type,
+            'resource_id': resource_id,
+            'description': description,
+            'details': details,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'success': success,
+            'error_message': error_message,
+            'event_count': 1,
+            'created_at': datetime.utcnow(),
+            'last_seen_at': None
+        }
         try:
-            log = cls(
-                user_id=user_id,
-                action=action,
-                resource_type=resource_type,
-                resource_id=resource_id,
-                description=description,
-                details=details,
-                ip_address=ip_address,
-                user_agent=user_agent,
-                success=success,
-                error_message=error_message
-            )
-            db.session.add(log)
-            db.session.commit()
-            return log
+            audit_sink.submit(cls, row, durable=durable)
         except Exception as e:
             db.session.rollback()
             print(f"Erro ao registrar log: {e}")
-            return None
+    
+    @classmethod
+    def log_actions(cls, entries):
+        """Registra vários logs de uma vez (mesmos campos de log_action)"""
+        from ..services.bulk_store import bulk_insert
+
+        if not entries:
+            return 0
+        
+        # executemany exige as mesmas colunas em todas as linhas
+        fields = ('user_id', 'action', 'resource_type', 'resource_id', 'description',
+                  'details', 'ip_address', 'user_agent', 'error_message')
+        rows = [dict({field: entry.get(field) for field in fields}, success=entry.get('success', True),
+                     event_count=entry.get('event_count', 1))
+                for entry in entries]
+        try:
+            return bulk_insert(cls, rows, commit_every=len(rows))
+        except Exception as e:
+            db.session.rollback()
+            print(f"Erro ao registrar logs: {e}")
+            return 0
     
     def __repr__(self):
         return f'<AuditLog {self.action.value} by {self.user_id}>'
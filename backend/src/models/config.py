@@ -33,9 +33,10 @@ class SystemConfig(db.Model):
     
     @classmethod
     def get_value(cls, key, default=None):
-        """Obtém valor de configuração"""
-        config = cls.query.filter_by(key=key).first()
-        return config.value if config else default
+        """Obtém valor de configuração (via cache em memória)"""
+        from ..services.versioned_cache import config_cache
+        value = config_cache.get(key)
+        return value if value is not None else default
     
     @classmethod
     def set_value(cls, key, value, description=None, category='general', user_id=None):
@@ -61,3 +62,14 @@ class SystemConfig(db.Model):
     def __repr__(self):
         return f'<SystemConfig {self.key}>'
 
+class CacheVersion(db.Model):
+    """Contador de versão de um cache em memória (incrementado a cada escrita)"""
+    __tablename__ = 'cache_versions'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name} {self.version}>'
+
@@ -2,11 +2,16 @@
 Modelo de contatos baseado nas tabelas originais
 """
 from datetime import datetime
+import pandas as pd
 from ..config.database import db
 
 class Contact(db.Model):
     """Contatos baseados nas tabelas SCDA01 e SCDA71"""
     __tablename__ = 'contacts'
+    __table_args__ = (
+        # Listagem ordenada por nome (id desempata o cursor)
+        db.Index('ix_contacts_nome_id', 'nome', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -51,8 +56,16 @@ class Contact(db.Model):
         }
     
     @classmethod
-    def sync_from_sql_server(cls, db_config):
-        """Sincroniza contatos do SQL Server original"""
+    def sync_from_sql_server(cls, db_config, batch_size=1000):
+        """
+        Sincroniza contatos do SQL Server original
+        
+        Os registros já existentes são carregados em uma única consulta; os
+        contatos novos são inseridos e os demais atualizados em lote, com
+        commit a cada batch_size linhas.
+        """
+        from ..services.bulk_store import bulk_insert, bulk_update
+        
         try:
             # Query baseada nos scripts originais
             query = """
@@ -74,10 +87,13 @@ class Contact(db.Model):
             if df.empty:
                 return 0, "Nenhum contato encontrado"
             
-            sync_count = 0
-            for _, row in df.iterrows():
+            now = datetime.utcnow()
+            
+            # Um registro pode vir repetido (vários telefones): vale o último
+            contacts = {}
+            for row in df.to_dict('records'):
                 # Processar telefone como nos scripts originais
-                telefone_completo = None
+                ddd = telefone = telefone_completo = None
                 if pd.notna(row['ddd']) and pd.notna(row['telefone']):
                     ddd = str(row['ddd']).replace(' ', '').replace('-', '')
                     telefone = str(row['telefone']).replace(' ', '').replace('-', '')
@@ -89,25 +105,32 @@ class Contact(db.Model):
                     
                     telefone_completo = f"55{ddd}{telefone}"
                 
-                # Buscar ou criar contato
-                contact = cls.query.filter_by(registro=row['registro']).first()
-                if not contact:
-                    contact = cls(registro=row['registro'])
-                    db.session.add(contact)
-                
-                # Atualizar dados
-                contact.nome = row['nome']
-                contact.email = row['email'] if pd.notna(row['email']) else None
-                contact.ddd = ddd if 'ddd' in locals() else None
-                contact.telefone = telefone if 'telefone' in locals() else None
-                contact.telefone_completo = telefone_completo
-                contact.telefone_ativo = row['telefone_ativo'] == 'SIM' if pd.notna(row['telefone_ativo']) else False
-                contact.tipo_telefone = row['tipo_telefone'] if pd.notna(row['tipo_telefone']) else None
-                contact.last_sync = datetime.utcnow()
-                
-                sync_count += 1
+                contacts[row['registro']] = {
+                    'registro': row['registro'],
+                    'nome': row['nome'],
+                    'email': row['email'] if pd.notna(row['email']) else None,
+                    'ddd': ddd,
+                    'telefone': telefone,
+                    'telefone_completo': telefone_completo,
+                    'telefone_ativo': row['telefone_ativo'] == 'SIM' if pd.notna(row['telefone_ativo']) else False,
+                    'tipo_telefone': row['tipo_telefone'] if pd.notna(row['tipo_telefone']) else None,
+                    'last_sync': now,
+                    'updated_at': now
+                }
+            
+            # Separar inserções e atualizações sem uma consulta por contato
+            existing = dict(db.session.query(cls.registro, cls.id).all())
+            new_rows, updated_rows = [], []
+            for registro, data in contacts.items():
+                if registro in existing:
+                    updated_rows.append(dict(data, id=existing[registro]))
+                else:
+                    new_rows.append(data)
+            
+            bulk_insert(cls, new_rows, commit_every=batch_size)
+            bulk_update(cls, updated_rows, commit_every=batch_size)
             
-            db.session.commit()
+            sync_count = len(contacts)
             return sync_count, f"Sincronizados {sync_count} contatos"
             
         except Exception as e:
@@ -46,17 +46,16 @@ class Template(db.Model):
     
     def render(self, variables_dict):
         """Renderiza template com variáveis"""
-        content = self.content
-        subject = self.subject or ''
+        from ..services.template_renderer import template_cache
         
-        for key, value in variables_dict.items():
-            placeholder = '{' + key + '}'
-            content = content.replace(placeholder, str(value))
-            subject = subject.replace(placeholder, str(value))
+        # Compilados uma vez por template e campo; cada render é um único join
+        declared = self.variables or None
+        content = template_cache.get(self.content, (self.id, 'content') if self.id else None, declared=declared)
+        subject = template_cache.get(self.subject or '', (self.id, 'subject') if self.id else None, declared=declared)
         
         return {
-            'subject': subject,
-            'content': content
+            'subject': subject.render(variables_dict),
+            'content': content.render(variables_dict)
         }
     
     @classmethod
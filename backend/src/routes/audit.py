@@ -5,7 +5,9 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 from ..models.audit import AuditLog, ActionType
+from ..models.user import User
 from ..services.auth_service import AuthService
+from ..services.export_stream import EXPORT_FORMATS, iter_rows, stream_export
 
 audit_bp = Blueprint('audit', __name__)
 
@@ -280,10 +282,38 @@ def get_available_actions():
             'message': f'Erro interno: {e}'
         }), 500
 
+EXPORT_COLUMNS = (AuditLog.id, User.username, AuditLog.action, AuditLog.resource_type,
+                  AuditLog.resource_id, AuditLog.description, AuditLog.success,
+                  AuditLog.error_message, AuditLog.ip_address, AuditLog.created_at)
+
+EXPORT_FIELDS = ['id', 'usuario', 'acao', 'recurso', 'recurso_id', 'descricao',
+                 'sucesso', 'erro', 'ip', 'data_hora']
+
+def _export_row(row):
+    """Linha da exportação em streaming (mesmos campos da exportação JSON)"""
+    return {
+        'id': row.id,
+        'usuario': row.username or 'Sistema',
+        'acao': row.action.value if row.action else '',
+        'recurso': row.resource_type or '',
+        'recurso_id': row.resource_id or '',
+        'descricao': row.description or '',
+        'sucesso': 'Sim' if row.success else 'Não',
+        'erro': row.error_message or '',
+        'ip': row.ip_address or '',
+        'data_hora': row.created_at.isoformat() if row.created_at else ''
+    }
+
 @audit_bp.route('/export', methods=['POST'])
 @jwt_required()
 def export_audit_logs():
-    """Exporta logs de auditoria"""
+    """
+    Exporta logs de auditoria
+    
+    Com 'format' = 'csv' ou 'ndjson' o arquivo é gerado em streaming, sem
+    limite de registros ('compress': true envia em gzip). Sem 'format',
+    mantém a resposta JSON limitada a 10000 registros.
+    """
     try:
         current_user_id = get_jwt_identity()
         current_user_data = AuthService.get_current_user(current_user_id)
@@ -294,7 +324,14 @@ def export_audit_logs():
                 'message': 'Acesso negado'
             }), 403
         
-        data = request.get_json()
+        data = request.get_json() or {}
+        export_format = data.get('format')
+        
+        if export_format and export_format not in EXPORT_FORMATS:
+            return jsonify({
+                'success': False,
+                'message': 'Formato de exportação inválido'
+            }), 400
         
         # Filtros para exportação
         date_from = data.get('date_from')
@@ -326,6 +363,26 @@ def export_audit_logs():
             except ValueError:
                 pass
         
+        if export_format:
+            statement = query.outerjoin(User, AuditLog.user_id == User.id).with_entities(
+                *EXPORT_COLUMNS
+            ).order_by(AuditLog.created_at.desc(), AuditLog.id.desc()).statement
+            rows = (_export_row(row) for row in iter_rows(statement))
+            
+            def log_export(count):
+                AuditLog.log_action(
+                    user_id=current_user_id,
+                    action=ActionType.SYNC_DATA,
+                    resource_type='audit_export',
+                    description=f"Exportação de logs de auditoria: {count} registros",
+                    details={'count': count, 'filters': data},
+                    success=True
+                )
+            
+            filename = f"audit_logs_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+            return stream_export(rows, EXPORT_FIELDS, export_format, filename,
+                                 compress=bool(data.get('compress')), on_complete=log_export)
+        
         # Ordenar por data
         query = query.order_by(AuditLog.created_at.desc())
         
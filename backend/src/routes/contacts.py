@@ -7,6 +7,7 @@ from datetime import datetime
 from ..models.contact import Contact
 from ..models.audit import AuditLog, ActionType
 from ..services.auth_service import AuthService
+from ..services.pagination import keyset_page, cursor_pagination
 from ..config.database import db_config, db
 import pandas as pd
 
@@ -47,6 +48,30 @@ def get_contacts():
         if has_debts:
             query = query.filter(Contact.tem_debitos == True)
         
+        # Modo cursor: paginação por posição, sem OFFSET nem COUNT
+        if 'cursor' in request.args:
+            limit = max(1, min(request.args.get('limit', per_page, type=int), 200))
+            try:
+                result = keyset_page(
+                    query, Contact.nome, Contact.id,
+                    request.args.get('cursor'), limit,
+                    descending=False,
+                    include_total=request.args.get('include_total', '').lower() == 'true'
+                )
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'message': 'Cursor inválido'
+                }), 400
+            
+            return jsonify({
+                'success': True,
+                'data': {
+                    'contacts': [contact.to_dict() for contact in result['items']],
+                    'pagination': cursor_pagination(result, limit)
+                }
+            }), 200
+        
         # Ordenar por nome
         query = query.order_by(Contact.nome)
         
@@ -0,0 +1,332 @@
+"""
+Gravação em segundo plano (em lote) dos logs de auditoria
+"""
+import os
+import json
+import queue
+import atexit
+import logging
+import threading
+import time
+from typing import Dict, List
+from ..config.database import db
+from ..models.audit import ActionType
+from .bulk_store import bulk_insert
+
+logger = logging.getLogger(__name__)
+
+
+class AuditSink:
+    """
+    Gravação em segundo plano dos logs de auditoria
+
+    log_action enfileira o log em uma fila limitada e retorna; uma thread
+    grava os logs acumulados em inserts multi-linha a cada flush_interval
+    ou a cada batch_size logs. Eventos de segurança (login, logout,
+    configuração) e o modo 'sync' continuam gravando na hora. Com a fila
+    cheia, o log é gravado de forma síncrona (contado em 'overflows'), sem
+    perda. A fila é esvaziada no encerramento do processo. Processos
+    criados por fork (workers prefork do Celery, gunicorn --preload)
+    iniciam a própria thread; sem thread viva, os logs são gravados na
+    hora.
+
+    Ações com regra de agrupamento (coalesce_rules: 'ação' ou
+    'ação:recurso' -> janela em segundos) têm os eventos idênticos da
+    janela gravados em uma única linha, com event_count e o intervalo
+    created_at..last_seen_at.
+    """
+
+    # Tentativas de gravar um lote antes de descartá-lo
+    MAX_BATCH_ATTEMPTS = 3
+
+    # Colunas que não diferenciam eventos idênticos
+    COALESCE_IGNORED = ('created_at', 'last_seen_at', 'event_count')
+
+    def __init__(self, mode: str = 'buffered', max_queue: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 0.5, sync_actions: frozenset = frozenset(),
+                 coalesce_rules: Dict = None):
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sync_actions = frozenset(sync_actions)
+        self.coalesce_rules = dict(coalesce_rules or {})
+        self.app = None
+
+        # Chave do evento -> {'model', 'row', 'expires_at'} da janela aberta
+        self._coalescing = {}
+        self._coalesce_lock = threading.Lock()
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        # Processo dono da thread (após um fork a thread herdada não existe)
+        self._pid = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'sync_writes': 0,
+            'overflows': 0,
+            'batches': 0,
+            'errors': 0,
+            'dropped': 0,
+            'coalesced': 0,
+            'last_flush_at': None
+        }
+
+    def init_app(self, app):
+        """Inicia a thread de gravação para a aplicação"""
+        self.app = app
+        app.extensions['audit_sink'] = self
+
+        if self.mode != 'buffered' or self._thread is not None:
+            return
+
+        self._start()
+        atexit.register(self.shutdown)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start(self):
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='audit-sink', daemon=True)
+        self._thread.start()
+
+    def _after_fork(self):
+        """
+        No processo filho: descarta o estado herdado (a fila e as janelas
+        pertencem ao pai, que as grava) e inicia uma thread própria
+        """
+        if self._thread is None:
+            return
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._coalescing = {}
+        self._coalesce_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._start()
+
+    def _buffering(self) -> bool:
+        """Se há uma thread de gravação viva neste processo"""
+        return (
+            self._thread is not None
+            and self._pid == os.getpid()
+            and self._thread.is_alive()
+            and not self._stop.is_set()
+        )
+
+    def is_sync(self, row: Dict) -> bool:
+        """Se o log deve ser gravado na hora"""
+        return (
+            not self._buffering()
+            or row.get('action') in self.sync_actions
+        )
+
+    def coalesce_window(self, row: Dict):
+        """Janela de agrupamento do log (segundos) ou None"""
+        action = row['action'].value if row.get('action') else ''
+        window = self.coalesce_rules.get(f"{action}:{row.get('resource_type') or ''}")
+        return window if window is not None else self.coalesce_rules.get(action)
+
+    def submit(self, model, row: Dict, durable: bool = False):
+        """Grava (ou enfileira) um log já convertido em colunas"""
+        if not durable and self._buffering():
+            window = self.coalesce_window(row)
+            if window:
+                self._coalesce(model, row, window)
+                return
+
+        if durable or self.is_sync(row):
+            self._write_now(model, row)
+            return
+
+        self._enqueue(model, row)
+
+    def _coalesce(self, model, row: Dict, window: float):
+        """Soma o evento à janela aberta de um evento idêntico, ou abre uma"""
+        key = (model, json.dumps(
+            {column: value for column, value in row.items() if column not in self.COALESCE_IGNORED},
+            sort_keys=True, default=str
+        ))
+        now = time.monotonic()
+
+        with self._coalesce_lock:
+            entry = self._coalescing.get(key)
+            if entry is not None and now < entry['expires_at']:
+                entry['row']['event_count'] += 1
+                entry['row']['last_seen_at'] = row['created_at']
+                self._count('coalesced')
+                return
+            if entry is not None:
+                self._enqueue(entry['model'], entry['row'])
+
+            self._coalescing[key] = {
+                'model': model,
+                'row': dict(row, event_count=1, last_seen_at=row['created_at']),
+                'expires_at': now + window
+            }
+
+    def _release_coalesced(self, force: bool = False) -> List:
+        """Retira as janelas encerradas (ou todas) como itens de gravação"""
+        now = time.monotonic()
+        with self._coalesce_lock:
+            expired = [key for key, entry in self._coalescing.items() if force or now >= entry['expires_at']]
+            entries = [self._coalescing.pop(key) for key in expired]
+        return [(entry['model'], entry['row']) for entry in entries]
+
+    def _enqueue(self, model, row: Dict):
+        try:
+            self._queue.put_nowait((model, row))
+            self._count('enqueued')
+        except queue.Full:
+            self._count('overflows')
+            self._write_now(model, row)
+
+    def _write_now(self, model, row: Dict):
+        db.session.add(model(**row))
+        db.session.commit()
+        self._count('sync_writes')
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _drain(self, limit: int) -> List:
+        items = []
+        while len(items) < limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        pending, attempts = [], 0
+
+        while not self._stop.is_set():
+            pending.extend(self._release_coalesced())
+            deadline = time.monotonic() + self.flush_interval
+            while len(pending) < self.batch_size and not self._stop.is_set():
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+                pending.extend(self._drain(self.batch_size - len(pending)))
+
+            if not pending:
+                continue
+
+            pending = self._write_batch(pending)
+            if not pending:
+                attempts = 0
+            else:
+                attempts += 1
+                if attempts >= self.MAX_BATCH_ATTEMPTS:
+                    logger.error(f"Descartando {len(pending)} logs de auditoria após {attempts} falhas")
+                    self._count('dropped', len(pending))
+                    pending, attempts = [], 0
+                else:
+                    time.sleep(self.flush_interval)
+
+        # Encerramento: grava o que sobrou
+        if pending:
+            self._write_batch(pending)
+
+    def _write_batch(self, items: List) -> List:
+        """
+        Grava um lote em inserts multi-linha, agrupado por modelo
+
+        Se o lote falhar, grava linha a linha: só as linhas que falharem de
+        novo (uma linha inválida, ou todas com o banco fora) são devolvidas
+        para nova tentativa.
+        """
+        try:
+            self._insert(items)
+            written, failed = len(items), []
+        except Exception as e:
+            logger.error(f"Erro ao gravar lote de auditoria: {e}")
+            self._count('errors')
+
+            failed = []
+            for item in items:
+                try:
+                    self._insert([item])
+                except Exception:
+                    failed.append(item)
+            written = len(items) - len(failed)
+
+        with self._stats_lock:
+            self._stats['written'] += written
+            if written:
+                self._stats['batches'] += 1
+                self._stats['last_flush_at'] = time.time()
+        return failed
+
+    def _insert(self, items: List):
+        by_model = {}
+        for model, row in items:
+            by_model.setdefault(model, []).append(row)
+
+        with self.app.app_context():
+            try:
+                for model, rows in by_model.items():
+                    bulk_insert(model, rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def flush(self):
+        """Grava imediatamente tudo o que está na fila (e as janelas abertas)"""
+        # Chamado também no atexit, fora de qualquer contexto da aplicação
+        with self.app.app_context():
+            for model, row in self._release_coalesced(force=True):
+                self._enqueue(model, row)
+
+            while True:
+                items = self._drain(self.batch_size)
+                if not items:
+                    return
+                failed = self._write_batch(items)
+                if failed:
+                    logger.error(f"Descartando {len(failed)} logs de auditoria no flush")
+                    self._count('dropped', len(failed))
+
+    def shutdown(self, timeout: float = 10.0):
+        """Para a thread e grava os logs restantes"""
+        if self._thread is None or self._pid != os.getpid() or self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self.flush()
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['mode'] = self.mode
+        stats['queue_size'] = self._queue.qsize()
+        stats['queue_capacity'] = self._queue.maxsize
+        with self._coalesce_lock:
+            stats['coalescing_windows'] = len(self._coalescing)
+        return stats
+
+
+audit_sink = AuditSink(
+    mode=os.getenv('AUDIT_SINK_MODE', 'buffered'),
+    max_queue=int(os.getenv('AUDIT_SINK_MAX_QUEUE', '10000')),
+    batch_size=int(os.getenv('AUDIT_SINK_BATCH_SIZE', '500')),
+    flush_interval=int(os.getenv('AUDIT_SINK_FLUSH_MS', '500')) / 1000.0,
+    sync_actions={ActionType.LOGIN, ActionType.LOGOUT, ActionType.CONFIG_CHANGE},
+    coalesce_rules={
+        action.strip(): float(window)
+        for action, _, window in (
+            rule.partition('=') for rule in os.getenv(
+                'AUDIT_COALESCE_RULES',
+                'config_change:database_test=300,config_change:email_test=300,config_change:whatsapp_test=300'
+            ).split(',')
+        )
+        if action.strip() and window
+    }
+)
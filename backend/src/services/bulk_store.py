@@ -0,0 +1,61 @@
+"""
+Persistência em lote: inserts e updates via executemany, sem objetos ORM
+"""
+from typing import Dict, Iterable, List
+from sqlalchemy import insert
+from ..config.database import db
+
+# Linhas por comando executemany
+CHUNK_SIZE = 1000
+
+
+def _chunks(rows: List, size: int) -> Iterable[List]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def bulk_insert(model, rows: List[Dict], chunk_size: int = CHUNK_SIZE, commit_every: int = None) -> int:
+    """
+    Insere linhas em lote (defaults do modelo são aplicados)
+
+    Se commit_every for informado, faz commit a cada N linhas; caso
+    contrário o commit fica com quem chamou.
+    """
+    statement = insert(model)
+
+    inserted = pending = 0
+    for chunk in _chunks(rows, chunk_size):
+        db.session.execute(statement, chunk)
+        inserted += len(chunk)
+        pending += len(chunk)
+
+        if commit_every and pending >= commit_every:
+            db.session.commit()
+            pending = 0
+
+    if commit_every and pending:
+        db.session.commit()
+
+    return inserted
+
+
+def bulk_update(model, rows: List[Dict], chunk_size: int = CHUNK_SIZE, commit_every: int = None) -> int:
+    """
+    Atualiza linhas em lote pela chave primária (cada dicionário inclui 'id')
+
+    Mesmo critério de commit de bulk_insert.
+    """
+    updated = pending = 0
+    for chunk in _chunks(rows, chunk_size):
+        db.session.bulk_update_mappings(model, chunk)
+        updated += len(chunk)
+        pending += len(chunk)
+
+        if commit_every and pending >= commit_every:
+            db.session.commit()
+            pending = 0
+
+    if commit_every and pending:
+        db.session.commit()
+
+    return updated
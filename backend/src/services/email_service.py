@@ -7,10 +7,10 @@ import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
-from pathlib import Path
-from flask import current_app
 from ..models.config import SystemConfig
 from ..models.audit import AuditLog, ActionType
+from .smtp_pool import get_smtp_pool
+from .rate_controller import AdaptiveRateController, SUCCESS, FAILED
 
 try:
     import win32com.client as win32
@@ -22,6 +22,9 @@ except ImportError:
 class EmailService:
     """Serviço de envio de emails"""
     
+    # Logs de envio acumulados antes de cada gravação em lote
+    AUDIT_BATCH_SIZE = 100
+    
     def __init__(self):
         self.smtp_server = None
         self.smtp_port = None
@@ -92,11 +95,14 @@ class EmailService:
                     )
                     msg.attach(attachment)
             
-            # Enviar via SMTP
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
+            # Enviar via SMTP reutilizando sessões autenticadas do pool
+            pool = get_smtp_pool(
+                self.smtp_server,
+                self.smtp_port,
+                self.smtp_username,
+                self.smtp_password
+            )
+            pool.send_message(msg)
             
             return True, "Email enviado via SMTP"
             
@@ -115,7 +121,7 @@ class EmailService:
         # Fallback para SMTP
         return self.send_email_smtp(to_email, subject, html_body, attachment_path)
     
-    def send_anuidade_email(self, contact_data, boleto_path=None, user_id=None):
+    def send_anuidade_email(self, contact_data, boleto_path=None, user_id=None, audit_entries=None):
         """
         Envia email de anuidade (baseado no template original)
         """
@@ -169,7 +175,8 @@ class EmailService:
             
             # Log da ação
             if user_id:
-                AuditLog.log_action(
+                self._log_send(
+                    audit_entries,
                     user_id=user_id,
                     action=ActionType.SEND_EMAIL,
                     resource_type='contact',
@@ -187,7 +194,8 @@ class EmailService:
             
             # Log do erro
             if user_id:
-                AuditLog.log_action(
+                self._log_send(
+                    audit_entries,
                     user_id=user_id,
                     action=ActionType.SEND_EMAIL,
                     resource_type='contact',
@@ -199,20 +207,74 @@ class EmailService:
             
             return False, error_msg
     
+    def _log_send(self, audit_entries, **entry):
+        """
+        Registra o envio no log, ou acumula para gravação em lote
+        
+        Em lote só as falhas têm linha própria; os envios bem-sucedidos
+        entram no resumo do lote (_bulk_summary_entry).
+        """
+        if audit_entries is None:
+            AuditLog.log_action(**entry)
+        elif not entry.get('success', True):
+            audit_entries.append(entry)
+    
+    def _bulk_summary_entry(self, results, user_id):
+        """Linha única de auditoria com o resultado do envio em lote"""
+        return {
+            'user_id': user_id,
+            'action': ActionType.SEND_EMAIL,
+            'resource_type': 'bulk_email',
+            'description': f"Envio em lote de emails: {results['sent']} enviados, "
+                           f"{results['failed']} falhas de {results['total']}",
+            'details': {key: results[key] for key in ('total', 'sent', 'failed', 'paused')},
+            'success': results['failed'] == 0
+        }
+    
+    def _create_rate_controller(self):
+        """Controle adaptativo de taxa no lugar do intervalo fixo de 2s"""
+        initial_delay = float(SystemConfig.get_value('email_initial_delay', '2'))
+        return AdaptiveRateController(
+            initial_rate=1.0 / initial_delay if initial_delay > 0 else 1.0,
+            min_rate=0.1,
+            max_rate=float(SystemConfig.get_value('email_max_rate', '5')),
+            min_samples=10
+        )
+    
     def send_bulk_emails(self, contacts_list, template_data, user_id=None):
         """
         Envia emails em lote
+        
+        O intervalo entre envios é ajustado pelo resultado de cada envio; se a
+        taxa de falhas ficar alta, o lote é interrompido e marcado como pausado.
         """
         results = {
             'total': len(contacts_list),
             'sent': 0,
             'failed': 0,
+            'paused': False,
             'errors': []
         }
+        rate_controller = self._create_rate_controller()
+        audit_entries = []
         
-        for contact in contacts_list:
+        for i, contact in enumerate(contacts_list):
+            # Contatos sem email não consomem a vez de envio nem contam como falha
+            has_email = bool(contact.get('email'))
+            if has_email:
+                # Aguarda a vez do próximo envio (ou para, se pausado)
+                if not rate_controller.acquire():
+                    results['paused'] = True
+                    results['failed'] += len(contacts_list) - i
+                    results['errors'].append({
+                        'error': f"Envio pausado por excesso de falhas após {i} de {len(contacts_list)} contatos"
+                    })
+                    break
+            
             try:
-                success, message = self.send_anuidade_email(contact, user_id=user_id)
+                success, message = self.send_anuidade_email(contact, user_id=user_id, audit_entries=audit_entries)
+                if has_email:
+                    rate_controller.record(SUCCESS if success else FAILED)
                 
                 if success:
                     results['sent'] += 1
@@ -224,17 +286,22 @@ class EmailService:
                         'error': message
                     })
                 
-                # Delay entre envios
-                time.sleep(2)
-                
             except Exception as e:
+                rate_controller.record(FAILED)
                 results['failed'] += 1
                 results['errors'].append({
                     'contact': contact.get('nome', ''),
                     'email': contact.get('email', ''),
                     'error': str(e)
                 })
+            
+            if len(audit_entries) >= self.AUDIT_BATCH_SIZE:
+                AuditLog.log_actions(audit_entries)
+                audit_entries.clear()
         
+        if user_id:
+            audit_entries.append(self._bulk_summary_entry(results, user_id))
+        AuditLog.log_actions(audit_entries)
         return results
     
     def test_connection(self):
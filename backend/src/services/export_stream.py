@@ -0,0 +1,119 @@
+"""
+Exportação em streaming (CSV/NDJSON, com gzip opcional)
+"""
+import io
+import os
+import csv
+import json
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, List
+from flask import Response, stream_with_context
+from ..config.database import db
+
+# Linhas buscadas por ida ao banco (cursor do lado do servidor)
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson')
+}
+
+
+def iter_rows(statement, batch_size: int = None) -> Iterator:
+    """
+    Percorre o resultado de um select em lotes
+
+    Com yield_per o driver usa cursor do lado do servidor (quando suporta)
+    e só batch_size linhas ficam em memória por vez. Selecione colunas, não
+    entidades, para não encher o identity map da sessão.
+    """
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    try:
+        for partition in result.partitions():
+            yield from partition
+    finally:
+        result.close()
+
+
+def _encode_csv(rows: Iterable[Dict], fieldnames: List[str], batch_size: int) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+    writer.writeheader()
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def _encode_ndjson(rows: Iterable[Dict], batch_size: int) -> Iterator[str]:
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, default=str, ensure_ascii=False))
+        if len(lines) >= batch_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def _gzip(chunks: Iterable[str]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(rows: Iterable[Dict], fieldnames: List[str], export_format: str, filename: str,
+                  compress: bool = False, on_complete: Callable[[int], None] = None) -> Response:
+    """
+    Resposta HTTP que gera o arquivo enquanto é enviado
+
+    As linhas são codificadas em blocos (CSV ou NDJSON) e, se pedido,
+    comprimidas em gzip no caminho, então a memória não depende do tamanho
+    da exportação. on_complete recebe o total de linhas ao final.
+
+    Args:
+        rows: Iterável de dicionários (normalmente gerado sobre iter_rows)
+        fieldnames: Colunas, na ordem do CSV
+        export_format: 'csv' ou 'ndjson'
+        filename: Nome do arquivo, sem extensão
+    """
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    batch_size = EXPORT_BATCH_SIZE
+    total = 0
+
+    def counted():
+        nonlocal total
+        for row in rows:
+            total += 1
+            yield row
+        if on_complete:
+            on_complete(total)
+
+    if export_format == 'csv':
+        body = _encode_csv(counted(), fieldnames, batch_size)
+    else:
+        body = _encode_ndjson(counted(), batch_size)
+
+    if compress:
+        body = _gzip(body)
+        mimetype = 'application/gzip'
+        extension += '.gz'
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}.{extension}"',
+            'X-Accel-Buffering': 'no'
+        }
+    )
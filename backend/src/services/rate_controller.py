@@ -0,0 +1,214 @@
+"""
+Controle adaptativo (AIMD) da taxa de envio em massa
+"""
+import threading
+import time
+import logging
+from collections import deque
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Resultados de um envio, do ponto de vista do controle de taxa
+SUCCESS = 'success'
+THROTTLED = 'throttled'
+FAILED = 'failed'
+IGNORED = 'ignored'
+
+# Códigos que indicam limitação de taxa pelo provedor
+THROTTLE_HTTP_STATUSES = (429, 503)
+THROTTLE_SMTP_CODES = (421, 451, 452)
+
+
+def classify_http_status(status_code: Optional[int]) -> str:
+    """
+    Classifica a resposta HTTP de uma API de mensagens
+
+    Sem status (conexão recusada, falha de DNS, timeout) conta como falha,
+    para que um provedor fora do ar reduza a taxa e pause a faixa.
+    """
+    if status_code is None:
+        return FAILED
+    if status_code in THROTTLE_HTTP_STATUSES:
+        return THROTTLED
+    if status_code >= 400:
+        return FAILED
+    return SUCCESS
+
+
+def classify_smtp_code(smtp_code: Optional[int]) -> str:
+    """Classifica o código de resposta de um servidor SMTP (sem código conta como falha)"""
+    if smtp_code is None:
+        return FAILED
+    if smtp_code in THROTTLE_SMTP_CODES:
+        return THROTTLED
+    if smtp_code >= 400:
+        return FAILED
+    return SUCCESS
+
+
+class AdaptiveRateController:
+    """
+    Token bucket com ajuste AIMD da taxa de envio
+
+    A taxa cresce de forma aditiva a cada envio bem-sucedido e cai de forma
+    multiplicativa quando o provedor limita (429, SMTP 421/451) ou rejeita.
+    Se a proporção de falhas na janela recente ultrapassar o limite, o
+    controlador entra em pausa por pause_seconds e retoma na taxa mínima.
+    """
+
+    def __init__(self, initial_rate: float = 0.5, min_rate: float = 0.05,
+                 max_rate: float = 10.0, increase_step: float = 0.05,
+                 decrease_factor: float = 0.5, burst: float = 1.0,
+                 window_size: int = 50, failure_threshold: float = 0.5,
+                 min_samples: int = 20, pause_seconds: float = 300):
+        """
+        Args:
+            initial_rate: Taxa inicial em envios por segundo
+            min_rate: Taxa mínima após reduções
+            max_rate: Taxa máxima permitida
+            increase_step: Acréscimo da taxa a cada sucesso
+            decrease_factor: Fator aplicado à taxa em cada limitação/falha
+            burst: Tokens acumuláveis (envios em rajada)
+            window_size: Tamanho da janela de resultados recentes
+            failure_threshold: Proporção de falhas que dispara a pausa
+            min_samples: Resultados mínimos na janela antes de pausar
+            pause_seconds: Duração da pausa automática
+        """
+        self.min_rate = min_rate
+        self.max_rate = max(min_rate, max_rate)
+        self.initial_rate = min(self.max_rate, max(min_rate, initial_rate))
+        self.rate = self.initial_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.burst = max(1.0, burst)
+        self.failure_threshold = failure_threshold
+        self.min_samples = min_samples
+        self.pause_seconds = pause_seconds
+
+        self._lock = threading.Lock()
+        self._tokens = 1.0
+        self._last_refill = time.monotonic()
+        self._last_decrease = 0.0
+        self._paused_until = 0.0
+        self._window = deque(maxlen=window_size)
+        self._stats = {
+            'successes': 0,
+            'throttled': 0,
+            'failures': 0,
+            'decreases': 0,
+            'pauses': 0
+        }
+
+    def _refill(self, now: float):
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._last_refill = now
+
+    def is_paused(self, now: float = None) -> bool:
+        """Indica se o controlador está em pausa automática"""
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            return now < self._paused_until
+
+    def reserve(self, now: float = None) -> float:
+        """
+        Tenta consumir um token sem bloquear
+
+        Returns:
+            0 se o envio foi liberado, ou quantos segundos aguardar
+        """
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            if now < self._paused_until:
+                return self._paused_until - now
+
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> bool:
+        """
+        Aguarda um token (uso em laços sequenciais)
+
+        Returns:
+            False se o controlador entrou em pausa automática
+        """
+        while True:
+            if self.is_paused():
+                return False
+            wait = self.reserve()
+            if wait <= 0:
+                return True
+            time.sleep(wait)
+
+    def record(self, outcome: str):
+        """Registra o resultado de um envio e ajusta a taxa"""
+        if outcome == IGNORED:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            if outcome == SUCCESS:
+                self._stats['successes'] += 1
+                self._window.append(False)
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+                return
+
+            self._stats['throttled' if outcome == THROTTLED else 'failures'] += 1
+            self._window.append(True)
+
+            # Envios simultâneos costumam falhar juntos: reduz no máximo uma
+            # vez por intervalo de envio para não derrubar a taxa em cascata
+            if now - self._last_decrease >= 1.0 / self.rate:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self._last_decrease = now
+                self._stats['decreases'] += 1
+
+            if outcome == THROTTLED:
+                self._tokens = 0.0
+                self._last_refill = now
+
+            failures = sum(self._window)
+            if len(self._window) >= self.min_samples and failures / len(self._window) >= self.failure_threshold:
+                self._paused_until = now + self.pause_seconds
+                self._window.clear()
+                self.rate = self.min_rate
+                self._tokens = 0.0
+                self._last_refill = self._paused_until
+                self._stats['pauses'] += 1
+                logger.warning(
+                    f"Taxa de falhas acima de {self.failure_threshold:.0%}, "
+                    f"envios pausados por {self.pause_seconds:.0f}s"
+                )
+
+    def reset(self):
+        """
+        Sai da pausa automática e volta à taxa inicial, se estiver abaixo dela
+
+        Usado ao iniciar ou retomar um envio: a pausa e a redução provocadas
+        por um envio anterior não devem travar o seguinte. Uma taxa que já
+        subiu acima da inicial e os contadores são mantidos.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now < self._paused_until:
+                self._paused_until = 0.0
+                self._tokens = 1.0
+                self._last_refill = now
+            self._window.clear()
+            self.rate = max(self.rate, self.initial_rate)
+
+    def get_stats(self) -> Dict:
+        """Retorna a taxa atual e contadores"""
+        now = time.monotonic()
+        with self._lock:
+            stats = dict(self._stats)
+            stats['rate'] = round(self.rate, 4)
+            stats['paused'] = now < self._paused_until
+            stats['window_failures'] = sum(self._window)
+            stats['window_size'] = len(self._window)
+        return stats
@@ -0,0 +1,252 @@
+"""
+Pool de conexões SMTP persistentes usado pelo envio de emails
+"""
+import smtplib
+import socket
+import ssl
+import threading
+import time
+import logging
+import atexit
+import os
+from email.message import Message
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledConnection:
+    """Sessão SMTP autenticada mantida pelo pool"""
+
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+        self.messages_sent = 0
+
+    def close(self):
+        """Encerra a sessão ignorando erros de rede"""
+        try:
+            self.server.quit()
+        except Exception:
+            try:
+                self.server.close()
+            except Exception:
+                pass
+
+
+class SMTPConnectionPool:
+    """
+    Pool de conexões SMTP persistentes
+
+    Mantém algumas sessões já autenticadas (STARTTLS + login) e as reutiliza
+    entre mensagens, enviando RSET antes de cada nova transação. Sessões são
+    recicladas após um número máximo de mensagens ou tempo ocioso, e a
+    reconexão é transparente em caso de 421, queda de conexão ou timeout.
+    """
+
+    # Códigos SMTP que indicam que o servidor encerrou/vai encerrar a sessão
+    RECONNECT_CODES = (421,)
+
+    def __init__(self, host: str, port: int, username: str = '', password: str = '',
+                 use_tls: bool = True, ssl_context: Optional[ssl.SSLContext] = None,
+                 max_connections: int = 3, max_messages_per_connection: int = 100,
+                 max_idle_seconds: int = 60, timeout: int = 30, max_attempts: int = 2):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.ssl_context = ssl_context
+        self.max_connections = max_connections
+        self.max_messages_per_connection = max_messages_per_connection
+        self.max_idle_seconds = max_idle_seconds
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+
+        self._idle: List[_PooledConnection] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._stats = {
+            'connections_opened': 0,
+            'connections_reused': 0,
+            'connections_recycled': 0,
+            'reconnects': 0,
+            'messages_sent': 0
+        }
+
+    def _connect(self) -> _PooledConnection:
+        """Abre e autentica uma nova sessão SMTP"""
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if self.use_tls:
+                server.starttls(context=self.ssl_context)
+                server.ehlo()
+
+            if self.username:
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+
+        self._increment('connections_opened')
+        return _PooledConnection(server)
+
+    def _is_expired(self, conn: _PooledConnection) -> bool:
+        """Verifica se a sessão deve ser reciclada"""
+        if conn.messages_sent >= self.max_messages_per_connection:
+            return True
+        return time.monotonic() - conn.last_used_at > self.max_idle_seconds
+
+    def _acquire(self) -> _PooledConnection:
+        """Obtém uma sessão pronta para uma nova transação"""
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+
+                if conn is None:
+                    return self._connect()
+
+                if self._is_expired(conn):
+                    self._increment('connections_recycled')
+                    conn.close()
+                    continue
+
+                # RSET limpa a transação anterior e serve como teste de vida
+                try:
+                    conn.server.rset()
+                except (smtplib.SMTPException, OSError):
+                    self._increment('reconnects')
+                    conn.close()
+                    continue
+
+                self._increment('connections_reused')
+                return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, conn: _PooledConnection, reusable: bool = True):
+        """Devolve a sessão ao pool (ou a descarta)"""
+        try:
+            if reusable and not self._is_expired(conn):
+                conn.last_used_at = time.monotonic()
+                with self._lock:
+                    self._idle.append(conn)
+            else:
+                if reusable:
+                    self._increment('connections_recycled')
+                conn.close()
+        finally:
+            self._slots.release()
+
+    def _increment(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def send_message(self, message: Message, from_addr: str = None,
+                     to_addrs: List[str] = None) -> Dict:
+        """
+        Envia uma mensagem usando uma sessão do pool
+
+        Returns:
+            Dict de destinatários recusados (mesmo retorno de smtplib.send_message)
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            conn = self._acquire()
+            try:
+                refused = conn.server.send_message(message, from_addr, to_addrs)
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code in self.RECONNECT_CODES:
+                    self._release(conn, reusable=False)
+                    if attempt < self.max_attempts:
+                        self._increment('reconnects')
+                        logger.warning(f"SMTP {e.smtp_code} recebido, reconectando ({attempt}/{self.max_attempts})")
+                        continue
+                    raise
+                # Erro da transação: a sessão continua válida
+                self._release(conn)
+                raise
+            except smtplib.SMTPServerDisconnected:
+                self._release(conn, reusable=False)
+                if attempt < self.max_attempts:
+                    self._increment('reconnects')
+                    logger.warning(f"Conexão SMTP encerrada pelo servidor, reconectando ({attempt}/{self.max_attempts})")
+                    continue
+                raise
+            except smtplib.SMTPException:
+                # Destinatários/remetente recusados: smtplib já enviou RSET
+                self._release(conn)
+                raise
+            except (socket.timeout, OSError):
+                self._release(conn, reusable=False)
+                if attempt < self.max_attempts:
+                    self._increment('reconnects')
+                    logger.warning(f"Timeout/erro de rede no SMTP, reconectando ({attempt}/{self.max_attempts})")
+                    continue
+                raise
+            except Exception:
+                self._release(conn, reusable=False)
+                raise
+
+            conn.messages_sent += 1
+            self._increment('messages_sent')
+            self._release(conn)
+            return refused
+
+    def get_stats(self) -> Dict:
+        """Retorna métricas do pool"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle_connections'] = len(self._idle)
+        stats['max_connections'] = self.max_connections
+        return stats
+
+    def close_all(self):
+        """Encerra todas as sessões ociosas"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+
+        for conn in idle:
+            conn.close()
+
+
+_pools: Dict[tuple, SMTPConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_smtp_pool(host: str, port: int, username: str = '', password: str = '',
+                  use_tls: bool = True, ssl_context: Optional[ssl.SSLContext] = None) -> SMTPConnectionPool:
+    """Retorna o pool compartilhado para o servidor/credencial informados"""
+    key = (host, port, username, password, use_tls)
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = SMTPConnectionPool(
+                host=host,
+                port=port,
+                username=username,
+                password=password,
+                use_tls=use_tls,
+                ssl_context=ssl_context,
+                max_connections=int(os.getenv('SMTP_POOL_SIZE', '3')),
+                max_messages_per_connection=int(os.getenv('SMTP_POOL_MAX_MESSAGES', '100')),
+                max_idle_seconds=int(os.getenv('SMTP_POOL_MAX_IDLE', '60')),
+                timeout=int(os.getenv('SMTP_TIMEOUT', '30'))
+            )
+            _pools[key] = pool
+
+    return pool
+
+
+@atexit.register
+def _close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+
+    for pool in pools:
+        pool.close_all()
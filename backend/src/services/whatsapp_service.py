@@ -13,10 +13,14 @@ from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 from ..models.config import SystemConfig
 from ..models.audit import AuditLog, ActionType
+from .rate_controller import AdaptiveRateController, SUCCESS, FAILED
 
 class WhatsAppService:
     """Serviço de envio WhatsApp baseado no script original"""
     
+    # Logs de envio acumulados antes de cada gravação em lote
+    AUDIT_BATCH_SIZE = 100
+    
     def __init__(self):
         self.driver = None
         self.profile_path = None
@@ -123,7 +127,7 @@ class WhatsAppService:
         except Exception as e:
             return False, f"Erro ao enviar mensagem: {e}"
     
-    def send_boleto_whatsapp(self, contact_data, user_id=None):
+    def send_boleto_whatsapp(self, contact_data, user_id=None, audit_entries=None):
         """
         Envia boleto via WhatsApp (baseado no template original)
         """
@@ -152,7 +156,8 @@ class WhatsAppService:
             
             # Log da ação
             if user_id:
-                AuditLog.log_action(
+                self._log_send(
+                    audit_entries,
                     user_id=user_id,
                     action=ActionType.SEND_WHATSAPP,
                     resource_type='contact',
@@ -170,7 +175,8 @@ class WhatsAppService:
             
             # Log do erro
             if user_id:
-                AuditLog.log_action(
+                self._log_send(
+                    audit_entries,
                     user_id=user_id,
                     action=ActionType.SEND_WHATSAPP,
                     resource_type='contact',
@@ -182,16 +188,57 @@ class WhatsAppService:
             
             return False, error_msg
     
+    def _log_send(self, audit_entries, **entry):
+        """
+        Registra o envio no log, ou acumula para gravação em lote
+        
+        Em lote só as falhas têm linha própria; os envios bem-sucedidos
+        entram no resumo do lote (_bulk_summary_entry).
+        """
+        if audit_entries is None:
+            AuditLog.log_action(**entry)
+        elif not entry.get('success', True):
+            audit_entries.append(entry)
+    
+    def _bulk_summary_entry(self, results, user_id):
+        """Linha única de auditoria com o resultado do envio em lote"""
+        return {
+            'user_id': user_id,
+            'action': ActionType.SEND_WHATSAPP,
+            'resource_type': 'bulk_whatsapp',
+            'description': f"Envio em lote de WhatsApp: {results['sent']} enviados, "
+                           f"{results['failed']} falhas de {results['total']}",
+            'details': {key: results[key] for key in ('total', 'sent', 'failed', 'paused')},
+            'success': results['failed'] == 0
+        }
+    
+    def _create_rate_controller(self):
+        """Controle adaptativo de taxa no lugar do intervalo fixo de 10s"""
+        initial_delay = float(SystemConfig.get_value('whatsapp_initial_delay', '10'))
+        return AdaptiveRateController(
+            initial_rate=1.0 / initial_delay if initial_delay > 0 else 1.0,
+            min_rate=0.02,
+            max_rate=float(SystemConfig.get_value('whatsapp_max_rate', '0.2')),
+            increase_step=0.01,
+            min_samples=10
+        )
+    
     def send_bulk_whatsapp(self, contacts_list, user_id=None):
         """
         Envia WhatsApp em lote (baseado no script original)
+        
+        O intervalo entre envios é ajustado pelo resultado de cada envio; se a
+        taxa de falhas ficar alta, o lote é interrompido e marcado como pausado.
         """
         results = {
             'total': len(contacts_list),
             'sent': 0,
             'failed': 0,
+            'paused': False,
             'errors': []
         }
+        rate_controller = self._create_rate_controller()
+        audit_entries = []
         
         # Inicializar driver uma vez
         success, msg = self.init_driver()
@@ -205,8 +252,18 @@ class WhatsAppService:
         
         try:
             for i, contact in enumerate(contacts_list):
+                # Aguarda a vez do próximo envio (ou para, se pausado)
+                if not rate_controller.acquire():
+                    results['paused'] = True
+                    results['failed'] += len(contacts_list) - i
+                    results['errors'].append({
+                        'error': f"Envio pausado por excesso de falhas após {i} de {len(contacts_list)} contatos"
+                    })
+                    break
+                
                 try:
-                    success, message = self.send_boleto_whatsapp(contact, user_id=user_id)
+                    success, message = self.send_boleto_whatsapp(contact, user_id=user_id, audit_entries=audit_entries)
+                    rate_controller.record(SUCCESS if success else FAILED)
                     
                     if success:
                         results['sent'] += 1
@@ -218,12 +275,14 @@ class WhatsAppService:
                             'error': message
                         })
                     
-                    # Delay entre envios (como no script original)
-                    time.sleep(10)
-                    
                     print(f"Processado {i+1}/{len(contacts_list)}")
                     
+                    if len(audit_entries) >= self.AUDIT_BATCH_SIZE:
+                        AuditLog.log_actions(audit_entries)
+                        audit_entries.clear()
+                    
                 except Exception as e:
+                    rate_controller.record(FAILED)
                     results['failed'] += 1
                     results['errors'].append({
                         'contact': contact.get('nome', ''),
@@ -235,8 +294,11 @@ class WhatsAppService:
                     continue
         
         finally:
-            # Fechar driver
+            # Fechar driver e gravar os logs restantes
             self.close_driver()
+            if user_id:
+                audit_entries.append(self._bulk_summary_entry(results, user_id))
+            AuditLog.log_actions(audit_entries)
         
         return results
     
@@ -0,0 +1,69 @@
+import os
+import logging
+from celery import Celery, Task
+from celery.signals import worker_process_shutdown
+
+logger = logging.getLogger(__name__)
+
+
+@worker_process_shutdown.connect
+def _flush_audit_logs(**kwargs):
+    # Processos do pool prefork saem com os._exit (sem atexit): grava os logs pendentes
+    from src.services.audit_sink import audit_sink
+    audit_sink.shutdown()
+
+
+def celery_init_app(app) -> Celery:
+    """
+    Cria a aplicação Celery ligada ao Flask
+
+    Sem CELERY_BROKER_URL as tarefas rodam em modo eager (no próprio processo,
+    com broker em memória), o que permite testar localmente sem Redis.
+    Worker: celery -A src.main.celery_app worker --loglevel=info
+    Tarefas periódicas: celery -A src.main.celery_app beat --loglevel=info
+    """
+    class FlaskTask(Task):
+        def __call__(self, *args, **kwargs):
+            with app.app_context():
+                return self.run(*args, **kwargs)
+
+    broker_url = os.getenv('CELERY_BROKER_URL')
+    default_eager = 'false' if broker_url else 'true'
+    always_eager = os.getenv('CELERY_TASK_ALWAYS_EAGER', default_eager).lower() == 'true'
+
+    if always_eager:
+        logger.info("Celery em modo eager: envios em massa serão executados no próprio processo")
+
+    celery_app = Celery(app.name, task_cls=FlaskTask)
+    celery_app.conf.update(
+        broker_url=broker_url or 'memory://',
+        result_backend=os.getenv('CELERY_RESULT_BACKEND') or None,
+        task_ignore_result=True,
+        task_always_eager=always_eager,
+        task_serializer='json',
+        accept_content=['json'],
+        task_acks_late=True,
+        worker_prefetch_multiplier=1,
+        beat_schedule={
+            'reconcile-campaign-statistics': {
+                'task': 'campaigns.reconcile_statistics',
+                'schedule': float(os.getenv('CAMPAIGN_STATS_RECONCILE_SECONDS', '600'))
+            },
+            'roll-up-audit-logs': {
+                'task': 'audit.rollup',
+                'schedule': float(os.getenv('AUDIT_ROLLUP_SECONDS', '300'))
+            },
+            'archive-audit-logs': {
+                'task': 'audit.archive',
+                'schedule': float(os.getenv('AUDIT_ARCHIVE_SECONDS', '86400'))
+            },
+            'prune-revoked-tokens': {
+                'task': 'auth.prune_revoked_tokens',
+                'schedule': float(os.getenv('TOKEN_REVOCATION_PRUNE_SECONDS', '3600'))
+            }
+        }
+    )
+    celery_app.set_default()
+    app.extensions['celery'] = celery_app
+
+    return celery_app
@@ -13,12 +13,20 @@ from flask import Flask, send_from_directory, request, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from flask_bcrypt import Bcrypt
+from sqlalchemy.orm import selectinload
 
 # Importa todos os modelos
 from src.models.user import db, User, Role, Permission
 from src.models.campaign import Campaign, CampaignMessage
 from src.models.template import EmailTemplate, WhatsAppTemplate
 from src.models.audit import AuditLog, SystemHealth
+from src.models.job import MessagingJob
+from src.models.cache import CacheVersion
+from src.celery_app import celery_init_app
+from src.migrations import run_migrations
+from src.services.audit_sink import audit_sink
+from src.services.token_verification import revocation_list
+from src.services.campaign_scheduler import scheduler as campaign_scheduler
 
 # Importa blueprints
 from src.routes.user import user_bp
@@ -54,6 +62,9 @@ def create_app():
         'pool_pre_ping': True,
         'pool_recycle': 300,
     }
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('mssql+pyodbc'):
+        # executemany em um único round-trip no SQL Server (inserts em lote)
+        app.config['SQLALCHEMY_ENGINE_OPTIONS']['fast_executemany'] = True
     
     # Inicializa extensões
     CORS(app, origins="*", supports_credentials=True)
@@ -63,6 +74,12 @@ def create_app():
     # Inicializa banco de dados
     db.init_app(app)
     
+    # Inicializa fila de tarefas (envios em massa)
+    celery_init_app(app)
+    
+    # Gravação dos logs de auditoria em segundo plano
+    audit_sink.init_app(app)
+    
     # Registra blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(user_bp, url_prefix='/api/users')
@@ -84,6 +101,15 @@ def create_app():
     def missing_token_callback(error):
         return jsonify({'message': 'Token de autorização necessário'}), 401
     
+    # Logout e revogações por usuário (troca de roles, desativação)
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        return revocation_list.is_revoked(jwt_payload)
+    
+    @jwt.revoked_token_loader
+    def revoked_token_callback(jwt_header, jwt_payload):
+        return jsonify({'message': 'Token revogado'}), 401
+    
     # Middleware para logging de auditoria
     @app.before_request
     def log_request():
@@ -128,6 +154,10 @@ def create_app():
     # Cria tabelas (dados iniciais devem ser criados separadamente)
     with app.app_context():
         db.create_all()
+        run_migrations()
+    
+    # Dispara campanhas agendadas
+    campaign_scheduler.init_app(app)
     
     return app
 
@@ -176,7 +206,7 @@ def create_initial_data():
     }
     
     for role_name, role_config in roles_config.items():
-        role = Role.query.filter_by(name=role_name).first()
+        role = Role.query.options(selectinload(Role.permissions)).filter_by(name=role_name).first()
         if not role:
             role = Role(name=role_name, description=role_config['description'])
             db.session.add(role)
@@ -221,6 +251,7 @@ def create_initial_data():
 
 # Cria a aplicação
 app = create_app()
+celery_app = app.extensions['celery']
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,188 @@
+import logging
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db
+
+logger = logging.getLogger(__name__)
+
+# Versões aplicadas ficam registradas nesta tabela
+schema_migrations = db.Table(
+    'schema_migrations',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String(200), nullable=False),
+    db.Column('applied_at', db.DateTime, nullable=False)
+)
+
+
+def _add_column(connection, table_name, name, column_type, constraints=''):
+    """Adiciona a coluna se o banco ainda não a tiver"""
+    existing = {column['name'] for column in inspect(connection).get_columns(table_name)}
+    if name in existing:
+        return
+
+    # SQL Server não usa a palavra COLUMN
+    add = 'ADD' if connection.dialect.name == 'mssql' else 'ADD COLUMN'
+    ddl = f"ALTER TABLE {table_name} {add} {name} {column_type.compile(dialect=connection.dialect)} {constraints}"
+    connection.execute(text(ddl.strip()))
+
+
+def _create_indexes(connection, table, names):
+    """Cria os índices declarados no modelo que ainda não existem"""
+    existing = {index['name'] for index in inspect(connection).get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name in names and index.name not in existing:
+            index.create(connection)
+
+
+def _v1_outbox_lease_columns(connection):
+    from src.models.campaign import CampaignMessage
+
+    table_name = CampaignMessage.__table__.name
+    # Substituídas pelas colunas por canal (v6): tabelas novas já nascem com elas
+    existing = {column['name'] for column in inspect(connection).get_columns(table_name)}
+    if 'email_lease_owner' in existing:
+        return
+
+    _add_column(connection, table_name, 'lease_owner', db.String(100))
+    _add_column(connection, table_name, 'lease_expires_at', db.DateTime())
+    # Default preenche as mensagens já existentes
+    _add_column(connection, table_name, 'attempts', db.Integer(), 'DEFAULT 0 NOT NULL')
+
+
+def _v2_hot_query_indexes(connection):
+    from src.models.campaign import Campaign, CampaignMessage
+    from src.models.audit import AuditLog
+
+    _create_indexes(connection, Campaign.__table__, {'ix_campaign_status_scheduled_at'})
+    _create_indexes(connection, CampaignMessage.__table__, {
+        'ix_campaign_message_campaign_created',
+        'ix_campaign_message_campaign_email_status',
+        'ix_campaign_message_campaign_whatsapp_status',
+        'ix_campaign_message_leased'
+    })
+    _create_indexes(connection, AuditLog.__table__, {
+        'ix_audit_log_created_at',
+        'ix_audit_log_action_created',
+        'ix_audit_log_user_created',
+        'ix_audit_log_failures'
+    })
+
+
+def _v3_keyset_indexes(connection):
+    from src.models.campaign import CampaignMessage
+    from src.models.audit import AuditLog
+
+    # Substitui os índices de ordenação por (..., created_at, id), usados pela paginação por cursor
+    for table, old_name in ((CampaignMessage.__table__, 'ix_campaign_message_campaign_created'),
+                            (AuditLog.__table__, 'ix_audit_log_created_at')):
+        existing = {index['name'] for index in inspect(connection).get_indexes(table.name)}
+        if old_name in existing:
+            on_table = f" ON {table.name}" if connection.dialect.name in ('mssql', 'mysql', 'mariadb') else ''
+            connection.execute(text(f"DROP INDEX {old_name}{on_table}"))
+
+    _create_indexes(connection, CampaignMessage.__table__, {'ix_campaign_message_campaign_created_id'})
+    _create_indexes(connection, AuditLog.__table__, {'ix_audit_log_created_id'})
+
+
+def _v4_audit_changes_column(connection):
+    from src.models.audit import AuditLog
+
+    _add_column(connection, AuditLog.__table__.name, 'changes', db.Text())
+
+
+def _v5_audit_event_count_columns(connection):
+    from src.models.audit import AuditLog
+
+    table_name = AuditLog.__table__.name
+    # Default preenche os logs já existentes (um evento por linha)
+    _add_column(connection, table_name, 'event_count', db.Integer(), 'DEFAULT 1 NOT NULL')
+    _add_column(connection, table_name, 'last_seen_at', db.DateTime())
+
+
+def _v6_outbox_channel_lease_columns(connection):
+    from src.models.campaign import CampaignMessage
+
+    table = CampaignMessage.__table__
+    for channel in ('email', 'whatsapp'):
+        _add_column(connection, table.name, f'{channel}_lease_owner', db.String(100))
+        _add_column(connection, table.name, f'{channel}_lease_expires_at', db.DateTime())
+        _add_column(connection, table.name, f'{channel}_attempts', db.Integer(), 'DEFAULT 0 NOT NULL')
+
+    # Tentativas já feitas valem para os dois canais; leases em andamento não
+    # são migrados (aplicar com os workers parados)
+    existing = {column['name'] for column in inspect(connection).get_columns(table.name)}
+    if 'attempts' in existing:
+        connection.execute(text(
+            f"UPDATE {table.name} SET email_attempts = attempts, whatsapp_attempts = attempts "
+            f"WHERE attempts > 0"
+        ))
+
+    indexes = {index['name'] for index in inspect(connection).get_indexes(table.name)}
+    if 'ix_campaign_message_leased' in indexes:
+        on_table = f" ON {table.name}" if connection.dialect.name in ('mssql', 'mysql', 'mariadb') else ''
+        connection.execute(text(f"DROP INDEX ix_campaign_message_leased{on_table}"))
+    _create_indexes(connection, table, {'ix_campaign_message_email_leased', 'ix_campaign_message_whatsapp_leased'})
+
+
+def _v7_audit_recorded_at_column(connection):
+    from src.models.audit import AuditLog
+
+    table_name = AuditLog.__table__.name
+    _add_column(connection, table_name, 'recorded_at', db.DateTime())
+    # Logs existentes: o último evento é o mais próximo da gravação que se conhece
+    connection.execute(text(
+        f"UPDATE {table_name} SET recorded_at = COALESCE(last_seen_at, created_at) "
+        f"WHERE recorded_at IS NULL"
+    ))
+
+
+def _v8_revoked_token_revoked_at_index(connection):
+    from src.models.user import RevokedToken
+
+    _create_indexes(connection, RevokedToken.__table__, {'ix_revoked_token_revoked_at'})
+
+
+# (versão, descrição, função); novas migrações entram sempre no final
+MIGRATIONS = [
+    (1, 'Colunas de lease da outbox em campaign_message', _v1_outbox_lease_columns),
+    (2, 'Índices das consultas frequentes de mensagens, campanhas e auditoria', _v2_hot_query_indexes),
+    (3, 'Índices (created_at, id) para paginação por cursor', _v3_keyset_indexes),
+    (4, 'Coluna changes (diff compacto) em audit_log', _v4_audit_changes_column),
+    (5, 'Colunas event_count e last_seen_at (agrupamento) em audit_log', _v5_audit_event_count_columns),
+    (6, 'Lease e tentativas por canal na outbox de campaign_message', _v6_outbox_channel_lease_columns),
+    (7, 'Coluna recorded_at (momento da gravação) em audit_log', _v7_audit_recorded_at_column),
+    (8, 'Índice de revoked_at em revoked_token (sincronização das revogações)', _v8_revoked_token_revoked_at_index),
+]
+
+
+def run_migrations():
+    """
+    Aplica as migrações pendentes, em ordem, cada uma em sua transação
+
+    Deve rodar depois de db.create_all(): tabelas novas já nascem com as
+    colunas e índices dos modelos, e as migrações só completam bancos
+    criados por versões anteriores. Se dois processos iniciarem juntos, o
+    que perder a inserção da versão desfaz sua transação e segue.
+    """
+    engine = db.engine
+    schema_migrations.create(engine, checkfirst=True)
+
+    with engine.connect() as connection:
+        applied = set(connection.execute(db.select(schema_migrations.c.version)).scalars())
+
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+
+        try:
+            with engine.begin() as connection:
+                migrate(connection)
+                connection.execute(schema_migrations.insert().values(
+                    version=version,
+                    description=description,
+                    applied_at=datetime.utcnow()
+                ))
+            logger.info(f"Migração {version} aplicada: {description}")
+        except IntegrityError:
+            logger.info(f"Migração {version} já aplicada por outro processo")
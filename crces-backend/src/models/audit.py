@@ -3,6 +3,20 @@ import json
 from .user import db
 
 class AuditLog(db.Model):
+    __table_args__ = (
+        # Listagem e relatórios por período (id desempata o cursor)
+        db.Index('ix_audit_log_created_id', 'created_at', 'id'),
+        db.Index('ix_audit_log_action_created', 'action_type', 'created_at'),
+        db.Index('ix_audit_log_user_created', 'user_id', 'created_at'),
+        # Falhas recentes (parcial: uma fração pequena dos logs)
+        db.Index(
+            'ix_audit_log_failures', 'created_at',
+            sqlite_where=db.column('success') == False,
+            postgresql_where=db.column('success') == False,
+            mssql_where=db.column('success') == False
+        ),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     
     # Informações do usuário
@@ -17,6 +31,7 @@ class AuditLog(db.Model):
     # Detalhes da mudança
     old_values = db.Column(db.Text, nullable=True)  # JSON dos valores antigos
     new_values = db.Column(db.Text, nullable=True)  # JSON dos valores novos
+    changes = db.Column(db.Text, nullable=True)  # JSON compacto {coluna: [antigo, novo]}, só o que mudou
     
     # Informações da requisição
     ip_address = db.Column(db.String(45), nullable=True)  # IPv4 ou IPv6
@@ -31,11 +46,26 @@ class AuditLog(db.Model):
     # Dados adicionais
     additional_data = db.Column(db.Text, nullable=True)  # JSON para dados extras
     
-    # Timestamp
+    # Eventos idênticos agrupados na mesma linha (ver AUDIT_COALESCE_RULES)
+    event_count = db.Column(db.Integer, nullable=False, default=1)
+    
+    # Timestamp (primeiro evento; last_seen_at é o último quando agrupado)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_seen_at = db.Column(db.DateTime, nullable=True)
+    # Momento da gravação (o default roda no INSERT); com fila e agrupamento
+    # pode ser bem posterior a created_at. Usado pelo rollup (ver audit_rollup)
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def get_changes(self):
+        """Retorna as colunas alteradas como {coluna: [antigo, novo]}"""
+        if self.changes:
+            return json.loads(self.changes)
+        return {}
 
     def get_old_values(self):
         """Retorna os valores antigos como dicionário"""
+        if self.changes:
+            return {key: values[0] for key, values in self.get_changes().items()}
         if self.old_values:
             return json.loads(self.old_values)
         return {}
@@ -47,6 +77,8 @@ class AuditLog(db.Model):
 
     def get_new_values(self):
         """Retorna os valores novos como dicionário"""
+        if self.changes:
+            return {key: values[1] for key, values in self.get_changes().items()}
         if self.new_values:
             return json.loads(self.new_values)
         return {}
@@ -85,37 +117,52 @@ class AuditLog(db.Model):
             'success': self.success,
             'error_message': self.error_message,
             'additional_data': self.get_additional_data(),
-            'created_at': self.created_at.isoformat()
+            'event_count': self.event_count or 1,
+            'created_at': self.created_at.isoformat(),
+            'last_seen_at': self.last_seen_at.isoformat() if self.last_seen_at else None
         }
 
     @staticmethod
     def log_action(user_id=None, username=None, action_type=None, resource_type=None, 
                    resource_id=None, old_values=None, new_values=None, ip_address=None, 
                    user_agent=None, endpoint=None, method=None, success=True, 
-                   error_message=None, additional_data=None):
-        """Método estático para criar um log de auditoria"""
-        log = AuditLog(
-            user_id=user_id,
-            username=username,
-            action_type=action_type,
-            resource_type=resource_type,
-            resource_id=resource_id,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            endpoint=endpoint,
-            method=method,
-            success=success,
-            error_message=error_message
-        )
+                   error_message=None, additional_data=None, durable=False, changes=None):
+        """
+        Método estático para criar um log de auditoria
         
-        log.set_old_values(old_values)
-        log.set_new_values(new_values)
-        log.set_additional_data(additional_data)
+        A gravação passa pelo audit_sink: eventos de segurança e chamadas com
+        durable=True são gravados na hora, os demais em lote em segundo plano.
+        Em atualizações, prefira changes (de collect_changes) a snapshots
+        completos em old_values/new_values.
+        """
+        from src.services.audit_sink import audit_sink
+        from src.services.change_capture import encode_changes
         
-        db.session.add(log)
-        db.session.commit()
+        def dumps(values):
+            return json.dumps(values, default=str) if values else None
+        
+        row = {
+            'user_id': user_id,
+            'username': username,
+            'action_type': action_type,
+            'resource_type': resource_type,
+            'resource_id': resource_id,
+            'old_values': dumps(old_values),
+            'new_values': dumps(new_values),
+            'changes': encode_changes(changes),
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'endpoint': endpoint,
+            'method': method,
+            'success': success,
+            'error_message': error_message,
+            'additional_data': dumps(additional_data),
+            'event_count': 1,
+            'created_at': datetime.utcnow(),
+            'last_seen_at': None
+        }
         
-        return log
+        audit_sink.submit(AuditLog, row, durable=durable)
 
     def __repr__(self):
         return f'<AuditLog {self.action_type} {self.resource_type} by {self.username}>'
@@ -186,3 +233,76 @@ class SystemHealth(db.Model):
     def __repr__(self):
         return f'<SystemHealth {self.overall_status} at {self.created_at}>'
 
+
+
+class AuditDailyRollup(db.Model):
+    """Contagem diária pré-agregada dos logs de auditoria"""
+    __tablename__ = 'audit_daily_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'action_type', 'resource_type', 'username', 'success',
+                            name='uq_audit_daily_rollup_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    action_type = db.Column(db.String(100), nullable=False)
+    resource_type = db.Column(db.String(100), nullable=False)
+    username = db.Column(db.String(80), nullable=True)
+    success = db.Column(db.Boolean, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<AuditDailyRollup {self.day} {self.action_type} {self.count}>'
+
+
+class AuditRollupState(db.Model):
+    """Marca d'água da agregação: último id de AuditLog já somado"""
+    __tablename__ = 'audit_rollup_state'
+
+    name = db.Column(db.String(50), primary_key=True)
+    last_log_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<AuditRollupState {self.name} {self.last_log_id}>'
+
+
+class AuditArchive(db.Model):
+    """Manifesto dos arquivos de logs de auditoria arquivados (um por mês/parte)"""
+    __tablename__ = 'audit_archive'
+    __table_args__ = (
+        db.UniqueConstraint('month', 'part', name='uq_audit_archive_month_part'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Date, nullable=False, index=True)  # Primeiro dia do mês
+    part = db.Column(db.Integer, nullable=False, default=1)
+    path = db.Column(db.String(500), nullable=False)  # Relativo a AUDIT_ARCHIVE_DIR
+    row_count = db.Column(db.Integer, nullable=False)
+    min_log_id = db.Column(db.Integer, nullable=False)
+    max_log_id = db.Column(db.Integer, nullable=False)
+    first_created_at = db.Column(db.DateTime, nullable=False)
+    last_created_at = db.Column(db.DateTime, nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        """Converte a entrada do manifesto para dicionário"""
+        return {
+            'id': self.id,
+            'month': self.month.strftime('%Y-%m'),
+            'part': self.part,
+            'path': self.path,
+            'row_count': self.row_count,
+            'min_log_id': self.min_log_id,
+            'max_log_id': self.max_log_id,
+            'first_created_at': self.first_created_at.isoformat(),
+            'last_created_at': self.last_created_at.isoformat(),
+            'size_bytes': self.size_bytes,
+            'sha256': self.sha256,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<AuditArchive {self.month:%Y-%m} part {self.part} ({self.row_count} logs)>'
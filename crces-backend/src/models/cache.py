@@ -0,0 +1,13 @@
+from datetime import datetime
+from .user import db
+
+class CacheVersion(db.Model):
+    """Contador de versão de um cache em memória (incrementado a cada escrita)"""
+    __tablename__ = 'cache_version'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name} {self.version}>'
@@ -12,6 +12,7 @@ class CampaignStatus(Enum):
     DRAFT = "draft"
     SCHEDULED = "scheduled"
     RUNNING = "running"
+    PAUSED = "paused"
     COMPLETED = "completed"
     FAILED = "failed"
     CANCELLED = "cancelled"
@@ -24,7 +25,23 @@ class MessageStatus(Enum):
     FAILED = "failed"
     BOUNCED = "bounced"
 
+# Contador da campanha para cada status de mensagem, por canal
+STATUS_COUNTERS = {
+    ('email', MessageStatus.SENT): 'emails_sent',
+    ('email', MessageStatus.DELIVERED): 'emails_delivered',
+    ('email', MessageStatus.BOUNCED): 'emails_bounced',
+    ('whatsapp', MessageStatus.SENT): 'whatsapp_sent',
+    ('whatsapp', MessageStatus.DELIVERED): 'whatsapp_delivered',
+    ('whatsapp', MessageStatus.READ): 'whatsapp_read',
+    ('whatsapp', MessageStatus.FAILED): 'whatsapp_failed',
+}
+
 class Campaign(db.Model):
+    # Consulta do scheduler: campanhas agendadas por horário
+    __table_args__ = (
+        db.Index('ix_campaign_status_scheduled_at', 'status', 'scheduled_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
@@ -77,45 +94,50 @@ class Campaign(db.Model):
         """Define os critérios de seleção"""
         self.selection_criteria = json.dumps(criteria)
 
+    @staticmethod
+    def apply_status_deltas(campaign_id, channel, deltas):
+        """
+        Soma atomicamente variações de status aos contadores (sem commit)
+
+        Cada transição de mensagem entra como -1 no status antigo e +1 no
+        novo (ex.: {SENT: -1, DELIVERED: 1}); contadores são atualizados com
+        x = x + n, sem reler as mensagens.
+        """
+        values = {}
+        for status, delta in deltas.items():
+            counter = STATUS_COUNTERS.get((channel, status))
+            if counter and delta:
+                column = getattr(Campaign, counter)
+                values[counter] = column + delta
+
+        if values:
+            db.session.execute(db.update(Campaign).where(Campaign.id == campaign_id).values(**values))
+
     def update_statistics(self):
-        """Atualiza as estatísticas da campanha baseado nas mensagens"""
-        email_stats = db.session.query(
-            db.func.count(CampaignMessage.id).label('total'),
-            db.func.sum(db.case([(CampaignMessage.email_status == MessageStatus.SENT, 1)], else_=0)).label('sent'),
-            db.func.sum(db.case([(CampaignMessage.email_status == MessageStatus.DELIVERED, 1)], else_=0)).label('delivered'),
-            db.func.sum(db.case([(CampaignMessage.email_opened == True, 1)], else_=0)).label('opened'),
-            db.func.sum(db.case([(CampaignMessage.email_clicked == True, 1)], else_=0)).label('clicked'),
-            db.func.sum(db.case([(CampaignMessage.email_status == MessageStatus.BOUNCED, 1)], else_=0)).label('bounced')
-        ).filter(
-            CampaignMessage.campaign_id == self.id,
-            CampaignMessage.email_sent_at.isnot(None)
-        ).first()
-
-        whatsapp_stats = db.session.query(
-            db.func.count(CampaignMessage.id).label('total'),
-            db.func.sum(db.case([(CampaignMessage.whatsapp_status == MessageStatus.SENT, 1)], else_=0)).label('sent'),
-            db.func.sum(db.case([(CampaignMessage.whatsapp_status == MessageStatus.DELIVERED, 1)], else_=0)).label('delivered'),
-            db.func.sum(db.case([(CampaignMessage.whatsapp_status == MessageStatus.READ, 1)], else_=0)).label('read'),
-            db.func.sum(db.case([(CampaignMessage.whatsapp_status == MessageStatus.FAILED, 1)], else_=0)).label('failed')
-        ).filter(
-            CampaignMessage.campaign_id == self.id,
-            CampaignMessage.whatsapp_sent_at.isnot(None)
-        ).first()
-
-        if email_stats:
-            self.emails_sent = email_stats.sent or 0
-            self.emails_delivered = email_stats.delivered or 0
-            self.emails_opened = email_stats.opened or 0
-            self.emails_clicked = email_stats.clicked or 0
-            self.emails_bounced = email_stats.bounced or 0
-
-        if whatsapp_stats:
-            self.whatsapp_sent = whatsapp_stats.sent or 0
-            self.whatsapp_delivered = whatsapp_stats.delivered or 0
-            self.whatsapp_read = whatsapp_stats.read or 0
-            self.whatsapp_failed = whatsapp_stats.failed or 0
+        """
+        Recalcula as estatísticas a partir das mensagens
 
+        Os contadores são mantidos de forma incremental durante o envio; esta
+        reconciliação corrige desvios e roda periodicamente, não a cada
+        consulta. É um único UPDATE, para não sobrescrever incrementos
+        gravados entre a leitura e a escrita.
+        """
+        def count(*conditions):
+            return db.select(db.func.count(CampaignMessage.id)).where(
+                CampaignMessage.campaign_id == Campaign.id,
+                *conditions
+            ).scalar_subquery()
+
+        values = {
+            counter: count(getattr(CampaignMessage, f'{channel}_status') == status)
+            for (channel, status), counter in STATUS_COUNTERS.items()
+        }
+        values['emails_opened'] = count(CampaignMessage.email_opened == True)
+        values['emails_clicked'] = count(CampaignMessage.email_clicked == True)
+
+        db.session.execute(db.update(Campaign).where(Campaign.id == self.id).values(**values))
         db.session.commit()
+        db.session.refresh(self)
 
     def to_dict(self, include_messages=False):
         """Converte a campanha para dicionário"""
@@ -160,6 +182,24 @@ class Campaign(db.Model):
 
 
 class CampaignMessage(db.Model):
+    __table_args__ = (
+        # Listagem das mensagens da campanha, ordenada por criação (id desempata o cursor)
+        db.Index('ix_campaign_message_campaign_created_id', 'campaign_id', 'created_at', 'id'),
+        # Outbox, filtros e reconciliação das estatísticas por canal
+        db.Index('ix_campaign_message_campaign_email_status', 'campaign_id', 'email_status'),
+        db.Index('ix_campaign_message_campaign_whatsapp_status', 'campaign_id', 'whatsapp_status'),
+        # Leases ativos por canal (parciais: só mensagens reservadas por algum worker)
+        *(
+            db.Index(
+                f'ix_campaign_message_{channel}_leased', 'campaign_id', f'{channel}_lease_expires_at',
+                sqlite_where=db.column(f'{channel}_lease_expires_at').isnot(None),
+                postgresql_where=db.column(f'{channel}_lease_expires_at').isnot(None),
+                mssql_where=db.column(f'{channel}_lease_expires_at').isnot(None)
+            )
+            for channel in ('email', 'whatsapp')
+        ),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     campaign_id = db.Column(db.Integer, nullable=False)  # Removida FK temporariamente
     
@@ -189,6 +229,15 @@ class CampaignMessage(db.Model):
     # Dados adicionais (JSON)
     additional_data = db.Column(db.Text, nullable=True)  # JSON string para dados extras
     
+    # Outbox: lease do worker que está enviando a mensagem, por canal (em
+    # campanhas de email e WhatsApp os dois jobs percorrem as mesmas linhas)
+    email_lease_owner = db.Column(db.String(100), nullable=True)
+    email_lease_expires_at = db.Column(db.DateTime, nullable=True)
+    email_attempts = db.Column(db.Integer, default=0, nullable=False)
+    whatsapp_lease_owner = db.Column(db.String(100), nullable=True)
+    whatsapp_lease_expires_at = db.Column(db.DateTime, nullable=True)
+    whatsapp_attempts = db.Column(db.Integer, default=0, nullable=False)
+    
     # Controle
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -220,14 +269,16 @@ class CampaignMessage(db.Model):
                 'opened_at': self.email_opened_at.isoformat() if self.email_opened_at else None,
                 'clicked': self.email_clicked,
                 'clicked_at': self.email_clicked_at.isoformat() if self.email_clicked_at else None,
-                'error_message': self.email_error_message
+                'error_message': self.email_error_message,
+                'attempts': self.email_attempts
             },
             'whatsapp': {
                 'status': self.whatsapp_status.value if self.whatsapp_status else None,
                 'sent_at': self.whatsapp_sent_at.isoformat() if self.whatsapp_sent_at else None,
                 'delivered_at': self.whatsapp_delivered_at.isoformat() if self.whatsapp_delivered_at else None,
                 'read_at': self.whatsapp_read_at.isoformat() if self.whatsapp_read_at else None,
-                'error_message': self.whatsapp_error_message
+                'error_message': self.whatsapp_error_message,
+                'attempts': self.whatsapp_attempts
             },
             'additional_data': self.get_additional_data(),
             'created_at': self.created_at.isoformat(),
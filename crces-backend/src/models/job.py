@@ -0,0 +1,70 @@
+from datetime import datetime
+import json
+import uuid
+from .user import db
+
+class MessagingJob(db.Model):
+    """Job assíncrono de envio em massa"""
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    job_type = db.Column(db.String(50), nullable=False)  # 'bulk_whatsapp', 'bulk_email'
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, paused, failed
+
+    campaign_id = db.Column(db.Integer, nullable=True)
+    task_id = db.Column(db.String(155), nullable=True)  # ID da tarefa no Celery
+
+    # Progresso
+    total = db.Column(db.Integer, default=0)
+    processed = db.Column(db.Integer, default=0)
+    successful = db.Column(db.Integer, default=0)
+    failed = db.Column(db.Integer, default=0)
+
+    error_message = db.Column(db.Text, nullable=True)
+
+    # Parâmetros do envio (templates, intervalo) em JSON
+    params = db.Column(db.Text, nullable=True)
+
+    # Controle
+    created_by = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def get_params(self):
+        """Retorna os parâmetros do envio como dicionário"""
+        if self.params:
+            return json.loads(self.params)
+        return {}
+
+    def set_params(self, params):
+        """Define os parâmetros do envio"""
+        self.params = json.dumps(params)
+
+    @property
+    def progress(self):
+        """Percentual concluído"""
+        if not self.total:
+            return 0.0
+        return round(self.processed * 100.0 / self.total, 1)
+
+    def to_dict(self):
+        """Converte o job para dicionário"""
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'campaign_id': self.campaign_id,
+            'total': self.total,
+            'processed': self.processed,
+            'successful': self.successful,
+            'failed': self.failed,
+            'progress': self.progress,
+            'error_message': self.error_message,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f'<MessagingJob {self.id} {self.job_type} {self.status}>'
@@ -3,6 +3,16 @@ import json
 import re
 from .user import db
 
+def _render_field(template, field, variables):
+    """Renderiza um campo com o template compilado em cache por (id, versão, campo)"""
+    from src.services.template_renderer import template_cache, PLACEHOLDER_ANY
+
+    key = (template.__tablename__, template.id, template.version, field) if template.id else None
+    compiled = template_cache.get(getattr(template, field), key, PLACEHOLDER_ANY,
+                                  declared=template.get_available_variables() or None)
+    # Converte valor para string se não for
+    return compiled.render(variables, lambda value: str(value) if value is not None else '')
+
 class EmailTemplate(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
@@ -62,30 +72,11 @@ class EmailTemplate(db.Model):
         if variables is None:
             variables = {}
         
-        rendered_subject = self.subject
-        rendered_html = self.html_content
-        rendered_text = self.text_content
-        
         # Substitui variáveis no formato {{variable}} e {variable}
-        for var_name, var_value in variables.items():
-            # Converte valor para string se não for
-            str_value = str(var_value) if var_value is not None else ''
-            
-            # Substitui ambos os formatos
-            rendered_subject = rendered_subject.replace(f'{{{{{var_name}}}}}', str_value)
-            rendered_subject = rendered_subject.replace(f'{{{var_name}}}', str_value)
-            
-            rendered_html = rendered_html.replace(f'{{{{{var_name}}}}}', str_value)
-            rendered_html = rendered_html.replace(f'{{{var_name}}}', str_value)
-            
-            if rendered_text:
-                rendered_text = rendered_text.replace(f'{{{{{var_name}}}}}', str_value)
-                rendered_text = rendered_text.replace(f'{{{var_name}}}', str_value)
-        
         return {
-            'subject': rendered_subject,
-            'html_content': rendered_html,
-            'text_content': rendered_text
+            'subject': _render_field(self, 'subject', variables),
+            'html_content': _render_field(self, 'html_content', variables),
+            'text_content': _render_field(self, 'text_content', variables) if self.text_content else self.text_content
         }
 
     def validate_template(self):
@@ -207,25 +198,11 @@ class WhatsAppTemplate(db.Model):
         if variables is None:
             variables = {}
         
-        rendered_message = self.message_content
-        rendered_caption = self.attachment_caption
-        
         # Substitui variáveis no formato {{variable}} e {variable}
-        for var_name, var_value in variables.items():
-            # Converte valor para string se não for
-            str_value = str(var_value) if var_value is not None else ''
-            
-            # Substitui ambos os formatos
-            rendered_message = rendered_message.replace(f'{{{{{var_name}}}}}', str_value)
-            rendered_message = rendered_message.replace(f'{{{var_name}}}', str_value)
-            
-            if rendered_caption:
-                rendered_caption = rendered_caption.replace(f'{{{{{var_name}}}}}', str_value)
-                rendered_caption = rendered_caption.replace(f'{{{var_name}}}', str_value)
-        
         return {
-            'message_content': rendered_message,
-            'attachment_caption': rendered_caption,
+            'message_content': _render_field(self, 'message_content', variables),
+            'attachment_caption': (_render_field(self, 'attachment_caption', variables)
+                                   if self.attachment_caption else self.attachment_caption),
             'has_attachment': self.has_attachment,
             'attachment_type': self.attachment_type
         }
@@ -1,5 +1,4 @@
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
 from datetime import datetime, timedelta
 import pyotp
 import qrcode
@@ -7,7 +6,6 @@ import io
 import base64
 
 db = SQLAlchemy()
-bcrypt = Bcrypt()
 
 # Tabela de associação para many-to-many entre User e Role
 user_roles = db.Table('user_roles',
@@ -36,19 +34,34 @@ class User(db.Model):
     failed_login_attempts = db.Column(db.Integer, default=0)
     locked_until = db.Column(db.DateTime, nullable=True)
     
-    # Relacionamentos
-    roles = db.relationship('Role', secondary=user_roles, lazy='subquery',
-                           backref=db.backref('users', lazy=True))
+    # Relacionamentos (carregados só quando acessados; listagens usam selectinload)
+    roles = db.relationship('Role', secondary=user_roles, lazy='select',
+                           backref=db.backref('users', lazy='raise'))
 
     def set_password(self, password):
         """Define a senha do usuário com hash seguro"""
         import secrets
+        from src.services.password_hashing import password_hasher
         self.salt = secrets.token_hex(16)
-        self.password_hash = bcrypt.generate_password_hash(password + self.salt).decode('utf-8')
+        self.password_hash = password_hasher.hash(password + self.salt)
 
     def check_password(self, password):
-        """Verifica se a senha está correta"""
-        return bcrypt.check_password_hash(self.password_hash, password + self.salt)
+        """
+        Verifica se a senha está correta (bcrypt no pool de processos)
+
+        Raises:
+            PasswordHasherBusy: Se a fila de verificações estiver cheia
+        """
+        from src.services.password_hashing import password_hasher
+        return password_hasher.check(password + self.salt, self.password_hash)
+
+    def upgrade_password_hash(self, password):
+        """Refaz o hash no custo configurado; chamar só após check_password bem-sucedido"""
+        from src.services.password_hashing import password_hasher
+        if not password_hasher.needs_rehash(self.password_hash):
+            return False
+        self.password_hash = password_hasher.hash(password + self.salt)
+        return True
 
     def generate_mfa_secret(self):
         """Gera um novo secret para MFA"""
@@ -148,9 +161,9 @@ class Role(db.Model):
     description = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Relacionamentos
+    # Relacionamentos (Role.users e Permission.roles não são navegados: lazy='raise' evita N+1 acidental)
     permissions = db.relationship('Permission', secondary='role_permissions', 
-                                 lazy='subquery', backref=db.backref('roles', lazy=True))
+                                 lazy='select', backref=db.backref('roles', lazy='raise'))
 
     def to_dict(self):
         return {
@@ -187,3 +200,16 @@ role_permissions = db.Table('role_permissions',
     db.Column('permission_id', db.Integer, db.ForeignKey('permission.id'), primary_key=True)
 )
 
+
+class RevokedToken(db.Model):
+    """Revogação de JWT: um token (jti) ou todos os emitidos para um usuário até revoked_at"""
+    __tablename__ = 'revoked_token'
+
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(64), nullable=True, index=True)  # Vazio: revoga os tokens do usuário
+    user_id = db.Column(db.Integer, nullable=True)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # Depois disso o token já expirou
+
+    def __repr__(self):
+        return f'<RevokedToken {self.jti or f"user {self.user_id}"}>'
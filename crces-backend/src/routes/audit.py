@@ -1,27 +1,44 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import or_, and_, desc
+from sqlalchemy import or_, and_, desc, func
 from datetime import datetime, timedelta
+from collections import Counter
+from itertools import chain, islice
 
 from src.models.user import User
-from src.models.audit import db, AuditLog, SystemHealth
+from src.models.audit import db, AuditLog, AuditArchive, SystemHealth
+from src.services.pagination import keyset_page, cursor_pagination
+from src.services.audit_rollup import get_rollup_rows
+from src.services.audit_sink import audit_sink
+from src.services.authorization import require_permission, permission_cache
+from src.services.template_cache import email_template_cache, whatsapp_template_cache
+from src.services.template_renderer import template_cache as compiled_template_cache
+from src.services.export_stream import EXPORT_FORMATS, iter_rows, stream_export
+from src.services.audit_archive import (
+    RETENTION_DAYS, ArchiveUnavailable, archive_cutoff, archived_entries, archived_slice, archived_total,
+    iter_archived_logs, extend_keyset_page
+)
 
 audit_bp = Blueprint('audit', __name__)
 
-def require_permission(permission_name):
-    """Decorator para verificar permissões"""
-    def decorator(f):
-        def decorated_function(*args, **kwargs):
-            current_user_id = get_jwt_identity()
-            user = User.query.get(current_user_id)
-            
-            if not user or not user.has_permission(permission_name):
-                return jsonify({'message': 'Permissão insuficiente'}), 403
-            
-            return f(*args, **kwargs)
-        decorated_function.__name__ = f.__name__
-        return decorated_function
-    return decorator
+def _archive_match(user_filter, action_filter, resource_filter, success_filter):
+    """Os mesmos filtros da consulta, aplicados aos logs arquivados (None sem filtros)"""
+    if not (user_filter or action_filter or resource_filter or success_filter):
+        return None
+
+    def match(log):
+        if user_filter:
+            by_id = user_filter.isdigit() and log.user_id == int(user_filter)
+            if not by_id and user_filter.lower() not in (log.username or '').lower():
+                return False
+        if action_filter and action_filter.lower() not in (log.action_type or '').lower():
+            return False
+        if resource_filter and resource_filter.lower() not in (log.resource_type or '').lower():
+            return False
+        if success_filter and bool(log.success) != (success_filter.lower() == 'true'):
+            return False
+        return True
+    return match
 
 @audit_bp.route('/logs', methods=['GET'])
 @jwt_required()
@@ -69,6 +86,7 @@ def get_audit_logs():
             query = query.filter(AuditLog.success == is_success)
         
         # Filtro por data
+        date_from_obj = date_to_obj = None
         if date_from:
             try:
                 date_from_obj = datetime.fromisoformat(date_from.replace('Z', '+00:00'))
@@ -83,9 +101,63 @@ def get_audit_logs():
             except ValueError:
                 return jsonify({'message': 'Formato de data_to inválido'}), 400
         
+        # Meses arquivados alcançados pelo filtro de data
+        archives = archived_entries(date_from_obj, date_to_obj)
+        match = _archive_match(user_filter, action_filter, resource_filter, success_filter)
+        
+        # Modo cursor: paginação por posição, sem OFFSET nem COUNT
+        if 'cursor' in request.args:
+            limit = max(1, min(request.args.get('limit', per_page, type=int), 200))
+            try:
+                result = keyset_page(
+                    query, AuditLog.created_at, AuditLog.id,
+                    request.args.get('cursor'), limit,
+                    include_total=request.args.get('include_total', '').lower() == 'true'
+                )
+                if archives:
+                    result = extend_keyset_page(result, archives, limit, request.args.get('cursor'),
+                                                date_from_obj, date_to_obj, match)
+            except ValueError:
+                return jsonify({'message': 'Cursor inválido'}), 400
+            
+            return jsonify({
+                'logs': [log.to_dict() for log in result['items']],
+                'pagination': cursor_pagination(result, limit)
+            }), 200
+        
         # Ordena por data de criação (mais recentes primeiro)
         query = query.order_by(desc(AuditLog.created_at))
         
+        if archives:
+            # Tabela primeiro, depois os arquivos (todos mais antigos); o
+            # total fica de fora (None) quando exigiria ler todos os arquivos
+            hot_total = query.order_by(None).count()
+            offset = (page - 1) * per_page
+            items = query.offset(offset).limit(per_page).all() if offset < hot_total else []
+            more_archived = False
+            if offset + per_page >= hot_total:
+                # Um item a mais indica se há próxima página
+                missing = per_page - len(items)
+                archived = archived_slice(archives, max(0, offset - hot_total), missing + 1,
+                                          date_from_obj, date_to_obj, match)
+                items.extend(archived[:missing])
+                more_archived = len(archived) > missing
+            archived_count = archived_total(archives, date_from_obj, date_to_obj, match)
+            total = hot_total + archived_count if archived_count is not None else None
+            pages = (total + per_page - 1) // per_page if total is not None else None
+            
+            return jsonify({
+                'logs': [log.to_dict() for log in items],
+                'pagination': {
+                    'page': page,
+                    'per_page': per_page,
+                    'total': total,
+                    'pages': pages,
+                    'has_next': offset + per_page < hot_total or more_archived,
+                    'has_prev': page > 1
+                }
+            }), 200
+        
         # Paginação
         logs = query.paginate(
             page=page, 
@@ -105,6 +177,9 @@ def get_audit_logs():
             }
         }), 200
         
+    except ArchiveUnavailable as e:
+        current_app.logger.error(f"Erro ao listar logs de auditoria: {str(e)}")
+        return jsonify({'message': 'Logs arquivados do período indisponíveis no servidor'}), 503
     except Exception as e:
         current_app.logger.error(f"Erro ao listar logs de auditoria: {str(e)}")
         return jsonify({'message': 'Erro interno do servidor'}), 500
@@ -136,69 +211,38 @@ def get_audit_summary():
     try:
         # Período para análise (últimos 30 dias por padrão)
         days = request.args.get('days', 30, type=int)
-        date_from = datetime.utcnow() - timedelta(days=days)
-        
-        # Estatísticas gerais
-        total_logs = AuditLog.query.filter(AuditLog.created_at >= date_from).count()
-        successful_actions = AuditLog.query.filter(
-            and_(AuditLog.created_at >= date_from, AuditLog.success == True)
-        ).count()
-        failed_actions = AuditLog.query.filter(
-            and_(AuditLog.created_at >= date_from, AuditLog.success == False)
-        ).count()
-        
-        # Top usuários mais ativos
-        top_users = db.session.query(
-            AuditLog.username,
-            db.func.count(AuditLog.id).label('action_count')
-        ).filter(
-            AuditLog.created_at >= date_from
-        ).group_by(
-            AuditLog.username
-        ).order_by(
-            desc('action_count')
-        ).limit(10).all()
-        
-        # Top ações mais realizadas
-        top_actions = db.session.query(
-            AuditLog.action_type,
-            db.func.count(AuditLog.id).label('action_count')
-        ).filter(
-            AuditLog.created_at >= date_from
-        ).group_by(
-            AuditLog.action_type
-        ).order_by(
-            desc('action_count')
-        ).limit(10).all()
-        
-        # Top recursos mais acessados
-        top_resources = db.session.query(
-            AuditLog.resource_type,
-            db.func.count(AuditLog.id).label('access_count')
-        ).filter(
-            AuditLog.created_at >= date_from
-        ).group_by(
-            AuditLog.resource_type
-        ).order_by(
-            desc('access_count')
-        ).limit(10).all()
+        today = datetime.utcnow().date()
+        day_from = today - timedelta(days=days)
+        
+        # Contagens diárias pré-agregadas (mais os logs ainda não agregados)
+        rows = get_rollup_rows(day_from)
+        
+        total_logs = sum(row.count for row in rows)
+        successful_actions = sum(row.count for row in rows if row.success)
+        failed_actions = total_logs - successful_actions
+        
+        def top(field):
+            counts = Counter()
+            for row in rows:
+                counts[getattr(row, field)] += row.count
+            return counts.most_common(10)
+        
+        # Top usuários, ações e recursos
+        top_users = top('username')
+        top_actions = top('action_type')
+        top_resources = top('resource_type')
         
         # Atividade por dia (últimos 7 dias)
+        per_day = Counter()
+        for row in rows:
+            per_day[row.day] += row.count
+        
         daily_activity = []
         for i in range(7):
-            day_start = (datetime.utcnow() - timedelta(days=i)).replace(hour=0, minute=0, second=0, microsecond=0)
-            day_end = day_start + timedelta(days=1)
-            
-            day_count = AuditLog.query.filter(
-                and_(
-                    AuditLog.created_at >= day_start,
-                    AuditLog.created_at < day_end
-                )
-            ).count()
-            
+            day = today - timedelta(days=i)
             daily_activity.append({
-                'date': day_start.strftime('%Y-%m-%d'),
-                'count': day_count
+                'date': day.strftime('%Y-%m-%d'),
+                'count': per_day[day]
             })
         
         daily_activity.reverse()  # Ordem cronológica
@@ -239,21 +283,24 @@ def get_system_health():
         # Estatísticas dos últimos 7 dias
         date_from_week = datetime.utcnow() - timedelta(days=7)
         
+        # Eventos agrupados contam event_count
+        event_total = func.coalesce(func.sum(AuditLog.event_count), 0)
+        
         # Contagem de logs de erro nas últimas 24h
-        error_logs_24h = AuditLog.query.filter(
+        error_logs_24h = db.session.query(event_total).filter(
             and_(
                 AuditLog.created_at >= date_from,
                 AuditLog.success == False
             )
-        ).count()
+        ).scalar()
         
         # Contagem de logins nas últimas 24h
-        logins_24h = AuditLog.query.filter(
+        logins_24h = db.session.query(event_total).filter(
             and_(
                 AuditLog.created_at >= date_from,
                 AuditLog.action_type == 'LOGIN_SUCCESS'
             )
-        ).count()
+        ).scalar()
         
         # Usuários únicos ativos nas últimas 24h
         active_users_24h = db.session.query(AuditLog.user_id).filter(
@@ -270,6 +317,13 @@ def get_system_health():
                 'error_logs_24h': error_logs_24h,
                 'logins_24h': logins_24h,
                 'active_users_24h': active_users_24h
+            },
+            'audit_sink': audit_sink.get_stats(),
+            'permission_cache': permission_cache.get_stats(),
+            'template_cache': {
+                'email': email_template_cache.get_stats(),
+                'whatsapp': whatsapp_template_cache.get_stats(),
+                'compiled': compiled_template_cache.get_stats()
             }
         }), 200
         
@@ -313,13 +367,44 @@ def record_system_health():
         current_app.logger.error(f"Erro ao registrar métricas de saúde: {str(e)}")
         return jsonify({'message': 'Erro interno do servidor'}), 500
 
+EXPORT_COLUMNS = (AuditLog.id, AuditLog.created_at, AuditLog.username, AuditLog.user_id,
+                  AuditLog.action_type, AuditLog.resource_type, AuditLog.resource_id,
+                  AuditLog.success, AuditLog.ip_address, AuditLog.error_message)
+
+EXPORT_FIELDS = ['id', 'timestamp', 'user', 'action', 'resource', 'resource_id',
+                 'success', 'ip_address', 'error_message']
+
+def _export_row(row):
+    """Linha da exportação em streaming (mesmos campos da exportação JSON)"""
+    return {
+        'id': row.id,
+        'timestamp': row.created_at.isoformat(),
+        'user': row.username or f"ID:{row.user_id}",
+        'action': row.action_type,
+        'resource': row.resource_type,
+        'resource_id': row.resource_id,
+        'success': row.success,
+        'ip_address': row.ip_address,
+        'error_message': row.error_message
+    }
+
 @audit_bp.route('/logs/export', methods=['POST'])
 @jwt_required()
 @require_permission('view_audit_logs')
 def export_audit_logs():
-    """Exporta logs de auditoria em formato CSV"""
+    """
+    Exporta logs de auditoria
+    
+    Com 'format' = 'csv' ou 'ndjson' o arquivo é gerado em streaming, sem
+    limite de registros ('compress': true envia em gzip). Sem 'format',
+    mantém a resposta JSON limitada a 10000 registros.
+    """
     try:
         data = request.get_json() or {}
+        export_format = data.get('format', '')
+        
+        if export_format and export_format not in EXPORT_FORMATS:
+            return jsonify({'message': 'Formato de exportação inválido'}), 400
         
         # Filtros similares ao get_audit_logs
         user_filter = data.get('user', '')
@@ -351,6 +436,7 @@ def export_audit_logs():
             is_success = success_filter.lower() == 'true'
             query = query.filter(AuditLog.success == is_success)
         
+        date_from_obj = date_to_obj = None
         if date_from:
             try:
                 date_from_obj = datetime.fromisoformat(date_from.replace('Z', '+00:00'))
@@ -365,8 +451,45 @@ def export_audit_logs():
             except ValueError:
                 return jsonify({'message': 'Formato de data_to inválido'}), 400
         
+        # Meses arquivados entram depois da tabela (são todos mais antigos)
+        archives = archived_entries(date_from_obj, date_to_obj)
+        archived = iter_archived_logs(
+            archives, date_from_obj, date_to_obj,
+            _archive_match(user_filter, action_filter, resource_filter, success_filter)
+        )
+        
+        if export_format:
+            statement = query.with_entities(*EXPORT_COLUMNS).order_by(
+                desc(AuditLog.created_at), desc(AuditLog.id)
+            ).statement
+            rows = (_export_row(row) for row in chain(iter_rows(statement), archived))
+            
+            current_user_id = get_jwt_identity()
+            current_user = User.query.get(current_user_id)
+            
+            # Registrada ao fim do streaming, com o total efetivamente enviado
+            def log_export(count):
+                AuditLog.log_action(
+                    user_id=current_user_id,
+                    username=current_user.username if current_user else None,
+                    action_type='EXPORT',
+                    resource_type='AuditLog',
+                    new_values={'count': count, 'format': export_format, 'filters': data},
+                    ip_address=request.remote_addr,
+                    user_agent=request.headers.get('User-Agent'),
+                    endpoint=request.endpoint,
+                    method=request.method,
+                    success=True,
+                    durable=True
+                )
+            
+            filename = f"audit_logs_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+            return stream_export(rows, EXPORT_FIELDS, export_format, filename,
+                                 compress=bool(data.get('compress')), on_complete=log_export)
+        
         # Limita a 10000 registros para evitar sobrecarga
         logs = query.order_by(desc(AuditLog.created_at)).limit(10000).all()
+        logs.extend(islice(archived, 10000 - len(logs)))
         
         # Converte para formato de exportação
         export_data = []
@@ -389,7 +512,28 @@ def export_audit_logs():
             'total_records': len(export_data)
         }), 200
         
+    except ArchiveUnavailable as e:
+        current_app.logger.error(f"Erro ao exportar logs de auditoria: {str(e)}")
+        return jsonify({'message': 'Logs arquivados do período indisponíveis no servidor'}), 503
     except Exception as e:
         current_app.logger.error(f"Erro ao exportar logs de auditoria: {str(e)}")
         return jsonify({'message': 'Erro interno do servidor'}), 500
 
+
+@audit_bp.route('/archives', methods=['GET'])
+@jwt_required()
+@require_permission('view_audit_logs')
+def get_audit_archives():
+    """Lista o manifesto dos logs de auditoria arquivados"""
+    try:
+        archives = AuditArchive.query.order_by(desc(AuditArchive.month), AuditArchive.part).all()
+        
+        return jsonify({
+            'archives': [archive.to_dict() for archive in archives],
+            'retention_days': RETENTION_DAYS,
+            'hot_since': archive_cutoff().isoformat()
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Erro ao listar arquivos de auditoria: {str(e)}")
+        return jsonify({'message': 'Erro interno do servidor'}), 500
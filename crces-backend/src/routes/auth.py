@@ -6,22 +6,37 @@ from flask_jwt_extended import (
 from datetime import datetime, timedelta
 import secrets
 import json
+import os
 
 from src.models.user import db, User, Role
 from src.models.audit import AuditLog
+from src.services.token_verification import revocation_list
+from src.services.rate_limiter import rate_limiter
+from src.services.password_hashing import PasswordHasherBusy
 
 auth_bp = Blueprint('auth', __name__)
 
-# Lista de tokens revogados (em produção, usar Redis)
-revoked_tokens = set()
+# Tentativas de login por IP e por usuário na janela, recusadas antes do bcrypt
+LOGIN_RATE_WINDOW = int(os.getenv('LOGIN_RATE_WINDOW', '300'))
+LOGIN_RATE_LIMIT_IP = int(os.getenv('LOGIN_RATE_LIMIT_IP', '100'))
+LOGIN_RATE_LIMIT_USER = int(os.getenv('LOGIN_RATE_LIMIT_USER', '10'))
+
+def _login_rate_limited(username):
+    """Verificação barata feita antes de buscar o usuário e calcular o hash"""
+    for key, limit in ((f'login:ip:{request.remote_addr}', LOGIN_RATE_LIMIT_IP),
+                       (f'login:user:{username.lower()}', LOGIN_RATE_LIMIT_USER)):
+        allowed, retry_after = rate_limiter.hit(key, limit, LOGIN_RATE_WINDOW)
+        if not allowed:
+            return retry_after
+    return None
 
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """Endpoint de login com suporte a MFA"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
         
-        if not data:
+        if not data or not isinstance(data, dict):
             return jsonify({'message': 'Dados não fornecidos'}), 400
         
         username = data.get('username')
@@ -31,6 +46,18 @@ def login():
         if not username or not password:
             return jsonify({'message': 'Username e password são obrigatórios'}), 400
         
+        # Antes do rate limit, que normaliza o username
+        if not isinstance(username, str) or not isinstance(password, str):
+            return jsonify({'message': 'Username e password devem ser texto'}), 400
+        
+        retry_after = _login_rate_limited(username)
+        if retry_after is not None:
+            current_app.logger.warning(f"Rate limit de login excedido: {username} de {request.remote_addr}")
+            return jsonify({
+                'message': 'Muitas tentativas de login. Tente novamente mais tarde.',
+                'retry_after': retry_after
+            }), 429, {'Retry-After': str(retry_after)}
+        
         # Busca usuário
         user = User.query.filter(
             (User.username == username) | (User.email == username)
@@ -151,17 +178,19 @@ def login():
         # Login bem-sucedido
         user.failed_login_attempts = 0
         user.last_login = datetime.utcnow()
+        # Migra o hash para o custo atual (BCRYPT_LOG_ROUNDS) sem exigir troca de senha
+        user.upgrade_password_hash(password)
         db.session.commit()
         
         # Cria tokens JWT
         access_token = create_access_token(
-            identity=user.id,
+            identity=str(user.id),
             additional_claims={
                 'username': user.username,
                 'roles': [role.name for role in user.roles]
             }
         )
-        refresh_token = create_refresh_token(identity=user.id)
+        refresh_token = create_refresh_token(identity=str(user.id))
         
         # Log login bem-sucedido
         AuditLog.log_action(
@@ -184,6 +213,9 @@ def login():
             'mfa_enabled': user.mfa_enabled
         }), 200
         
+    except PasswordHasherBusy:
+        current_app.logger.warning("Login recusado: fila de verificação de senhas cheia")
+        return jsonify({'message': 'Serviço ocupado. Tente novamente em instantes.'}), 503, {'Retry-After': '1'}
     except Exception as e:
         current_app.logger.error(f"Erro no login: {str(e)}")
         return jsonify({'message': 'Erro interno do servidor'}), 500
@@ -201,7 +233,7 @@ def refresh():
         
         # Cria novo token de acesso
         access_token = create_access_token(
-            identity=user.id,
+            identity=str(user.id),
             additional_claims={
                 'username': user.username,
                 'roles': [role.name for role in user.roles]
@@ -222,10 +254,10 @@ def logout():
     """Endpoint de logout"""
     try:
         current_user_id = get_jwt_identity()
-        jti = get_jwt()['jti']  # JWT ID
+        token = get_jwt()
         
-        # Adiciona token à lista de revogados
-        revoked_tokens.add(jti)
+        # Revoga o token em todos os workers
+        revocation_list.revoke_token(token['jti'], current_user_id, token.get('exp'))
         
         user = User.query.get(current_user_id)
         
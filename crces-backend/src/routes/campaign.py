@@ -5,26 +5,16 @@ from datetime import datetime
 
 from src.models.user import User
 from src.models.campaign import db, Campaign, CampaignMessage, CampaignType, CampaignStatus
-from src.models.template import EmailTemplate, WhatsAppTemplate
 from src.models.audit import AuditLog
+from src.services.campaign_scheduler import scheduler, scheduled_recipients_error
+from src.services.messaging_jobs import resume_campaign
+from src.services.pagination import keyset_page, cursor_pagination
+from src.services.change_capture import track_changes, collect_changes
+from src.services.authorization import require_permission
+from src.services.template_cache import get_email_template, get_whatsapp_template
 
 campaign_bp = Blueprint('campaign', __name__)
 
-def require_permission(permission_name):
-    """Decorator para verificar permissões"""
-    def decorator(f):
-        def decorated_function(*args, **kwargs):
-            current_user_id = get_jwt_identity()
-            user = User.query.get(current_user_id)
-            
-            if not user or not user.has_permission(permission_name):
-                return jsonify({'message': 'Permissão insuficiente'}), 403
-            
-            return f(*args, **kwargs)
-        decorated_function.__name__ = f.__name__
-        return decorated_function
-    return decorator
-
 @campaign_bp.route('/', methods=['GET'])
 @jwt_required()
 @require_permission('view_dashboard')
@@ -149,16 +139,16 @@ def create_campaign():
             if not data.get('email_template_id'):
                 return jsonify({'message': 'Template de email é obrigatório para campanhas de email'}), 400
             
-            email_template = EmailTemplate.query.get(data['email_template_id'])
-            if not email_template or not email_template.is_active:
+            email_template = get_email_template(data['email_template_id'])
+            if not email_template or not email_template['is_active']:
                 return jsonify({'message': 'Template de email não encontrado ou inativo'}), 404
         
         if campaign_type in [CampaignType.WHATSAPP, CampaignType.BOTH]:
             if not data.get('whatsapp_template_id'):
                 return jsonify({'message': 'Template de WhatsApp é obrigatório para campanhas de WhatsApp'}), 400
             
-            whatsapp_template = WhatsAppTemplate.query.get(data['whatsapp_template_id'])
-            if not whatsapp_template or not whatsapp_template.is_active:
+            whatsapp_template = get_whatsapp_template(data['whatsapp_template_id'])
+            if not whatsapp_template or not whatsapp_template['is_active']:
                 return jsonify({'message': 'Template de WhatsApp não encontrado ou inativo'}), 404
         
         # Cria nova campanha
@@ -182,10 +172,17 @@ def create_campaign():
                 campaign.status = CampaignStatus.SCHEDULED
             except ValueError:
                 return jsonify({'message': 'Formato de data de agendamento inválido'}), 400
+            
+            error = scheduled_recipients_error(campaign)
+            if error:
+                return jsonify({'message': error}), 400
         
         db.session.add(campaign)
         db.session.commit()
         
+        if campaign.status == CampaignStatus.SCHEDULED:
+            scheduler.invalidate(campaign.id, campaign.scheduled_at)
+        
         # Log criação da campanha
         AuditLog.log_action(
             user_id=current_user_id,
@@ -232,8 +229,8 @@ def update_campaign(campaign_id):
         if not data:
             return jsonify({'message': 'Dados não fornecidos'}), 400
         
-        # Armazena valores antigos para auditoria
-        old_values = campaign.to_dict()
+        # Acompanha as colunas alteradas para auditoria
+        track_changes(campaign)
         
         # Atualiza campos permitidos
         if 'name' in data:
@@ -250,15 +247,15 @@ def update_campaign(campaign_id):
         
         if 'email_template_id' in data:
             if data['email_template_id']:
-                email_template = EmailTemplate.query.get(data['email_template_id'])
-                if not email_template or not email_template.is_active:
+                email_template = get_email_template(data['email_template_id'])
+                if not email_template or not email_template['is_active']:
                     return jsonify({'message': 'Template de email não encontrado ou inativo'}), 404
             campaign.email_template_id = data['email_template_id']
         
         if 'whatsapp_template_id' in data:
             if data['whatsapp_template_id']:
-                whatsapp_template = WhatsAppTemplate.query.get(data['whatsapp_template_id'])
-                if not whatsapp_template or not whatsapp_template.is_active:
+                whatsapp_template = get_whatsapp_template(data['whatsapp_template_id'])
+                if not whatsapp_template or not whatsapp_template['is_active']:
                     return jsonify({'message': 'Template de WhatsApp não encontrado ou inativo'}), 404
             campaign.whatsapp_template_id = data['whatsapp_template_id']
         
@@ -278,8 +275,21 @@ def update_campaign(campaign_id):
                 if campaign.status == CampaignStatus.SCHEDULED:
                     campaign.status = CampaignStatus.DRAFT
         
+        if campaign.status == CampaignStatus.SCHEDULED:
+            error = scheduled_recipients_error(campaign)
+            if error:
+                db.session.rollback()
+                return jsonify({'message': error}), 400
+        
+        changes = collect_changes(campaign)
         db.session.commit()
         
+        # Reagenda (ou retira da agenda) no scheduler
+        scheduler.invalidate(
+            campaign.id,
+            campaign.scheduled_at if campaign.status == CampaignStatus.SCHEDULED else None
+        )
+        
         # Log atualização da campanha
         AuditLog.log_action(
             user_id=current_user_id,
@@ -287,8 +297,7 @@ def update_campaign(campaign_id):
             action_type='UPDATE',
             resource_type='Campaign',
             resource_id=str(campaign.id),
-            old_values=old_values,
-            new_values=campaign.to_dict(),
+            changes=changes,
             ip_address=request.remote_addr,
             user_agent=request.headers.get('User-Agent'),
             endpoint=request.endpoint,
@@ -323,12 +332,14 @@ def delete_campaign(campaign_id):
         if campaign.status == CampaignStatus.COMPLETED:
             return jsonify({'message': 'Não é possível cancelar campanhas finalizadas'}), 400
         
-        # Armazena valores antigos para auditoria
-        old_values = campaign.to_dict()
+        # Acompanha as colunas alteradas para auditoria
+        track_changes(campaign)
         
         # Cancela a campanha
         campaign.status = CampaignStatus.CANCELLED
+        changes = collect_changes(campaign)
         db.session.commit()
+        scheduler.invalidate(campaign.id)
         
         # Log cancelamento da campanha
         AuditLog.log_action(
@@ -337,8 +348,7 @@ def delete_campaign(campaign_id):
             action_type='CANCEL',
             resource_type='Campaign',
             resource_id=str(campaign.id),
-            old_values=old_values,
-            new_values={'status': CampaignStatus.CANCELLED.value},
+            changes=changes,
             ip_address=request.remote_addr,
             user_agent=request.headers.get('User-Agent'),
             endpoint=request.endpoint,
@@ -353,6 +363,50 @@ def delete_campaign(campaign_id):
         current_app.logger.error(f"Erro ao cancelar campanha: {str(e)}")
         return jsonify({'message': 'Erro interno do servidor'}), 500
 
+@campaign_bp.route('/<int:campaign_id>/resume', methods=['POST'])
+@jwt_required()
+@require_permission('create_campaigns')
+def resume_paused_campaign(campaign_id):
+    """Retoma os envios de uma campanha pausada"""
+    try:
+        current_user_id = get_jwt_identity()
+        current_user = User.query.get(current_user_id)
+        
+        campaign = Campaign.query.get(campaign_id)
+        if not campaign:
+            return jsonify({'message': 'Campanha não encontrada'}), 404
+        
+        if campaign.status != CampaignStatus.PAUSED:
+            return jsonify({'message': 'Apenas campanhas pausadas podem ser retomadas'}), 400
+        
+        job_ids = resume_campaign(campaign.id)
+        if not job_ids:
+            return jsonify({'message': 'Campanha sem envios pausados'}), 409
+        
+        AuditLog.log_action(
+            user_id=current_user_id,
+            username=current_user.username,
+            action_type='RESUME',
+            resource_type='Campaign',
+            resource_id=str(campaign_id),
+            new_values={'job_ids': job_ids},
+            ip_address=request.remote_addr,
+            user_agent=request.headers.get('User-Agent'),
+            endpoint=request.endpoint,
+            method=request.method,
+            success=True
+        )
+        
+        return jsonify({
+            'message': 'Campanha retomada com sucesso',
+            'job_ids': job_ids
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Erro ao retomar campanha: {str(e)}")
+        return jsonify({'message': 'Erro interno do servidor'}), 500
+
 @campaign_bp.route('/<int:campaign_id>/messages', methods=['GET'])
 @jwt_required()
 @require_permission('view_dashboard')
@@ -382,6 +436,23 @@ def get_campaign_messages(campaign_id):
                 )
             )
         
+        # Modo cursor: paginação por posição, sem OFFSET nem COUNT
+        if 'cursor' in request.args:
+            limit = max(1, min(request.args.get('limit', per_page, type=int), 200))
+            try:
+                result = keyset_page(
+                    query, CampaignMessage.created_at, CampaignMessage.id,
+                    request.args.get('cursor'), limit,
+                    include_total=request.args.get('include_total', '').lower() == 'true'
+                )
+            except ValueError:
+                return jsonify({'message': 'Cursor inválido'}), 400
+            
+            return jsonify({
+                'messages': [message.to_dict() for message in result['items']],
+                'pagination': cursor_pagination(result, limit)
+            }), 200
+        
         # Ordena por data de criação
         query = query.order_by(CampaignMessage.created_at.desc())
         
@@ -418,9 +489,7 @@ def get_campaign_statistics(campaign_id):
         if not campaign:
             return jsonify({'message': 'Campanha não encontrada'}), 404
         
-        # Atualiza estatísticas
-        campaign.update_statistics()
-        
+        # Contadores mantidos de forma incremental (reconciliados periodicamente)
         return jsonify({
             'statistics': campaign.to_dict()['statistics']
         }), 200
@@ -1,20 +1,16 @@
-from flask import Blueprint, request, jsonify, g
-from src.services.whatsapp_service import WhatsAppService
-from src.services.email_service import EmailService
+from flask import Blueprint, request, jsonify, g, url_for
 from src.services.security_service import SecurityService
-from src.models.campaign import Campaign, CampaignMessage
+from src.services.messaging_jobs import whatsapp_service, email_service, create_job, enqueue_job, resume_job
+from src.models.campaign import Campaign, CampaignMessage, CampaignType, CampaignStatus
+from src.models.job import MessagingJob
 from src.models.audit import AuditLog
 from src.models.user import db
 import logging
-from datetime import datetime
-import json
 
 logger = logging.getLogger(__name__)
 
 messaging_bp = Blueprint('messaging', __name__)
 security = SecurityService()
-whatsapp_service = WhatsAppService()
-email_service = EmailService()
 
 @messaging_bp.route('/test-connections', methods=['GET'])
 @security.require_auth
@@ -28,12 +24,16 @@ def test_connections():
         }
         
         # Log de auditoria
-        AuditLog.create_log(
+        # Testes repetidos com o mesmo resultado são agrupados em uma linha (AUDIT_COALESCE_RULES)
+        AuditLog.log_action(
             user_id=g.current_user['user_id'],
-            action='TEST_CONNECTIONS',
-            resource='Messaging Services',
-            description=f"Teste de conexões: WhatsApp={results['whatsapp']}, Email={results['email']}",
-            ip_address=security.get_client_ip()
+            username=g.current_user.get('username'),
+            action_type='TEST_CONNECTIONS',
+            resource_type='Messaging Services',
+            ip_address=security.get_client_ip(),
+            endpoint=request.endpoint,
+            method=request.method,
+            additional_data=results
         )
         
         return jsonify({
@@ -78,13 +78,17 @@ def send_whatsapp():
         result = whatsapp_service.send_text_message(phone, message)
         
         # Log de auditoria
-        AuditLog.create_log(
+        AuditLog.log_action(
             user_id=g.current_user['user_id'],
-            action='SEND_WHATSAPP',
-            resource='WhatsApp Message',
-            description=f"Mensagem enviada para {phone}: {'Sucesso' if result['success'] else 'Falha'}",
+            username=g.current_user.get('username'),
+            action_type='SEND_WHATSAPP',
+            resource_type='WhatsApp Message',
+            resource_id=phone,
             ip_address=security.get_client_ip(),
-            success=result['success']
+            endpoint=request.endpoint,
+            method=request.method,
+            success=result['success'],
+            error_message=None if result['success'] else result.get('error')
         )
         
         return jsonify(result)
@@ -134,13 +138,17 @@ def send_email():
         )
         
         # Log de auditoria
-        AuditLog.create_log(
+        AuditLog.log_action(
             user_id=g.current_user['user_id'],
-            action='SEND_EMAIL',
-            resource='Email Message',
-            description=f"Email enviado para {email}: {'Sucesso' if result['success'] else 'Falha'}",
+            username=g.current_user.get('username'),
+            action_type='SEND_EMAIL',
+            resource_type='Email Message',
+            resource_id=email,
             ip_address=security.get_client_ip(),
-            success=result['success']
+            endpoint=request.endpoint,
+            method=request.method,
+            success=result['success'],
+            error_message=None if result['success'] else result.get('error')
         )
         
         return jsonify(result)
@@ -157,97 +165,31 @@ def send_email():
 @security.require_role('supervisor')
 @security.rate_limit('bulk_send')
 def send_bulk_whatsapp():
-    """Envia mensagens em massa via WhatsApp"""
+    """Enfileira envio de mensagens em massa via WhatsApp"""
     try:
         data = request.get_json()
         
-        # Validação de entrada
-        validation_rules = {
-            'recipients': {'required': True, 'type': 'list'},
-            'template': {'required': True, 'type': 'string', 'min_length': 1},
-            'campaign_name': {'required': True, 'type': 'string', 'min_length': 1, 'max_length': 255}
-        }
-        
         # Validação básica
-        if not isinstance(data.get('recipients'), list) or len(data.get('recipients', [])) == 0:
-            return jsonify({
-                'success': False,
-                'error': 'Lista de destinatários é obrigatória e não pode estar vazia'
-            }), 400
-        
-        if len(data.get('recipients', [])) > 1000:
+        error = validate_bulk_request(data, ['template'])
+        if error:
             return jsonify({
                 'success': False,
-                'error': 'Máximo de 1000 destinatários por envio'
+                'error': error
             }), 400
         
-        # Cria campanha
-        campaign = Campaign(
-            name=security.sanitize_input(data['campaign_name']),
-            type='whatsapp',
-            status='running',
-            total_recipients=len(data['recipients']),
-            created_by=g.current_user['user_id']
-        )
-        db.session.add(campaign)
-        db.session.commit()
-        
-        # Envia mensagens
-        template = data['template']
-        delay = data.get('delay', 2)  # Delay padrão de 2 segundos
-        
-        results = whatsapp_service.send_bulk_messages(
-            recipients=data['recipients'],
-            template=template,
-            delay=delay
-        )
+        campaign, job = create_bulk_job(data, CampaignType.WHATSAPP, 'bulk_whatsapp', {
+            'template': data['template'],
+            'delay': data.get('delay', 2)  # Intervalo inicial de 2 segundos
+        })
         
-        # Atualiza estatísticas da campanha
-        successful = sum(1 for r in results if r['success'])
-        failed = len(results) - successful
-        
-        campaign.sent = len(results)
-        campaign.delivered = successful  # Assumindo que enviado = entregue para WhatsApp
-        campaign.failed = failed
-        campaign.status = 'completed'
-        campaign.completed_at = datetime.utcnow()
-        
-        db.session.commit()
-        
-        # Salva detalhes das mensagens
-        for result in results:
-            message = CampaignMessage(
-                campaign_id=campaign.id,
-                recipient_phone=result['recipient'].get('phone'),
-                recipient_email=result['recipient'].get('email'),
-                status='sent' if result['success'] else 'failed',
-                message_id=result.get('message_id'),
-                error_message=result.get('error')
-            )
-            db.session.add(message)
+        # Enfileira o envio
+        task = enqueue_job(job.id)
         
-        db.session.commit()
-        
-        # Log de auditoria
-        AuditLog.create_log(
-            user_id=g.current_user['user_id'],
-            action='SEND_BULK_WHATSAPP',
-            resource='WhatsApp Campaign',
-            description=f"Campanha '{campaign.name}': {successful} enviadas, {failed} falharam",
-            ip_address=security.get_client_ip()
-        )
-        
-        return jsonify({
-            'success': True,
-            'campaign_id': campaign.id,
-            'total_sent': len(results),
-            'successful': successful,
-            'failed': failed,
-            'results': results
-        })
+        return bulk_job_response(campaign, job, task, 'SEND_BULK_WHATSAPP')
         
     except Exception as e:
         logger.error(f"Erro no envio em massa WhatsApp: {e}")
+        db.session.rollback()
         return jsonify({
             'success': False,
             'error': str(e)
@@ -258,99 +200,209 @@ def send_bulk_whatsapp():
 @security.require_role('supervisor')
 @security.rate_limit('bulk_send')
 def send_bulk_email():
-    """Envia emails em massa"""
+    """Enfileira envio de emails em massa"""
     try:
         data = request.get_json()
         
         # Validação básica
-        if not isinstance(data.get('recipients'), list) or len(data.get('recipients', [])) == 0:
+        error = validate_bulk_request(data, ['subject_template', 'html_template'])
+        if error:
             return jsonify({
                 'success': False,
-                'error': 'Lista de destinatários é obrigatória e não pode estar vazia'
+                'error': error
             }), 400
         
-        if len(data.get('recipients', [])) > 1000:
+        campaign, job = create_bulk_job(data, CampaignType.EMAIL, 'bulk_email', {
+            'subject_template': data['subject_template'],
+            'html_template': data['html_template'],
+            'text_template': data.get('text_template'),
+            'delay': data.get('delay', 1)  # Intervalo inicial de 1 segundo
+        })
+        
+        # Enfileira o envio
+        task = enqueue_job(job.id)
+        
+        return bulk_job_response(campaign, job, task, 'SEND_BULK_EMAIL')
+        
+    except Exception as e:
+        logger.error(f"Erro no envio em massa de email: {e}")
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@messaging_bp.route('/jobs/<job_id>', methods=['GET'])
+@security.require_auth
+@security.rate_limit('api')
+def get_job(job_id):
+    """Retorna progresso e resultados de um job de envio em massa"""
+    try:
+        job = db.session.get(MessagingJob, job_id)
+        if not job:
             return jsonify({
                 'success': False,
-                'error': 'Máximo de 1000 destinatários por envio'
-            }), 400
+                'error': 'Job não encontrado'
+            }), 404
         
-        # Cria campanha
-        campaign = Campaign(
-            name=security.sanitize_input(data['campaign_name']),
-            type='email',
-            status='running',
-            total_recipients=len(data['recipients']),
-            created_by=g.current_user['user_id']
-        )
-        db.session.add(campaign)
-        db.session.commit()
-        
-        # Envia emails
-        subject_template = data['subject_template']
-        html_template = data['html_template']
-        text_template = data.get('text_template')
-        delay = data.get('delay', 1)  # Delay padrão de 1 segundo
-        
-        results = email_service.send_bulk_emails(
-            recipients=data['recipients'],
-            subject_template=subject_template,
-            html_template=html_template,
-            text_template=text_template,
-            delay=delay
-        )
+        # Apenas o criador do job ou supervisores podem acompanhá-lo
+        user = g.current_user
+        if job.created_by != user['user_id'] and user.get('role') not in ('supervisor', 'admin'):
+            return jsonify({'error': 'Permissão insuficiente'}), 403
         
-        # Atualiza estatísticas da campanha
-        successful = sum(1 for r in results if r['success'])
-        failed = len(results) - successful
-        
-        campaign.sent = len(results)
-        campaign.delivered = successful  # Assumindo que enviado = entregue para email
-        campaign.failed = failed
-        campaign.status = 'completed'
-        campaign.completed_at = datetime.utcnow()
-        
-        db.session.commit()
-        
-        # Salva detalhes das mensagens
-        for result in results:
-            message = CampaignMessage(
-                campaign_id=campaign.id,
-                recipient_phone=result['recipient'].get('phone'),
-                recipient_email=result['recipient'].get('email'),
-                status='sent' if result['success'] else 'failed',
-                message_id=result.get('message_id'),
-                error_message=result.get('error')
+        response = {
+            'success': True,
+            'job': job.to_dict()
+        }
+        
+        # Resultados por destinatário, paginados
+        if request.args.get('include_results', 'false').lower() == 'true' and job.campaign_id:
+            page = request.args.get('page', 1, type=int)
+            per_page = min(request.args.get('per_page', 50, type=int), 200)
+            
+            messages = CampaignMessage.query.filter_by(
+                campaign_id=job.campaign_id
+            ).order_by(CampaignMessage.id).paginate(
+                page=page, per_page=per_page, error_out=False
             )
-            db.session.add(message)
+            
+            response['results'] = [message.to_dict() for message in messages.items]
+            response['pagination'] = {
+                'page': page,
+                'per_page': per_page,
+                'total': messages.total,
+                'pages': messages.pages
+            }
         
-        db.session.commit()
+        return jsonify(response)
         
-        # Log de auditoria
-        AuditLog.create_log(
-            user_id=g.current_user['user_id'],
-            action='SEND_BULK_EMAIL',
-            resource='Email Campaign',
-            description=f"Campanha '{campaign.name}': {successful} enviados, {failed} falharam",
-            ip_address=security.get_client_ip()
+    except Exception as e:
+        logger.error(f"Erro ao consultar job {job_id}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@messaging_bp.route('/jobs/<job_id>/resume', methods=['POST'])
+@security.require_auth
+@security.rate_limit('api')
+def resume_messaging_job(job_id):
+    """Retoma um job pausado a partir das mensagens ainda pendentes"""
+    try:
+        job = db.session.get(MessagingJob, job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': 'Job não encontrado'
+            }), 404
+        
+        user = g.current_user
+        if job.created_by != user['user_id'] and user.get('role') not in ('supervisor', 'admin'):
+            return jsonify({'error': 'Permissão insuficiente'}), 403
+        
+        if not resume_job(job_id):
+            return jsonify({
+                'success': False,
+                'error': f'Job não está pausado (status {job.status})'
+            }), 409
+        
+        AuditLog.log_action(
+            user_id=user['user_id'],
+            username=user.get('username'),
+            action_type='RESUME_JOB',
+            resource_type='MessagingJob',
+            resource_id=job_id,
+            ip_address=security.get_client_ip(),
+            user_agent=request.headers.get('User-Agent'),
+            endpoint=request.endpoint,
+            method=request.method,
+            success=True
         )
         
+        db.session.expire_all()
+        job = db.session.get(MessagingJob, job_id)
         return jsonify({
             'success': True,
-            'campaign_id': campaign.id,
-            'total_sent': len(results),
-            'successful': successful,
-            'failed': failed,
-            'results': results
-        })
+            'job_id': job_id,
+            'status': job.status,
+            'status_url': url_for('messaging.get_job', job_id=job_id)
+        }), 202
         
     except Exception as e:
-        logger.error(f"Erro no envio em massa de email: {e}")
+        logger.error(f"Erro ao retomar job {job_id}: {e}")
+        db.session.rollback()
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+def validate_bulk_request(data, required_fields):
+    """Valida o corpo de uma requisição de envio em massa"""
+    if not data:
+        return 'Dados não fornecidos'
+    
+    if not isinstance(data.get('recipients'), list) or len(data.get('recipients', [])) == 0:
+        return 'Lista de destinatários é obrigatória e não pode estar vazia'
+    
+    if len(data['recipients']) > 1000:
+        return 'Máximo de 1000 destinatários por envio'
+    
+    for field in ['campaign_name'] + required_fields:
+        if not isinstance(data.get(field), str) or not data[field].strip():
+            return f'Campo {field} é obrigatório'
+    
+    return None
+
+def create_bulk_job(data, campaign_type, job_type, params):
+    """Cria a campanha, o job e as mensagens pendentes do envio"""
+    campaign = Campaign(
+        name=security.sanitize_input(data['campaign_name'])[:200],
+        type=campaign_type,
+        status=CampaignStatus.SCHEDULED,
+        total_recipients=len(data['recipients']),
+        created_by=g.current_user['user_id']
+    )
+    db.session.add(campaign)
+    db.session.flush()
+    
+    job = create_job(campaign, job_type, data['recipients'], params, created_by=g.current_user['user_id'])
+    db.session.commit()
+    
+    return campaign, job
+
+def bulk_job_response(campaign, job, task, action_type):
+    """Registra a auditoria e responde 202 com o job enfileirado"""
+    job_id = job.id
+    
+    # Em modo eager a tarefa já rodou em outra sessão; grava o ID sem
+    # sobrescrever o progresso
+    MessagingJob.query.filter_by(id=job_id).update({'task_id': task.id})
+    db.session.commit()
+    
+    AuditLog.log_action(
+        user_id=g.current_user['user_id'],
+        username=g.current_user.get('username'),
+        action_type=action_type,
+        resource_type='Campaign',
+        resource_id=str(campaign.id),
+        new_values={'job_id': job_id, 'total_recipients': job.total},
+        ip_address=security.get_client_ip(),
+        user_agent=request.headers.get('User-Agent'),
+        endpoint=request.endpoint,
+        method=request.method,
+        success=True
+    )
+    
+    job = db.session.get(MessagingJob, job_id)
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'campaign_id': campaign.id,
+        'status': job.status,
+        'status_url': url_for('messaging.get_job', job_id=job_id)
+    }), 202
+
 @messaging_bp.route('/validate-phone', methods=['POST'])
 @security.require_auth
 @security.rate_limit('api')
@@ -1,27 +1,25 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy import or_
+from sqlalchemy.orm import defer
 
 from src.models.user import User
 from src.models.template import db, EmailTemplate, WhatsAppTemplate
 from src.models.audit import AuditLog
+from src.services.change_capture import track_changes, collect_changes, CONTENT_COLUMNS
+from src.services.authorization import require_permission
 
 template_bp = Blueprint('template', __name__)
 
-def require_permission(permission_name):
-    """Decorator para verificar permissões"""
-    def decorator(f):
-        def decorated_function(*args, **kwargs):
-            current_user_id = get_jwt_identity()
-            user = User.query.get(current_user_id)
-            
-            if not user or not user.has_permission(permission_name):
-                return jsonify({'message': 'Permissão insuficiente'}), 403
-            
-            return f(*args, **kwargs)
-        decorated_function.__name__ = f.__name__
-        return decorated_function
-    return decorator
+# Colunas que to_dict(include_content=False) não usa: ficam fora das listagens
+EMAIL_CONTENT_COLUMNS = (EmailTemplate.subject, EmailTemplate.html_content, EmailTemplate.text_content)
+WHATSAPP_CONTENT_COLUMNS = (WhatsAppTemplate.message_content, WhatsAppTemplate.attachment_caption)
+
+def _list_options(content_columns, include_content):
+    """Adia o conteúdo quando a listagem não o retorna (acesso acidental levanta erro, não faz N+1)"""
+    if include_content:
+        return ()
+    return tuple(defer(column, raiseload=True) for column in content_columns)
 
 # Rotas para Templates de Email
 
@@ -39,8 +37,10 @@ def get_email_templates():
         # Limita per_page para evitar sobrecarga
         per_page = min(per_page, 100)
         
+        include_content = request.args.get('include_content', 'false').lower() == 'true'
+        
         # Query base
-        query = EmailTemplate.query
+        query = EmailTemplate.query.options(*_list_options(EMAIL_CONTENT_COLUMNS, include_content))
         
         # Filtro de busca
         if search:
@@ -65,8 +65,6 @@ def get_email_templates():
             error_out=False
         )
         
-        include_content = request.args.get('include_content', 'false').lower() == 'true'
-        
         return jsonify({
             'templates': [template.to_dict(include_content=include_content) for template in templates.items],
             'pagination': {
@@ -190,8 +188,8 @@ def update_email_template(template_id):
         if not data:
             return jsonify({'message': 'Dados não fornecidos'}), 400
         
-        # Armazena valores antigos para auditoria
-        old_values = template.to_dict(include_content=False)
+        # Acompanha as colunas alteradas para auditoria
+        track_changes(template, masked=CONTENT_COLUMNS)
         
         # Atualiza campos permitidos
         if 'name' in data:
@@ -228,6 +226,7 @@ def update_email_template(template_id):
         if errors:
             return jsonify({'message': 'Erros de validação', 'errors': errors}), 400
         
+        changes = collect_changes(template)
         db.session.commit()
         
         # Log atualização do template
@@ -237,8 +236,7 @@ def update_email_template(template_id):
             action_type='UPDATE',
             resource_type='EmailTemplate',
             resource_id=str(template.id),
-            old_values=old_values,
-            new_values=template.to_dict(include_content=False),
+            changes=changes,
             ip_address=request.remote_addr,
             user_agent=request.headers.get('User-Agent'),
             endpoint=request.endpoint,
@@ -320,8 +318,10 @@ def get_whatsapp_templates():
         # Limita per_page para evitar sobrecarga
         per_page = min(per_page, 100)
         
+        include_content = request.args.get('include_content', 'false').lower() == 'true'
+        
         # Query base
-        query = WhatsAppTemplate.query
+        query = WhatsAppTemplate.query.options(*_list_options(WHATSAPP_CONTENT_COLUMNS, include_content))
         
         # Filtro de busca
         if search:
@@ -346,8 +346,6 @@ def get_whatsapp_templates():
             error_out=False
         )
         
-        include_content = request.args.get('include_content', 'false').lower() == 'true'
-        
         return jsonify({
             'templates': [template.to_dict(include_content=include_content) for template in templates.items],
             'pagination': {
@@ -472,8 +470,8 @@ def update_whatsapp_template(template_id):
         if not data:
             return jsonify({'message': 'Dados não fornecidos'}), 400
         
-        # Armazena valores antigos para auditoria
-        old_values = template.to_dict(include_content=False)
+        # Acompanha as colunas alteradas para auditoria
+        track_changes(template, masked=CONTENT_COLUMNS)
         
         # Atualiza campos permitidos
         if 'name' in data:
@@ -513,6 +511,7 @@ def update_whatsapp_template(template_id):
         if errors:
             return jsonify({'message': 'Erros de validação', 'errors': errors}), 400
         
+        changes = collect_changes(template)
         db.session.commit()
         
         # Log atualização do template
@@ -522,8 +521,7 @@ def update_whatsapp_template(template_id):
             action_type='UPDATE',
             resource_type='WhatsAppTemplate',
             resource_id=str(template.id),
-            old_values=old_values,
-            new_values=template.to_dict(include_content=False),
+            changes=changes,
             ip_address=request.remote_addr,
             user_agent=request.headers.get('User-Agent'),
             endpoint=request.endpoint,
@@ -1,26 +1,25 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from sqlalchemy import or_
+from sqlalchemy.orm import load_only, selectinload, raiseload
 
 from src.models.user import db, User, Role, Permission
 from src.models.audit import AuditLog
+from src.services.change_capture import track_changes, collect_changes
+from src.services.authorization import require_permission
+from src.services.token_verification import revocation_list
 
 user_bp = Blueprint('user', __name__)
 
-def require_permission(permission_name):
-    """Decorator para verificar permissões"""
-    def decorator(f):
-        def decorated_function(*args, **kwargs):
-            current_user_id = get_jwt_identity()
-            user = User.query.get(current_user_id)
-            
-            if not user or not user.has_permission(permission_name):
-                return jsonify({'message': 'Permissão insuficiente'}), 403
-            
-            return f(*args, **kwargs)
-        decorated_function.__name__ = f.__name__
-        return decorated_function
-    return decorator
+# Só as colunas usadas por User.to_dict(); o resto (hashes, MFA) não sai do banco
+USER_LIST_OPTIONS = (
+    load_only(
+        User.id, User.username, User.email, User.is_active, User.is_verified,
+        User.mfa_enabled, User.created_at, User.last_login, raiseload=True
+    ),
+    selectinload(User.roles).load_only(Role.id, Role.name),
+    raiseload('*')
+)
 
 @user_bp.route('/', methods=['GET'])
 @jwt_required()
@@ -38,7 +37,7 @@ def get_users():
         per_page = min(per_page, 100)
         
         # Query base
-        query = User.query
+        query = User.query.options(*USER_LIST_OPTIONS)
         
         # Filtro de busca
         if search:
@@ -191,8 +190,8 @@ def update_user(user_id):
         if not data:
             return jsonify({'message': 'Dados não fornecidos'}), 400
         
-        # Armazena valores antigos para auditoria
-        old_values = user.to_dict()
+        # Acompanha as colunas alteradas para auditoria
+        track_changes(user)
         
         # Atualiza campos permitidos
         if 'username' in data and data['username'] != user.username:
@@ -229,8 +228,13 @@ def update_user(user_id):
         if data.get('unlock_account'):
             user.unlock_account()
         
+        changes = collect_changes(user)
         db.session.commit()
         
+        # Tokens já emitidos carregam os roles antigos
+        if {'roles', 'is_active', 'password_hash'} & changes.keys():
+            revocation_list.revoke_user(user.id)
+        
         # Log atualização do usuário
         AuditLog.log_action(
             user_id=current_user_id,
@@ -238,8 +242,7 @@ def update_user(user_id):
             action_type='UPDATE',
             resource_type='User',
             resource_id=str(user.id),
-            old_values=old_values,
-            new_values=user.to_dict(),
+            changes=changes,
             ip_address=request.remote_addr,
             user_agent=request.headers.get('User-Agent'),
             endpoint=request.endpoint,
@@ -267,19 +270,21 @@ def delete_user(user_id):
         current_user = User.query.get(current_user_id)
         
         # Não permite deletar a si mesmo
-        if user_id == current_user_id:
+        if user_id == int(current_user_id):
             return jsonify({'message': 'Não é possível deletar sua própria conta'}), 400
         
         user = User.query.get(user_id)
         if not user:
             return jsonify({'message': 'Usuário não encontrado'}), 404
         
-        # Armazena valores antigos para auditoria
-        old_values = user.to_dict()
+        # Acompanha as colunas alteradas para auditoria
+        track_changes(user)
         
         # Soft delete - apenas desativa o usuário
         user.is_active = False
+        changes = collect_changes(user)
         db.session.commit()
+        revocation_list.revoke_user(user.id)
         
         # Log desativação do usuário
         AuditLog.log_action(
@@ -288,8 +293,7 @@ def delete_user(user_id):
             action_type='DELETE',
             resource_type='User',
             resource_id=str(user.id),
-            old_values=old_values,
-            new_values={'is_active': False},
+            changes=changes,
             ip_address=request.remote_addr,
             user_agent=request.headers.get('User-Agent'),
             endpoint=request.endpoint,
@@ -310,7 +314,7 @@ def delete_user(user_id):
 def get_roles():
     """Lista todos os roles disponíveis"""
     try:
-        roles = Role.query.all()
+        roles = Role.query.options(selectinload(Role.permissions), raiseload('*')).all()
         
         return jsonify({
             'roles': [role.to_dict() for role in roles]
@@ -351,8 +355,8 @@ def update_profile():
         if not data:
             return jsonify({'message': 'Dados não fornecidos'}), 400
         
-        # Armazena valores antigos para auditoria
-        old_values = user.to_dict()
+        # Acompanha as colunas alteradas para auditoria
+        track_changes(user)
         
         # Campos que o usuário pode atualizar em seu próprio perfil
         if 'email' in data and data['email'] != user.email:
@@ -362,6 +366,7 @@ def update_profile():
             user.email = data['email']
             user.is_verified = False  # Requer nova verificação
         
+        changes = collect_changes(user)
         db.session.commit()
         
         # Log atualização do perfil
@@ -371,8 +376,7 @@ def update_profile():
             action_type='UPDATE_PROFILE',
             resource_type='User',
             resource_id=str(user.id),
-            old_values=old_values,
-            new_values=user.to_dict(),
+            changes=changes,
             ip_address=request.remote_addr,
             user_agent=request.headers.get('User-Agent'),
             endpoint=request.endpoint,
@@ -0,0 +1,387 @@
+import os
+import gzip
+import json
+import heapq
+import hashlib
+import logging
+from datetime import datetime, date, time, timedelta, timezone
+from itertools import groupby, islice
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from celery import shared_task
+from sqlalchemy import select, delete, func, and_
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db
+from src.models.audit import AuditLog, AuditArchive
+from src.services.audit_rollup import roll_up_audit_logs, get_watermark
+from src.services.export_stream import iter_rows
+from src.services.pagination import encode_cursor, decode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Logs mais antigos que isso saem da tabela (apenas meses completos)
+RETENTION_DAYS = int(os.getenv('AUDIT_RETENTION_DAYS', '180'))
+
+# Diretório dos arquivos .jsonl.gz (caminhos do manifesto são relativos a ele).
+# Um caminho relativo é resolvido a partir da raiz da aplicação, não do
+# diretório de trabalho (que muda entre o servidor e os workers do Celery)
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ARCHIVE_DIR = os.path.join(APP_ROOT, os.getenv('AUDIT_ARCHIVE_DIR', os.path.join('archive', 'audit')))
+
+# Logs removidos da tabela por transação
+DELETE_BATCH_SIZE = int(os.getenv('AUDIT_ARCHIVE_DELETE_BATCH', '5000'))
+
+COLUMNS = tuple(AuditLog.__table__.columns)
+DATETIME_COLUMNS = {column.key for column in COLUMNS if isinstance(column.type, db.DateTime)}
+
+
+class ArchiveUnavailable(Exception):
+    """Parte registrada no manifesto cujo arquivo não está em ARCHIVE_DIR"""
+
+
+def _month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + 1, 1, 1) if month.month == 12 else date(month.year, month.month + 1, 1)
+
+
+def _as_datetime(day: date) -> datetime:
+    return datetime.combine(day, time.min)
+
+
+def archive_cutoff(retention_days: int = None) -> date:
+    """Primeiro mês que continua na tabela; os anteriores são arquivados"""
+    retention_days = RETENTION_DAYS if retention_days is None else retention_days
+    return _month_start(datetime.utcnow() - timedelta(days=retention_days))
+
+
+def archive_audit_logs(retention_days: int = None) -> int:
+    """
+    Move para arquivos mensais os logs mais antigos que a retenção
+
+    Cada mês completo anterior ao corte vira um .jsonl.gz registrado no
+    manifesto (AuditArchive) e só então é removido da tabela, em lotes.
+    Apenas logs já somados ao rollup são arquivados, para que os resumos
+    continuem completos.
+
+    Returns:
+        Número de logs arquivados
+    """
+    # Garante que o rollup cobre tudo o que está assentado
+    roll_up_audit_logs()
+    watermark = get_watermark()
+    cutoff = _as_datetime(archive_cutoff(retention_days))
+
+    total = 0
+    while True:
+        oldest = db.session.execute(
+            select(func.min(AuditLog.created_at)).where(
+                AuditLog.created_at < cutoff,
+                AuditLog.id <= watermark
+            )
+        ).scalar()
+        if oldest is None:
+            return total
+
+        archived = _archive_month(_month_start(oldest), watermark)
+        if archived is None:
+            # Outro processo está arquivando este mês
+            return total
+        total += archived
+
+
+def _month_filter(month: date, watermark: int):
+    return and_(
+        AuditLog.created_at >= _as_datetime(month),
+        AuditLog.created_at < _as_datetime(_next_month(month)),
+        AuditLog.id <= watermark
+    )
+
+
+def _archive_month(month: date, watermark: int) -> Optional[int]:
+    """Arquiva um mês em uma nova parte; None se perdeu a corrida pela parte"""
+    month_filter = _month_filter(month, watermark)
+
+    # Conclui remoções interrompidas de partes já gravadas
+    parts = db.session.execute(
+        select(AuditArchive).where(AuditArchive.month == month)
+    ).scalars().all()
+    for entry in parts:
+        _delete_archived(month_filter, entry.min_log_id, entry.max_log_id)
+
+    part = max((entry.part for entry in parts), default=0) + 1
+    relative_path = os.path.join(f'{month:%Y}', f'audit_{month:%Y_%m}_part{part:03d}.jsonl.gz')
+    path = os.path.join(ARCHIVE_DIR, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    statement = select(*COLUMNS).where(month_filter).order_by(
+        AuditLog.created_at.desc(), AuditLog.id.desc()
+    )
+
+    count, min_id, max_id, first_at, last_at = 0, None, None, None, None
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with gzip.open(temp_path, 'wt', encoding='utf-8') as archive:
+        for row in iter_rows(statement):
+            archive.write(json.dumps(dict(row._mapping), default=_json_default, ensure_ascii=False))
+            archive.write('\n')
+            count += 1
+            min_id = row.id if min_id is None else min(min_id, row.id)
+            max_id = row.id if max_id is None else max(max_id, row.id)
+            first_at = row.created_at if first_at is None else min(first_at, row.created_at)
+            last_at = row.created_at if last_at is None else max(last_at, row.created_at)
+
+    if not count:
+        os.remove(temp_path)
+        return 0
+
+    # O arquivo só assume o nome final depois que a parte é reservada no manifesto
+    try:
+        db.session.add(AuditArchive(
+            month=month,
+            part=part,
+            path=relative_path,
+            row_count=count,
+            min_log_id=min_id,
+            max_log_id=max_id,
+            first_created_at=first_at,
+            last_created_at=last_at,
+            size_bytes=os.path.getsize(temp_path),
+            sha256=_sha256(temp_path)
+        ))
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        os.remove(temp_path)
+        return None
+
+    os.replace(temp_path, path)
+    db.session.commit()
+
+    _delete_archived(month_filter, min_id, max_id)
+    logger.info(f"Auditoria {month:%Y-%m}: {count} logs arquivados em {relative_path}")
+    return count
+
+
+def _delete_archived(month_filter, min_id: int, max_id: int):
+    """Remove da tabela, em lotes, os logs cobertos por uma parte do arquivo"""
+    while True:
+        ids = db.session.execute(
+            select(AuditLog.id).where(
+                month_filter,
+                AuditLog.id >= min_id,
+                AuditLog.id <= max_id
+            ).limit(DELETE_BATCH_SIZE)
+        ).scalars().all()
+        if not ids:
+            return
+        db.session.execute(delete(AuditLog).where(AuditLog.id.in_(ids)))
+        db.session.commit()
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as archive:
+        for block in iter(lambda: archive.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Datas com fuso viram UTC sem fuso, como as gravadas em created_at"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def archived_entries(date_from: Optional[datetime], date_to: Optional[datetime] = None) -> List[AuditArchive]:
+    """
+    Partes do arquivo que cobrem o período, da mais recente à mais antiga
+
+    Sem date_from a consulta fica só na tabela, então nada é retornado.
+    Levanta ArchiveUnavailable se o arquivo de alguma parte não existe,
+    antes que uma listagem ou exportação saia incompleta.
+    """
+    if date_from is None:
+        return []
+    date_from, date_to = _naive(date_from), _naive(date_to)
+
+    query = select(AuditArchive).where(AuditArchive.last_created_at >= date_from)
+    if date_to is not None:
+        query = query.where(AuditArchive.first_created_at <= date_to)
+
+    entries = db.session.execute(
+        query.order_by(AuditArchive.month.desc(), AuditArchive.part)
+    ).scalars().all()
+
+    missing = [entry.path for entry in entries if not os.path.isfile(os.path.join(ARCHIVE_DIR, entry.path))]
+    if missing:
+        raise ArchiveUnavailable(f"Arquivos de auditoria ausentes em {ARCHIVE_DIR}: {', '.join(missing)}")
+    return entries
+
+
+def _read_archive(entry: AuditArchive) -> Iterator[AuditLog]:
+    try:
+        archive = gzip.open(os.path.join(ARCHIVE_DIR, entry.path), 'rt', encoding='utf-8')
+    except FileNotFoundError:
+        raise ArchiveUnavailable(f"Arquivo de auditoria ausente em {ARCHIVE_DIR}: {entry.path}")
+    with archive:
+        for line in archive:
+            record = json.loads(line)
+            for key in DATETIME_COLUMNS:
+                if record.get(key):
+                    record[key] = datetime.fromisoformat(record[key])
+            # Objeto fora da sessão, apenas para leitura (to_dict, exportação)
+            yield AuditLog(**record)
+
+
+def _sort_key(log: AuditLog) -> Tuple[datetime, int]:
+    return log.created_at, log.id
+
+
+def iter_archived_logs(entries: List[AuditArchive], date_from: Optional[datetime] = None,
+                       date_to: Optional[datetime] = None, match: Callable[[AuditLog], bool] = None,
+                       before: Tuple[datetime, int] = None) -> Iterator[AuditLog]:
+    """
+    Logs arquivados no período, do mais recente ao mais antigo
+
+    Os arquivos são lidos em streaming, um mês por vez (as partes de um
+    mesmo mês são intercaladas). match aplica os demais filtros da
+    consulta e before, a posição (created_at, id) de um cursor.
+    """
+    date_from, date_to = _naive(date_from), _naive(date_to)
+    if before is not None:
+        before = (_naive(before[0]), before[1])
+
+    for _, month_entries in groupby(entries, key=lambda entry: entry.month):
+        logs = heapq.merge(*(_read_archive(entry) for entry in month_entries), key=_sort_key, reverse=True)
+        for log in logs:
+            if before is not None and _sort_key(log) >= before:
+                continue
+            if date_to is not None and log.created_at > date_to:
+                continue
+            if date_from is not None and log.created_at < date_from:
+                break
+            if match is None or match(log):
+                yield log
+
+
+def _within(entry: AuditArchive, date_from: Optional[datetime], date_to: Optional[datetime]) -> bool:
+    """A parte inteira está dentro do período (datas já sem fuso)"""
+    return ((date_from is None or entry.first_created_at >= date_from)
+            and (date_to is None or entry.last_created_at <= date_to))
+
+
+def archived_total(entries: List[AuditArchive], date_from: Optional[datetime] = None,
+                   date_to: Optional[datetime] = None,
+                   match: Callable[[AuditLog], bool] = None) -> Optional[int]:
+    """
+    Quantidade de logs arquivados no período, sem ler os arquivos inteiros
+
+    Partes inteiramente dentro do período contam pelo row_count do
+    manifesto; só as das bordas são lidas. Com filtros além da data
+    (match) o total exigiria ler todos os arquivos: retorna None.
+    """
+    if match is not None:
+        return None
+    date_from, date_to = _naive(date_from), _naive(date_to)
+
+    total = 0
+    partial = []
+    for entry in entries:
+        if _within(entry, date_from, date_to):
+            total += entry.row_count
+        else:
+            partial.append(entry)
+    if partial:
+        total += sum(1 for _ in iter_archived_logs(partial, date_from, date_to))
+    return total
+
+
+def archived_slice(entries: List[AuditArchive], offset: int, count: int,
+                   date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+                   match: Callable[[AuditLog], bool] = None) -> List[AuditLog]:
+    """
+    Logs arquivados nas posições offset a offset + count do período
+
+    Sem filtros além da data, meses inteiros antes de offset são pulados
+    pelo row_count do manifesto; a leitura para quando a fatia se completa.
+    """
+    if match is None:
+        naive_from, naive_to = _naive(date_from), _naive(date_to)
+        months = [list(month_entries) for _, month_entries in groupby(entries, key=lambda entry: entry.month)]
+        skipped = 0
+        for month_entries in months:
+            rows = sum(entry.row_count for entry in month_entries)
+            if offset < rows or not all(_within(entry, naive_from, naive_to) for entry in month_entries):
+                break
+            offset -= rows
+            skipped += 1
+        entries = [entry for month_entries in months[skipped:] for entry in month_entries]
+
+    return list(islice(iter_archived_logs(entries, date_from, date_to, match), offset, offset + count))
+
+
+def _add_archived_total(page: Dict, entries: List[AuditArchive], date_from, date_to, match):
+    """Soma os arquivados ao total da página, ou o omite se exigiria ler tudo"""
+    if 'total' not in page:
+        return
+    archived = archived_total(entries, date_from, date_to, match)
+    if archived is None:
+        del page['total']
+    else:
+        page['total'] += archived
+
+
+def extend_keyset_page(page: Dict, entries: List[AuditArchive], limit: int, cursor: Optional[str],
+                       date_from: Optional[datetime], date_to: Optional[datetime],
+                       match: Callable[[AuditLog], bool] = None) -> Dict:
+    """
+    Completa com logs arquivados uma página de keyset_page sobre a tabela
+
+    Quando a tabela se esgota, a página continua nos arquivos a partir da
+    posição do último item (ou do cursor), com o mesmo formato de cursor.
+    O total, se pedido, vem de archived_total (omitido com filtros além da data).
+    """
+    if page['has_next']:
+        _add_archived_total(page, entries, date_from, date_to, match)
+        return page
+
+    items = list(page['items'])
+    if items:
+        before = _sort_key(items[-1])
+    else:
+        before = decode_cursor(cursor) if cursor else None
+
+    missing = limit - len(items)
+    archived = []
+    for log in iter_archived_logs(entries, date_from, date_to, match, before):
+        archived.append(log)
+        if len(archived) > missing:
+            break
+
+    has_next = len(archived) > missing
+    items.extend(archived[:missing])
+
+    page.update({
+        'items': items,
+        'has_next': has_next,
+        'next_cursor': encode_cursor(items[-1].created_at, items[-1].id) if has_next else None
+    })
+    _add_archived_total(page, entries, date_from, date_to, match)
+    return page
+
+
+@shared_task(name='audit.archive')
+def archive_audit_logs_task():
+    """Tarefa periódica de arquivamento dos logs de auditoria"""
+    archived = archive_audit_logs()
+    if archived:
+        logger.info(f"Arquivamento de auditoria: {archived} logs movidos para {ARCHIVE_DIR}")
+    return archived
@@ -0,0 +1,179 @@
+import os
+import logging
+from collections import Counter, namedtuple
+from datetime import datetime, date, timedelta
+from typing import List, Tuple
+from celery import shared_task
+from sqlalchemy import select, update, insert, func, and_, cast, Date
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db
+from src.models.audit import AuditLog, AuditDailyRollup, AuditRollupState
+
+logger = logging.getLogger(__name__)
+
+STATE_NAME = 'daily'
+
+# Logs agregados por rodada (faixa de ids)
+BATCH_SIZE = int(os.getenv('AUDIT_ROLLUP_BATCH_SIZE', '50000'))
+
+# Logs gravados há menos que isso ficam para a próxima rodada, para não
+# pular ids menores de transações que ainda não confirmaram. Conta a partir
+# de recorded_at (INSERT), não de created_at: logs agrupados pelo sink são
+# gravados até uma janela inteira depois do primeiro evento
+SETTLE_SECONDS = int(os.getenv('AUDIT_ROLLUP_SETTLE_SECONDS', '60'))
+
+RollupRow = namedtuple('RollupRow', 'day action_type resource_type username success count')
+
+KEY_COLUMNS = (AuditLog.created_at, AuditLog.action_type, AuditLog.resource_type,
+               AuditLog.username, AuditLog.success, AuditLog.event_count)
+
+
+def _rollup_key(row) -> Tuple:
+    return (row.created_at.date(), row.action_type, row.resource_type, row.username, bool(row.success))
+
+
+def get_watermark() -> int:
+    """Último id de AuditLog já somado ao rollup"""
+    state = db.session.get(AuditRollupState, STATE_NAME)
+    if state is None:
+        try:
+            db.session.add(AuditRollupState(name=STATE_NAME, last_log_id=0))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+        state = db.session.get(AuditRollupState, STATE_NAME)
+    return state.last_log_id
+
+
+def roll_up_audit_logs(batch_size: int = None) -> int:
+    """
+    Soma à tabela de rollup os logs acima da marca d'água
+
+    Cada rodada lê apenas a faixa nova de ids, agrega por (dia, ação,
+    recurso, usuário, sucesso) e soma as contagens, na mesma transação que
+    avança a marca d'água. O avanço é condicional, então execuções
+    concorrentes nunca somam a mesma faixa duas vezes.
+
+    Returns:
+        Número de eventos agregados (logs agrupados contam event_count)
+    """
+    batch_size = batch_size or BATCH_SIZE
+    total = 0
+
+    while True:
+        last_id = get_watermark()
+        settled_before = datetime.utcnow() - timedelta(seconds=SETTLE_SECONDS)
+
+        batch_ids = select(AuditLog.id).where(
+            AuditLog.id > last_id,
+            AuditLog.recorded_at < settled_before
+        ).order_by(AuditLog.id).limit(batch_size).subquery()
+        upper_id = db.session.execute(select(func.max(batch_ids.c.id))).scalar()
+
+        if upper_id is None:
+            db.session.commit()
+            return total
+
+        claimed = db.session.execute(
+            update(AuditRollupState).where(
+                AuditRollupState.name == STATE_NAME,
+                AuditRollupState.last_log_id == last_id
+            ).values(last_log_id=upper_id, updated_at=datetime.utcnow())
+        ).rowcount
+        if not claimed:
+            # Outra execução agregou esta faixa
+            db.session.rollback()
+            return total
+
+        counts = Counter()
+        for row in db.session.execute(
+            select(*KEY_COLUMNS).where(AuditLog.id > last_id, AuditLog.id <= upper_id)
+        ):
+            counts[_rollup_key(row)] += row.event_count or 1
+
+        for key, count in counts.items():
+            _add_count(key, count)
+
+        db.session.commit()
+        total += sum(counts.values())
+
+
+def _add_count(key: Tuple, count: int):
+    """Soma a contagem à linha do rollup, criando-a se necessário (sem commit)"""
+    day, action_type, resource_type, username, success = key
+
+    match = and_(
+        AuditDailyRollup.day == day,
+        AuditDailyRollup.action_type == action_type,
+        AuditDailyRollup.resource_type == resource_type,
+        AuditDailyRollup.username.is_(None) if username is None else AuditDailyRollup.username == username,
+        AuditDailyRollup.success == success
+    )
+    updated = db.session.execute(
+        update(AuditDailyRollup).where(match).values(count=AuditDailyRollup.count + count)
+    ).rowcount
+
+    if not updated:
+        db.session.execute(insert(AuditDailyRollup).values(
+            day=day,
+            action_type=action_type,
+            resource_type=resource_type,
+            username=username,
+            success=success,
+            count=count
+        ))
+
+
+def _day_column():
+    """Dia de created_at calculado no banco (SQLite não tem tipo DATE: usa date())"""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return func.date(AuditLog.created_at)
+    return cast(AuditLog.created_at, Date)
+
+
+def _as_date(value) -> date:
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def get_rollup_rows(day_from: date) -> List[RollupRow]:
+    """
+    Contagens (dia, ação, recurso, usuário, sucesso, total) desde day_from
+
+    Combina o rollup com os logs ainda não agregados (acima da marca
+    d'água), para que os resumos fiquem em dia entre uma rodada e outra.
+    Os logs pendentes são agregados com GROUP BY no banco: sem o beat do
+    Celery a marca d'água não avança e a cauda é a tabela inteira.
+    """
+    counts = Counter()
+
+    for row in db.session.execute(
+        select(AuditDailyRollup.day, AuditDailyRollup.action_type, AuditDailyRollup.resource_type,
+               AuditDailyRollup.username, AuditDailyRollup.success, AuditDailyRollup.count)
+        .where(AuditDailyRollup.day >= day_from)
+    ):
+        counts[(row.day, row.action_type, row.resource_type, row.username, row.success)] += row.count
+
+    state = db.session.get(AuditRollupState, STATE_NAME)
+    last_id = state.last_log_id if state else 0
+    day = _day_column().label('day')
+    group_columns = (day, AuditLog.action_type, AuditLog.resource_type, AuditLog.username, AuditLog.success)
+    for row in db.session.execute(
+        select(*group_columns, func.sum(func.coalesce(AuditLog.event_count, 1)).label('count'))
+        .where(
+            AuditLog.id > last_id,
+            AuditLog.created_at >= datetime.combine(day_from, datetime.min.time())
+        )
+        .group_by(*group_columns)
+    ):
+        counts[(_as_date(row.day), row.action_type, row.resource_type, row.username, bool(row.success))] += row.count
+
+    return [RollupRow(*key, count) for key, count in counts.items()]
+
+
+@shared_task(name='audit.rollup')
+def roll_up_audit_logs_task():
+    """Tarefa periódica de agregação dos logs de auditoria"""
+    rolled = roll_up_audit_logs()
+    if rolled:
+        logger.info(f"Rollup de auditoria: {rolled} logs agregados")
+    return rolled
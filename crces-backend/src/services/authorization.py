@@ -0,0 +1,109 @@
+import os
+from functools import wraps
+from typing import FrozenSet, Optional
+from flask import jsonify
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from src.models.user import db, User, Role, Permission, user_roles, role_permissions
+from src.services.versioned_cache import VersionedCache, CACHE_CHECK_INTERVAL
+
+# Chave em session.info marcando mudança de permissões até o commit
+_PENDING_KEY = 'authorization_invalidate'
+
+
+def _user_key(user_id) -> Optional[int]:
+    """Identidade do JWT (string ou inteiro) como chave do cache"""
+    try:
+        return int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def load_permissions(user_id: int) -> Optional[FrozenSet[str]]:
+    """Permissões do usuário em uma consulta; None se o usuário não existe"""
+    rows = db.session.execute(
+        select(User.id, Permission.name)
+        .select_from(User)
+        .outerjoin(user_roles, user_roles.c.user_id == User.id)
+        .outerjoin(role_permissions, role_permissions.c.role_id == user_roles.c.role_id)
+        .outerjoin(Permission, Permission.id == role_permissions.c.permission_id)
+        .where(User.id == user_id)
+    ).all()
+
+    if not rows:
+        return None
+    return frozenset(name for _, name in rows if name is not None)
+
+
+# Conjunto de permissões de cada usuário (frozenset, ou None se ele não
+# existe). Mudanças em roles, permissões ou nos roles de um usuário
+# incrementam a versão compartilhada em cache_version. O worker que grava
+# aplica na hora; os demais releem a versão no máximo a cada
+# PERMISSION_CACHE_CHECK_SECONDS (padrão CACHE_VERSION_CHECK_SECONDS), sem
+# consulta nas verificações entre uma leitura e outra. Trocar os roles de um
+# usuário ou desativá-lo também revoga os tokens dele (revocation_list),
+# então a permissão retirada deixa de valer em no máximo esse intervalo.
+permission_cache = VersionedCache(
+    'permissions',
+    load_permissions,
+    max_entries=int(os.getenv('PERMISSION_CACHE_SIZE', '10000')),
+    check_interval=float(os.getenv('PERMISSION_CACHE_CHECK_SECONDS', CACHE_CHECK_INTERVAL)),
+    ttl=float(os.getenv('PERMISSION_CACHE_TTL', '60'))
+)
+
+
+def get_permissions(user_id) -> Optional[FrozenSet[str]]:
+    """Permissões do usuário (via cache); None se ele não existe"""
+    user_id = _user_key(user_id)
+    if user_id is None:
+        return None
+    return permission_cache.get(user_id)
+
+
+def has_permission(user_id, permission_name: str) -> bool:
+    """Verifica uma permissão sem carregar o usuário"""
+    permissions = get_permissions(user_id)
+    return permissions is not None and permission_name in permissions
+
+
+def require_permission(permission_name):
+    """Decorator para verificar permissões (usar após jwt_required)"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not has_permission(get_jwt_identity(), permission_name):
+                return jsonify({'message': 'Permissão insuficiente'}), 403
+
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_invalidations(session, flush_context):
+    if session.info.get(_PENDING_KEY):
+        return
+    for instance in session.deleted:
+        if isinstance(instance, (User, Role, Permission)):
+            session.info[_PENDING_KEY] = True
+            return
+    for instance in (*session.new, *session.dirty):
+        if isinstance(instance, (Role, Permission)):
+            session.info[_PENDING_KEY] = True
+            return
+        # Demais colunas do usuário (last_login, tentativas) não afetam permissões
+        if isinstance(instance, User) and inspect(instance).attrs.roles.history.has_changes():
+            session.info[_PENDING_KEY] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    if session.info.pop(_PENDING_KEY, None):
+        permission_cache.bump()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop(_PENDING_KEY, None)
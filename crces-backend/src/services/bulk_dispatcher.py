@@ -0,0 +1,221 @@
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional
+from src.services.rate_controller import AdaptiveRateController, SUCCESS, FAILED
+
+logger = logging.getLogger(__name__)
+
+
+class LaneLimit:
+    """Limites de uma faixa de envio (domínio de destino, instância, etc.)"""
+
+    def __init__(self, concurrency: int = 2, rate: Optional[float] = None):
+        """
+        Args:
+            concurrency: Máximo de envios simultâneos na faixa
+            rate: Máximo de envios por segundo na faixa (None = sem limite)
+        """
+        self.concurrency = max(1, int(concurrency))
+        self.rate = rate
+
+    def min_interval(self, default: float = 0) -> float:
+        """Intervalo mínimo entre o início de dois envios da faixa"""
+        if self.rate:
+            return 1.0 / self.rate
+        return default
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'LaneLimit':
+        return cls(
+            concurrency=config.get('concurrency', 2),
+            rate=config.get('rate')
+        )
+
+
+class BulkDispatcher:
+    """
+    Distribui envios em massa por um pool limitado de threads
+
+    Cada item pertence a uma faixa (ex.: domínio do email) com seus próprios
+    limites de concorrência e taxa. O estado das faixas é compartilhado entre
+    chamadas simultâneas, de modo que duas campanhas para o mesmo provedor
+    dividem o mesmo limite. Os resultados são devolvidos na ordem de entrada.
+
+    Com controller_factory, cada faixa ganha um AdaptiveRateController que
+    substitui o intervalo fixo: a taxa se ajusta ao resultado dos envios e,
+    se a faixa entrar em pausa automática, os itens restantes dela não são
+    enviados e retornam com 'paused': True. Os controladores também são
+    compartilhados: campanhas simultâneas para o mesmo provedor somam seus
+    envios na mesma taxa e uma limitação vista por uma reduz a de todas.
+    """
+
+    def __init__(self, max_workers: int = 4, lane_limits: Dict[str, LaneLimit] = None,
+                 default_limit: LaneLimit = None,
+                 controller_factory: Callable[[str, LaneLimit, float], AdaptiveRateController] = None):
+        self.max_workers = max(1, int(max_workers))
+        self.lane_limits = lane_limits or {}
+        self.default_limit = default_limit or LaneLimit()
+        self.controller_factory = controller_factory
+
+        self._cond = threading.Condition()
+        self._in_flight: Dict[str, int] = {}
+        self._next_start: Dict[str, float] = {}
+        self._controllers: Dict[str, AdaptiveRateController] = {}
+
+    def get_limit(self, lane: str) -> LaneLimit:
+        """Retorna os limites configurados para a faixa"""
+        return self.lane_limits.get(lane, self.default_limit)
+
+    def get_controller(self, lane: str, default_interval: float = 0) -> Optional[AdaptiveRateController]:
+        """Retorna (criando se necessário) o controlador de taxa da faixa"""
+        with self._cond:
+            return self._get_controller_locked(lane, self.get_limit(lane), default_interval)
+
+    def reset_controllers(self):
+        """
+        Tira da pausa e devolve à taxa inicial os controladores das faixas
+
+        Chamado no início ou na retomada de um job; os controladores seguem
+        compartilhados, então envios simultâneos continuam dividindo a taxa.
+        """
+        with self._cond:
+            for controller in self._controllers.values():
+                controller.reset()
+            # Envios aguardando a taxa antiga recalculam a espera
+            self._cond.notify_all()
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """Retorna as métricas dos controladores de taxa por faixa"""
+        with self._cond:
+            controllers = dict(self._controllers)
+        return {lane: controller.get_stats() for lane, controller in controllers.items()}
+
+    def dispatch(self, items: List[Any], send_func: Callable[[Any, int], Dict],
+                 lane_func: Callable[[Any], str], default_interval: float = 0,
+                 outcome_func: Callable[[Dict], str] = None) -> List[Dict]:
+        """
+        Envia todos os itens respeitando os limites por faixa
+
+        Args:
+            items: Itens a enviar (ex.: destinatários)
+            send_func: Função (item, índice) -> dict de resultado
+            lane_func: Função item -> nome da faixa
+            default_interval: Intervalo mínimo para faixas sem taxa configurada
+                (sem controlador de taxa)
+            outcome_func: Função resultado -> desfecho para o controlador
+                (padrão: sucesso/falha conforme result['success'])
+
+        Returns:
+            Lista de resultados na mesma ordem de items
+        """
+        results: List[Optional[Dict]] = [None] * len(items)
+        pending: 'OrderedDict[str, deque]' = OrderedDict()
+
+        for index, item in enumerate(items):
+            try:
+                lane = lane_func(item)
+            except Exception:
+                lane = ''
+            pending.setdefault(lane, deque()).append((index, item))
+
+        state = {'active': 0}
+        outcome_func = outcome_func or (lambda result: SUCCESS if result.get('success') else FAILED)
+
+        def run(lane: str, index: int, item: Any):
+            try:
+                results[index] = send_func(item, index)
+            except Exception as e:
+                logger.error(f"Erro ao processar destinatário {item}: {e}")
+                results[index] = {
+                    'success': False,
+                    'error': str(e),
+                    'recipient': item,
+                    'index': index
+                }
+            finally:
+                controller = self._controllers.get(lane)
+                if controller is not None and results[index] is not None:
+                    controller.record(outcome_func(results[index]))
+                with self._cond:
+                    self._in_flight[lane] -= 1
+                    state['active'] -= 1
+                    self._cond.notify_all()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            with self._cond:
+                while pending or state['active']:
+                    wait = self._start_ready(pending, state, executor, run, default_interval, results)
+                    if pending or state['active']:
+                        self._cond.wait(timeout=wait)
+
+        return results
+
+    def _start_ready(self, pending, state, executor, run, default_interval, results) -> Optional[float]:
+        """Inicia os envios liberados; retorna quanto esperar pela próxima faixa"""
+        started = True
+
+        while started:
+            started = False
+            wait = None
+            now = time.monotonic()
+
+            # Percorre as faixas em rodízio para que um domínio grande não
+            # monopolize os workers
+            for lane in list(pending.keys()):
+                if state['active'] >= self.max_workers:
+                    return None
+
+                limit = self.get_limit(lane)
+                if self._in_flight.get(lane, 0) >= limit.concurrency:
+                    continue
+
+                controller = self._get_controller_locked(lane, limit, default_interval)
+                if controller is not None:
+                    if controller.is_paused(now):
+                        self._skip_lane(pending.pop(lane), results)
+                        continue
+                    remaining = controller.reserve(now)
+                else:
+                    remaining = self._next_start.get(lane, 0) - now
+
+                if remaining > 0:
+                    wait = remaining if wait is None else min(wait, remaining)
+                    continue
+
+                index, item = pending[lane].popleft()
+                if not pending[lane]:
+                    del pending[lane]
+
+                self._in_flight[lane] = self._in_flight.get(lane, 0) + 1
+                if controller is None:
+                    self._next_start[lane] = now + limit.min_interval(default_interval)
+                state['active'] += 1
+                executor.submit(run, lane, index, item)
+                started = True
+
+        return wait
+
+    def _get_controller_locked(self, lane, limit, default_interval) -> Optional[AdaptiveRateController]:
+        """Versão de get_controller para uso com _cond já adquirido"""
+        if self.controller_factory is None:
+            return None
+
+        controller = self._controllers.get(lane)
+        if controller is None:
+            controller = self.controller_factory(lane, limit, default_interval)
+            self._controllers[lane] = controller
+        return controller
+
+    def _skip_lane(self, items, results):
+        """Marca os itens restantes de uma faixa pausada como não enviados"""
+        for index, item in items:
+            results[index] = {
+                'success': False,
+                'paused': True,
+                'error': 'Envio pausado automaticamente: taxa de falhas acima do limite',
+                'recipient': item,
+                'index': index
+            }
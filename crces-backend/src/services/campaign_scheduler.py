@@ -0,0 +1,296 @@
+import os
+import heapq
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import select, update
+from src.models.user import db
+from src.models.campaign import Campaign, CampaignType, CampaignStatus
+from src.models.audit import AuditLog
+from src.services.template_cache import get_email_template, get_whatsapp_template
+
+logger = logging.getLogger(__name__)
+
+# Campo de cada destinatário exigido por canal
+CHANNEL_RECIPIENT_FIELDS = {
+    'email': 'email',
+    'whatsapp': 'phone'
+}
+
+
+def _to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Normaliza datas com fuso para UTC sem fuso (como gravado no banco)"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class CampaignScheduler:
+    """
+    Dispara campanhas agendadas no horário
+
+    Mantém em memória um min-heap (scheduled_at, campaign_id) carregado da
+    consulta indexada por (status, scheduled_at) e dorme até o próximo
+    vencimento. Rotas que criam, alteram ou cancelam campanhas chamam
+    invalidate(); entradas antigas do heap são descartadas ao chegar ao topo.
+    Uma recarga completa a cada resync_seconds cobre alterações feitas por
+    outros processos. O início é idempotente (UPDATE condicional), então
+    vários processos com scheduler nunca disparam a mesma campanha duas vezes.
+    """
+
+    def __init__(self, resync_seconds: int = 300):
+        self.resync_seconds = resync_seconds
+        self.app = None
+
+        self._heap: List[tuple] = []
+        self._due: Dict[int, datetime] = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._next_resync = 0.0
+
+    def init_app(self, app):
+        """Inicia o scheduler em background para a aplicação"""
+        self.app = app
+        app.extensions['campaign_scheduler'] = self
+
+        if os.getenv('CAMPAIGN_SCHEDULER_ENABLED', 'true').lower() != 'true':
+            logger.info("Scheduler de campanhas desabilitado")
+            return
+
+        self._thread = threading.Thread(target=self._run, name='campaign-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def invalidate(self, campaign_id: int, scheduled_at: Optional[datetime] = None):
+        """
+        Atualiza o agendamento de uma campanha
+
+        Args:
+            campaign_id: Campanha alterada
+            scheduled_at: Novo horário, ou None se não está mais agendada
+        """
+        scheduled_at = _to_naive_utc(scheduled_at)
+
+        with self._cond:
+            if scheduled_at is None:
+                self._due.pop(campaign_id, None)
+            else:
+                self._due[campaign_id] = scheduled_at
+                heapq.heappush(self._heap, (scheduled_at, campaign_id))
+            self._cond.notify_all()
+
+    def reload(self):
+        """Recarrega do banco todas as campanhas agendadas"""
+        with self.app.app_context():
+            rows = db.session.execute(
+                select(Campaign.id, Campaign.scheduled_at).where(
+                    Campaign.status == CampaignStatus.SCHEDULED,
+                    Campaign.scheduled_at.isnot(None)
+                )
+            ).all()
+
+        with self._cond:
+            self._due = {row.id: row.scheduled_at for row in rows}
+            self._heap = [(scheduled_at, campaign_id) for campaign_id, scheduled_at in self._due.items()]
+            heapq.heapify(self._heap)
+            self._next_resync = time.monotonic() + self.resync_seconds
+            self._cond.notify_all()
+
+        logger.info(f"Scheduler de campanhas: {len(rows)} campanhas agendadas")
+
+    def _pop_due(self) -> Optional[int]:
+        """Retira do heap a próxima campanha vencida (chamado com o lock)"""
+        while self._heap:
+            scheduled_at, campaign_id = self._heap[0]
+
+            # Entrada substituída por invalidate()
+            if self._due.get(campaign_id) != scheduled_at:
+                heapq.heappop(self._heap)
+                continue
+
+            if scheduled_at > datetime.utcnow():
+                return None
+
+            heapq.heappop(self._heap)
+            del self._due[campaign_id]
+            return campaign_id
+
+        return None
+
+    def _seconds_until_next(self) -> float:
+        """Tempo até o próximo vencimento ou recarga (chamado com o lock)"""
+        wait = max(0.0, self._next_resync - time.monotonic())
+        if self._heap:
+            until_due = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+            wait = min(wait, max(0.0, until_due))
+        return wait
+
+    def _run(self):
+        while not self._stopped:
+            try:
+                if time.monotonic() >= self._next_resync:
+                    self.reload()
+
+                with self._cond:
+                    campaign_id = self._pop_due()
+                    if campaign_id is None:
+                        self._cond.wait(timeout=self._seconds_until_next())
+                        continue
+
+                with self.app.app_context():
+                    start_scheduled_campaign(campaign_id)
+
+            except Exception as e:
+                logger.error(f"Erro no scheduler de campanhas: {e}")
+                time.sleep(5)
+
+
+def start_scheduled_campaign(campaign_id: int) -> Optional[List[str]]:
+    """
+    Inicia uma campanha agendada e enfileira seus envios
+
+    Só um processo consegue a transição SCHEDULED -> RUNNING; os demais
+    recebem rowcount 0 e desistem.
+
+    Returns:
+        IDs dos jobs criados, ou None se a campanha não foi iniciada aqui
+    """
+    from src.services.messaging_jobs import create_job, enqueue_job
+
+    now = datetime.utcnow()
+    claimed = db.session.execute(
+        update(Campaign).where(
+            Campaign.id == campaign_id,
+            Campaign.status == CampaignStatus.SCHEDULED,
+            Campaign.scheduled_at <= now
+        ).values(status=CampaignStatus.RUNNING, started_at=now)
+    ).rowcount
+    db.session.commit()
+
+    if not claimed:
+        return None
+
+    campaign = db.session.get(Campaign, campaign_id)
+
+    try:
+        # Agendadas antes da validação nas rotas: falha visível em vez de
+        # concluir com zero envios
+        error = scheduled_recipients_error(campaign)
+        if error:
+            raise ValueError(error)
+
+        jobs = []
+        recipients = campaign.get_selection_criteria()['recipients']
+
+        # Campanhas de email e WhatsApp compartilham as mesmas mensagens
+        channels = _channels(campaign)
+
+        for index, channel in enumerate(channels):
+            job = create_job(
+                campaign,
+                f'bulk_{channel}',
+                recipients,
+                _template_params(campaign, channel),
+                created_by=campaign.created_by,
+                materialize=index == 0,
+                channels=channels
+            )
+            jobs.append(job)
+
+        campaign.total_recipients = len(recipients)
+        db.session.commit()
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Erro ao iniciar campanha agendada {campaign_id}: {e}")
+
+        db.session.execute(
+            update(Campaign).where(Campaign.id == campaign_id).values(status=CampaignStatus.FAILED)
+        )
+        db.session.commit()
+
+        AuditLog.log_action(
+            user_id=campaign.created_by,
+            action_type='START_SCHEDULED',
+            resource_type='Campaign',
+            resource_id=str(campaign_id),
+            success=False,
+            error_message=str(e)
+        )
+        return None
+
+    job_ids = [job.id for job in jobs]
+    for job_id in job_ids:
+        enqueue_job(job_id)
+
+    AuditLog.log_action(
+        user_id=campaign.created_by,
+        action_type='START_SCHEDULED',
+        resource_type='Campaign',
+        resource_id=str(campaign_id),
+        new_values={'job_ids': job_ids, 'total_recipients': len(recipients)},
+        success=True
+    )
+
+    return job_ids
+
+
+def scheduled_recipients_error(campaign: Campaign) -> Optional[str]:
+    """
+    Motivo pelo qual a campanha não pode ser agendada, ou None
+
+    Os destinatários de uma campanha agendada vêm de
+    selection_criteria['recipients']: lista de dicts com 'email' (campanhas
+    de email) e/ou 'phone' (WhatsApp), mais as variáveis dos templates.
+    """
+    criteria = campaign.get_selection_criteria()
+    recipients = criteria.get('recipients') if isinstance(criteria, dict) else None
+    if not isinstance(recipients, list) or not recipients:
+        return 'Campanhas agendadas exigem selection_criteria.recipients com ao menos um destinatário'
+
+    fields = [CHANNEL_RECIPIENT_FIELDS[channel] for channel in _channels(campaign)]
+    for number, recipient in enumerate(recipients, start=1):
+        if not isinstance(recipient, dict):
+            return f'Destinatário {number} inválido em selection_criteria.recipients'
+        for field in fields:
+            if not recipient.get(field):
+                return f'Destinatário {number} sem o campo {field} em selection_criteria.recipients'
+    return None
+
+
+def _channels(campaign: Campaign) -> List[str]:
+    """Canais de envio conforme o tipo da campanha"""
+    channels = []
+    if campaign.type in (CampaignType.EMAIL, CampaignType.BOTH):
+        channels.append('email')
+    if campaign.type in (CampaignType.WHATSAPP, CampaignType.BOTH):
+        channels.append('whatsapp')
+    return channels
+
+
+def _template_params(campaign: Campaign, channel: str) -> Dict:
+    """Parâmetros de envio a partir do template da campanha"""
+    if channel == 'whatsapp':
+        template = get_whatsapp_template(campaign.whatsapp_template_id) if campaign.whatsapp_template_id else None
+        if not template:
+            raise ValueError('Template de WhatsApp da campanha não encontrado')
+        return {'template': template['message_content']}
+
+    template = get_email_template(campaign.email_template_id) if campaign.email_template_id else None
+    if not template:
+        raise ValueError('Template de email da campanha não encontrado')
+    return {
+        'subject_template': template['subject'],
+        'html_template': template['html_content'],
+        'text_template': template['text_content']
+    }
+
+
+scheduler = CampaignScheduler(resync_seconds=int(os.getenv('CAMPAIGN_SCHEDULER_RESYNC', '300')))
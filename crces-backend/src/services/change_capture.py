@@ -0,0 +1,116 @@
+import json
+import weakref
+from datetime import date, datetime
+from enum import Enum
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from src.models.user import db
+
+# Colunas cujo valor nunca vai para o log (registra só que mudaram)
+SENSITIVE_COLUMNS = {'password_hash', 'salt', 'mfa_secret', 'backup_codes'}
+
+# Conteúdo de templates: grande e já versionado no próprio template
+CONTENT_COLUMNS = ('html_content', 'text_content', 'message_content')
+
+MASK = '***'
+
+# Instâncias acompanhadas -> {atributo: [valor antigo, valor novo]} já visto em flushes anteriores
+_tracked = weakref.WeakKeyDictionary()
+
+
+def _encode(value):
+    """Valor compacto e serializável em JSON"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, db.Model):
+        # Itens de relacionamento: nome (roles, permissões) ou chave primária
+        return getattr(value, 'name', None) or inspect(value).identity
+    return value
+
+
+def _pending_changes(instance) -> Dict[str, List]:
+    """Mudanças ainda não enviadas ao banco, lidas do histórico de atributos"""
+    state = inspect(instance)
+    changes = {}
+
+    for attr in state.mapper.column_attrs:
+        history = state.attrs[attr.key].history
+        if not history.added and not history.deleted:
+            continue
+        old = history.deleted[0] if history.deleted else None
+        new = history.added[0] if history.added else None
+        changes[attr.key] = [_encode(old), _encode(new)]
+
+    for relationship in state.mapper.relationships:
+        if not relationship.uselist:
+            continue
+        history = state.attrs[relationship.key].history
+        if not history.added and not history.deleted:
+            continue
+        unchanged = [_encode(item) for item in history.unchanged]
+        old = unchanged + [_encode(item) for item in history.deleted]
+        new = unchanged + [_encode(item) for item in history.added]
+        changes[relationship.key] = [sorted(old, key=str), sorted(new, key=str)]
+
+    return changes
+
+
+def track_changes(instance, masked: Iterable[str] = ()):
+    """
+    Passa a acompanhar as mudanças de uma instância até collect_changes
+
+    O histórico de atributos é zerado a cada flush (inclusive autoflush de
+    consultas no meio da rota), então as mudanças vistas antes de cada flush
+    são acumuladas aqui. Colunas em masked (e as sensíveis) são registradas
+    sem os valores.
+    """
+    state = inspect(instance)
+    # Sem o valor carregado o histórico não conhece o valor antigo
+    for key in state.unloaded & set(state.mapper.column_attrs.keys()):
+        getattr(instance, key)
+
+    _tracked[instance] = ({}, tuple(masked))
+
+
+def collect_changes(instance) -> Dict[str, List]:
+    """
+    Colunas alteradas desde track_changes, no formato {coluna: [antigo, novo]}
+
+    Deve ser chamado antes do commit. Para de acompanhar a instância.
+    """
+    seen, masked = _tracked.pop(instance, ({}, ()))
+    changes = _merge(seen, _pending_changes(instance))
+    hidden = set(masked) | SENSITIVE_COLUMNS
+    return {
+        key: [MASK, MASK] if key in hidden else values
+        for key, values in changes.items() if values[0] != values[1]
+    }
+
+
+def _merge(first: Dict[str, List], later: Dict[str, List]) -> Dict[str, List]:
+    """Mantém o valor antigo mais antigo e o novo mais recente"""
+    merged = dict(first)
+    for key, (old, new) in later.items():
+        merged[key] = [merged[key][0], new] if key in merged else [old, new]
+    return merged
+
+
+@event.listens_for(Session, 'before_flush')
+def _accumulate_before_flush(session, flush_context, instances):
+    if not _tracked:
+        return
+    for instance in session.dirty:
+        entry = _tracked.get(instance)
+        if entry is not None:
+            seen, masked = entry
+            _tracked[instance] = (_merge(seen, _pending_changes(instance)), masked)
+
+
+def encode_changes(changes: Optional[Dict[str, List]]) -> Optional[str]:
+    """Codificação compacta das mudanças para AuditLog.changes"""
+    if not changes:
+        return None
+    return json.dumps(changes, default=str, ensure_ascii=False, separators=(',', ':'))
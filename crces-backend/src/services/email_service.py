@@ -8,12 +8,25 @@ from email import encoders
 from email.utils import formataddr
 from typing import List, Dict, Optional
 import os
-from pathlib import Path
-import time
-from datetime import datetime
+import json
+from src.services.smtp_pool import get_smtp_pool
+from src.services.bulk_dispatcher import BulkDispatcher, LaneLimit
+from src.services.rate_controller import AdaptiveRateController, SUCCESS, classify_smtp_code
+from src.services.template_renderer import render_variables, report_missing_variables
 
 logger = logging.getLogger(__name__)
 
+# Limites padrão por domínio de destino (sobrescritos por EMAIL_DOMAIN_LIMITS);
+# 'rate' é o teto do controle adaptativo de taxa do domínio
+DEFAULT_DOMAIN_LIMITS = {
+    'gmail.com': {'concurrency': 3, 'rate': 5},
+    'hotmail.com': {'concurrency': 2, 'rate': 2},
+    'outlook.com': {'concurrency': 2, 'rate': 2},
+    'live.com': {'concurrency': 2, 'rate': 2},
+    'yahoo.com.br': {'concurrency': 2, 'rate': 2},
+    'crc-es.org.br': {'concurrency': 2, 'rate': 5}
+}
+
 class EmailService:
     """Serviço para envio de emails SMTP"""
     
@@ -26,6 +39,58 @@ class EmailService:
         self.from_name = os.getenv('FROM_NAME', 'CRC-ES')
         self.use_tls = os.getenv('SMTP_USE_TLS', 'true').lower() == 'true'
         
+        # Pool de sessões SMTP autenticadas compartilhado entre envios
+        self.smtp_pool = get_smtp_pool(
+            self.smtp_server,
+            self.smtp_port,
+            self.smtp_username,
+            self.smtp_password,
+            use_tls=self.use_tls,
+            ssl_context=ssl.create_default_context()
+        )
+        
+        # Dispatcher concorrente com limites por domínio de destino
+        self.dispatcher = BulkDispatcher(
+            max_workers=int(os.getenv('EMAIL_DISPATCH_WORKERS', '3')),
+            lane_limits=self._load_domain_limits(),
+            default_limit=LaneLimit(
+                concurrency=int(os.getenv('EMAIL_DEFAULT_DOMAIN_CONCURRENCY', '2'))
+            ),
+            controller_factory=self._create_rate_controller
+        )
+    
+    def _create_rate_controller(self, domain: str, limit: LaneLimit, default_interval: float) -> AdaptiveRateController:
+        """Cria o controle adaptativo de taxa de um domínio, a partir dos limites dele"""
+        max_rate = limit.rate or float(os.getenv('EMAIL_MAX_RATE', '10'))
+        
+        return AdaptiveRateController(
+            initial_rate=max_rate,
+            min_rate=float(os.getenv('EMAIL_MIN_RATE', '0.1')),
+            max_rate=max_rate,
+            burst=limit.concurrency,
+            failure_threshold=float(os.getenv('EMAIL_PAUSE_FAILURE_RATE', '0.5')),
+            pause_seconds=float(os.getenv('EMAIL_PAUSE_SECONDS', '300'))
+        )
+    
+    def _classify_result(self, result: Dict) -> str:
+        """Desfecho de um envio para o controle de taxa"""
+        if result.get('success'):
+            return SUCCESS
+        return classify_smtp_code(result.get('status_code'))
+    
+    def _load_domain_limits(self) -> Dict[str, LaneLimit]:
+        """Carrega limites de concorrência/taxa por domínio"""
+        limits = dict(DEFAULT_DOMAIN_LIMITS)
+        
+        custom_limits = os.getenv('EMAIL_DOMAIN_LIMITS')
+        if custom_limits:
+            try:
+                limits.update(json.loads(custom_limits))
+            except ValueError as e:
+                logger.error(f"EMAIL_DOMAIN_LIMITS inválido, usando padrões: {e}")
+        
+        return {domain.lower(): LaneLimit.from_config(config) for domain, config in limits.items()}
+        
     def test_connection(self) -> bool:
         """Testa a conexão SMTP"""
         try:
@@ -81,15 +146,8 @@ class EmailService:
                     else:
                         logger.warning(f"Anexo não encontrado: {attachment_path}")
             
-            # Envia email
-            context = ssl.create_default_context()
-            
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                if self.use_tls:
-                    server.starttls(context=context)
-                
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(message)
+            # Envia email reutilizando uma sessão do pool
+            self.smtp_pool.send_message(message)
             
             logger.info(f"Email enviado com sucesso para {to_email}")
             return {
@@ -103,9 +161,18 @@ class EmailService:
             return {
                 'success': False,
                 'error': str(e),
-                'to_email': to_email
+                'to_email': to_email,
+                'status_code': self._get_smtp_code(e)
             }
     
+    def _get_smtp_code(self, error: Exception) -> Optional[int]:
+        """Extrai o código SMTP de uma exceção, se houver"""
+        if isinstance(error, smtplib.SMTPResponseException):
+            return error.smtp_code
+        if isinstance(error, smtplib.SMTPRecipientsRefused) and error.recipients:
+            return next(iter(error.recipients.values()))[0]
+        return None
+    
     def _add_attachment(self, message: MIMEMultipart, file_path: str):
         """Adiciona anexo à mensagem"""
         try:
@@ -138,71 +205,66 @@ class EmailService:
             html_template: Template HTML com variáveis
             text_template: Template texto com variáveis
             attachments: Lista de anexos
-            delay: Delay entre envios em segundos
+            delay: Mantido por compatibilidade; a taxa parte do limite de cada
+                domínio (EMAIL_DOMAIN_LIMITS, EMAIL_MAX_RATE) e se ajusta ao resultado
+        
+        Os envios são distribuídos em paralelo respeitando os limites de
+        concorrência de cada domínio de destino, com taxa adaptativa por domínio.
+        Se um domínio for pausado por excesso de falhas, seus destinatários
+        restantes retornam com 'paused': True.
         """
-        results = []
+        def send_to_recipient(recipient: Dict, i: int) -> Dict:
+            # Substitui variáveis nos templates
+            subject = self.replace_variables(subject_template, recipient)
+            html_content = self.replace_variables(html_template, recipient)
+            text_content = self.replace_variables(text_template, recipient) if text_template else None
+            
+            # Envia email
+            result = self.send_email(
+                to_email=recipient['email'],
+                subject=subject,
+                html_content=html_content,
+                text_content=text_content,
+                attachments=attachments,
+                to_name=recipient.get('name')
+            )
+            
+            result['recipient'] = recipient
+            result['index'] = i
+            
+            # Log do resultado
+            if result['success']:
+                logger.info(f"Email enviado para {recipient['email']}")
+            else:
+                logger.error(f"Falha ao enviar email para {recipient['email']}: {result['error']}")
+            
+            return result
         
-        for i, recipient in enumerate(recipients):
-            try:
-                # Substitui variáveis nos templates
-                subject = self.replace_variables(subject_template, recipient)
-                html_content = self.replace_variables(html_template, recipient)
-                text_content = self.replace_variables(text_template, recipient) if text_template else None
-                
-                # Envia email
-                result = self.send_email(
-                    to_email=recipient['email'],
-                    subject=subject,
-                    html_content=html_content,
-                    text_content=text_content,
-                    attachments=attachments,
-                    to_name=recipient.get('name')
-                )
-                
-                result['recipient'] = recipient
-                result['index'] = i
-                results.append(result)
-                
-                # Log do resultado
-                if result['success']:
-                    logger.info(f"Email enviado para {recipient['email']}")
-                else:
-                    logger.error(f"Falha ao enviar email para {recipient['email']}: {result['error']}")
-                
-                # Delay entre envios
-                if i < len(recipients) - 1:
-                    time.sleep(delay)
-                    
-            except Exception as e:
-                logger.error(f"Erro ao processar destinatário {recipient}: {e}")
-                results.append({
-                    'success': False,
-                    'error': str(e),
-                    'recipient': recipient,
-                    'index': i
-                })
+        if recipients:
+            report_missing_variables((subject_template, html_template, text_template), recipients[0])
         
-        return results
+        return self.dispatcher.dispatch(
+            recipients,
+            send_to_recipient,
+            lane_func=self.get_recipient_domain,
+            outcome_func=self._classify_result
+        )
+    
+    def get_rate_stats(self) -> Dict:
+        """Retorna a taxa atual e contadores do controle de taxa por domínio"""
+        return self.dispatcher.get_stats()
+    
+    def get_recipient_domain(self, recipient: Dict) -> str:
+        """Retorna o domínio do email do destinatário"""
+        return recipient.get('email', '').rsplit('@', 1)[-1].strip().lower()
     
     def replace_variables(self, template: str, recipient: Dict, global_vars: Dict = None) -> str:
         """Substitui variáveis no template"""
         if not template:
             return ""
-            
-        content = template
-        
-        # Substitui variáveis do destinatário
-        for key, value in recipient.items():
-            placeholder = f"{{{{{key}}}}}"
-            content = content.replace(placeholder, str(value))
-        
-        # Substitui variáveis globais
-        if global_vars:
-            for key, value in global_vars.items():
-                placeholder = f"{{{{{key}}}}}"
-                content = content.replace(placeholder, str(value))
         
-        return content
+        # Template compilado uma vez (cache) e montado com um único join
+        return render_variables(template, recipient, global_vars)
     
     def validate_email(self, email: str) -> bool:
         """Valida formato de email"""
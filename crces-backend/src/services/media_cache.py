@@ -0,0 +1,130 @@
+import base64
+import os
+import threading
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MediaPayload:
+    """Arquivo já codificado em base64, pronto para o payload da API"""
+
+    __slots__ = ('file_name', 'data', 'size')
+
+    def __init__(self, file_name: str, data: str):
+        self.file_name = file_name
+        self.data = data
+        self.size = len(data)
+
+
+class MediaPayloadCache:
+    """
+    Cache LRU de arquivos codificados em base64
+
+    A chave inclui caminho, mtime e tamanho, de modo que um arquivo alterado
+    no disco gera uma nova entrada. O total armazenado respeita um orçamento
+    de memória em bytes; arquivos maiores que o orçamento não são guardados.
+    Chamadas simultâneas para o mesmo arquivo aguardam uma única codificação.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+
+        self._entries: 'OrderedDict[Tuple, MediaPayload]' = OrderedDict()
+        self._loading: Dict[Tuple, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._current_bytes = 0
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0
+        }
+
+    def _make_key(self, path: str) -> Tuple:
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    def get(self, path: str) -> MediaPayload:
+        """
+        Retorna o payload do arquivo, codificando-o apenas na primeira vez
+
+        Raises:
+            OSError: Se o arquivo não puder ser lido
+        """
+        key = self._make_key(path)
+
+        while True:
+            with self._lock:
+                payload = self._entries.get(key)
+                if payload is not None:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return payload
+
+                event = self._loading.get(key)
+                if event is None:
+                    self._stats['misses'] += 1
+                    event = self._loading[key] = threading.Event()
+                    break
+
+            # Outra thread está codificando o mesmo arquivo
+            event.wait()
+            with self._lock:
+                if key not in self._entries:
+                    # Codificação falhou ou não coube no cache: lê diretamente
+                    self._stats['misses'] += 1
+                    return self._encode(path)
+
+        try:
+            payload = self._encode(path)
+            with self._lock:
+                self._store(key, payload)
+            return payload
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            event.set()
+
+    def _encode(self, path: str) -> MediaPayload:
+        with open(path, 'rb') as file:
+            data = base64.b64encode(file.read()).decode('utf-8')
+        return MediaPayload(Path(path).name, data)
+
+    def _store(self, key: Tuple, payload: MediaPayload):
+        """Armazena a entrada e aplica a política LRU (chamado com o lock)"""
+        if payload.size > self.max_bytes:
+            logger.info(f"Arquivo {key[0]} excede o orçamento do cache de mídia, não será armazenado")
+            return
+
+        # Versões antigas do mesmo arquivo não serão mais usadas
+        for old_key in [k for k in self._entries if k[0] == key[0]]:
+            self._current_bytes -= self._entries.pop(old_key).size
+
+        self._entries[key] = payload
+        self._current_bytes += payload.size
+
+        while self._current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._current_bytes -= evicted.size
+            self._stats['evictions'] += 1
+
+    def get_stats(self) -> Dict:
+        """Retorna contadores de acerto/falha e uso de memória"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['current_bytes'] = self._current_bytes
+
+        stats['max_bytes'] = self.max_bytes
+        total = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / total, 4) if total else 0.0
+        return stats
+
+    def clear(self):
+        """Remove todas as entradas"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
@@ -0,0 +1,46 @@
+import os
+from typing import Dict, Iterable, List
+from sqlalchemy import insert
+from src.models.user import db
+
+# Linhas por executemany: limita memória do driver e tamanho de cada comando
+CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', '1000'))
+
+
+def _chunks(rows: List, size: int) -> Iterable[List]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def bulk_insert(model, rows: List[Dict], chunk_size: int = None, commit_every: int = None) -> int:
+    """
+    Insere linhas em lote via executemany, sem criar objetos ORM
+
+    Args:
+        model: Modelo de destino
+        rows: Dicionários coluna -> valor (defaults do modelo são aplicados)
+        chunk_size: Linhas por comando
+        commit_every: Se informado, faz commit a cada N linhas; caso
+            contrário o commit fica com quem chamou
+
+    Returns:
+        Número de linhas inseridas
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    statement = insert(model)
+
+    inserted = pending = 0
+    for chunk in _chunks(rows, chunk_size):
+        db.session.execute(statement, chunk)
+        inserted += len(chunk)
+        pending += len(chunk)
+
+        if commit_every and pending >= commit_every:
+            db.session.commit()
+            pending = 0
+
+    if commit_every and pending:
+        db.session.commit()
+
+    return inserted
+
@@ -0,0 +1,336 @@
+import os
+import socket
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List
+from celery import shared_task
+from sqlalchemy import select, update, func, or_
+from src.models.user import db
+from src.models.campaign import Campaign, CampaignStatus, MessageStatus
+from src.models.job import MessagingJob
+from src.models.audit import AuditLog
+from src.services.whatsapp_service import WhatsAppService
+from src.services.email_service import EmailService
+from src.services.outbox_service import CampaignOutbox
+
+logger = logging.getLogger(__name__)
+
+# Serviços compartilhados pelo processo (rotas e workers), para que os
+# limites de taxa e pools de conexão valham para todos os envios
+whatsapp_service = WhatsAppService()
+email_service = EmailService()
+
+# Mensagens reservadas por lote e duração do lease de cada lote
+CHUNK_SIZE = int(os.getenv('MESSAGING_JOB_CHUNK_SIZE', '50'))
+LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', '300'))
+MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '3'))
+
+# Quantas tarefas drenam o mesmo job em paralelo
+PARALLELISM = int(os.getenv('MESSAGING_JOB_PARALLELISM', '1'))
+
+JOB_CHANNELS = {
+    'bulk_whatsapp': 'whatsapp',
+    'bulk_email': 'email'
+}
+
+# Intervalo da reconciliação periódica das estatísticas das campanhas
+RECONCILE_SECONDS = int(os.getenv('CAMPAIGN_STATS_RECONCILE_SECONDS', '600'))
+
+# Estados em que o job não deve mais ser drenado ('paused' é retomado por resume_job)
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+def create_job(campaign: Campaign, job_type: str, recipients: List[Dict], params: Dict,
+               created_by: int = None, materialize: bool = True, channels: List[str] = None) -> MessagingJob:
+    """
+    Cria o job e materializa os destinatários na outbox (sem commit)
+
+    Campanhas com os dois canais criam um job por canal sobre as mesmas
+    mensagens: apenas o primeiro materializa, pendente em todos os canais.
+    """
+    job = MessagingJob(
+        job_type=job_type,
+        status='queued',
+        campaign_id=campaign.id,
+        total=len(recipients),
+        created_by=created_by
+    )
+    job.set_params(params)
+    db.session.add(job)
+
+    if materialize:
+        CampaignOutbox.enqueue(campaign.id, channels or [JOB_CHANNELS[job_type]], recipients)
+    return job
+
+
+def enqueue_job(job_id: str, parallelism: int = None):
+    """
+    Dispara as tarefas que drenam a outbox do job (início ou retomada)
+
+    As tarefas começam tirando da pausa os controladores de taxa do canal;
+    os reagendamentos por lease expirado não fazem isso.
+    """
+    tasks = [
+        drain_messaging_job.delay(job_id, reset_rate=True)
+        for _ in range(max(1, parallelism or PARALLELISM))
+    ]
+    return tasks[0]
+
+
+def resume_job(job_id: str) -> bool:
+    """
+    Retoma um job pausado (pausa automática por excesso de falhas)
+
+    Job e campanha voltam a 'running' e as tarefas são disparadas de novo;
+    o envio continua pelas mensagens ainda pendentes na outbox. Retorna
+    False se o job não estava pausado.
+    """
+    resumed = db.session.execute(
+        update(MessagingJob).where(
+            MessagingJob.id == job_id,
+            MessagingJob.status == 'paused'
+        ).values(status='running', finished_at=None)
+    ).rowcount
+    if not resumed:
+        db.session.commit()
+        return False
+
+    job = db.session.get(MessagingJob, job_id)
+    db.session.execute(
+        update(Campaign).where(
+            Campaign.id == job.campaign_id,
+            Campaign.status == CampaignStatus.PAUSED
+        ).values(status=CampaignStatus.RUNNING)
+    )
+    db.session.commit()
+
+    enqueue_job(job_id)
+    return True
+
+
+def resume_campaign(campaign_id: int) -> List[str]:
+    """Retoma os jobs pausados da campanha; retorna os IDs retomados"""
+    job_ids = db.session.execute(
+        select(MessagingJob.id).where(
+            MessagingJob.campaign_id == campaign_id,
+            MessagingJob.status == 'paused'
+        )
+    ).scalars().all()
+    return [job_id for job_id in job_ids if resume_job(job_id)]
+
+
+@shared_task(name='messaging.drain_job', bind=True)
+def drain_messaging_job(self, job_id: str, reset_rate: bool = False):
+    """Tarefa que envia as mensagens pendentes de um job"""
+    retry = None
+    if not self.app.conf.task_always_eager:
+        retry = lambda countdown: self.apply_async(args=(job_id,), countdown=countdown)
+    run_job(job_id, retry=retry, reset_rate=reset_rate)
+
+
+@shared_task(name='campaigns.reconcile_statistics')
+def reconcile_campaign_statistics():
+    """
+    Corrige desvios dos contadores incrementais das campanhas
+
+    Recalcula apenas campanhas em andamento ou finalizadas desde a última
+    rodada; as demais não mudam mais.
+    """
+    since = datetime.utcnow() - timedelta(seconds=2 * RECONCILE_SECONDS)
+    campaigns = Campaign.query.filter(or_(
+        Campaign.status.in_((CampaignStatus.RUNNING, CampaignStatus.PAUSED)),
+        Campaign.completed_at >= since
+    )).all()
+
+    for campaign in campaigns:
+        campaign.update_statistics()
+
+    return len(campaigns)
+
+
+def run_job(job_id: str, retry=None, reset_rate: bool = False):
+    """
+    Drena a outbox de um job de envio em massa
+
+    Várias execuções podem drenar o mesmo job ao mesmo tempo (vários workers)
+    ou retomá-lo após uma queda: cada uma reserva lotes distintos com lease.
+    Quem encontra a outbox vazia finaliza job e campanha uma única vez. Se
+    restarem apenas mensagens reservadas por outro worker, a execução se
+    reagenda para depois da expiração do lease, para retomá-las caso aquele
+    worker tenha caído.
+
+    O controle de taxa é compartilhado com os outros envios do canal no
+    processo; com reset_rate (job novo ou retomado) uma pausa ou taxa
+    reduzida deixada por um envio anterior é descartada antes de começar.
+    """
+    job = db.session.get(MessagingJob, job_id)
+    if job is None:
+        logger.error(f"Job {job_id} não encontrado")
+        return
+
+    if job.status in FINAL_STATUSES:
+        logger.info(f"Job {job_id} já finalizado (status {job.status}), ignorando")
+        return
+
+    if job.status == 'paused':
+        logger.info(f"Job {job_id} pausado, aguardando retomada")
+        return
+
+    channel = JOB_CHANNELS[job.job_type]
+    if reset_rate:
+        service = whatsapp_service if channel == 'whatsapp' else email_service
+        service.dispatcher.reset_controllers()
+    send_batch = _get_sender(job.job_type, job.get_params())
+    outbox = CampaignOutbox(
+        job.campaign_id,
+        channel,
+        owner=f"{socket.gethostname()}:{os.getpid()}",
+        lease_seconds=LEASE_SECONDS,
+        max_attempts=MAX_ATTEMPTS
+    )
+
+    # Apenas a primeira execução marca o início
+    now = datetime.utcnow()
+    started = db.session.execute(
+        update(MessagingJob).where(
+            MessagingJob.id == job_id,
+            MessagingJob.status == 'queued'
+        ).values(status='running', started_at=now)
+    ).rowcount
+    if started:
+        db.session.execute(
+            update(Campaign).where(Campaign.id == job.campaign_id).values(
+                status=CampaignStatus.RUNNING,
+                started_at=now
+            )
+        )
+    db.session.commit()
+
+    try:
+        paused = False
+
+        while not paused:
+            items = outbox.claim(CHUNK_SIZE)
+            if not items:
+                break
+
+            results = send_batch([item.recipient for item in items])
+            paused = any(result.get('paused') for result in results)
+
+            successful, failed = outbox.complete(items, results)
+            _add_progress(job_id, job.campaign_id, channel, successful, failed)
+            db.session.commit()
+
+        if paused:
+            _finish(job_id, 'paused', CampaignStatus.PAUSED)
+            return
+
+        exhausted = outbox.fail_exhausted()
+        if exhausted:
+            _add_progress(job_id, job.campaign_id, channel, 0, exhausted)
+        db.session.commit()
+
+        if outbox.pending_count() == 0:
+            _finish(job_id, 'completed', CampaignStatus.COMPLETED)
+        elif retry is not None:
+            # Mensagens com lease de outro worker: volta quando o lease expirar
+            expires_at = outbox.next_lease_expiry()
+            countdown = max(1, int((expires_at - datetime.utcnow()).total_seconds()) + 1) if expires_at else LEASE_SECONDS
+            retry(countdown)
+
+    except Exception as e:
+        logger.error(f"Erro no job {job_id}: {e}")
+        db.session.rollback()
+
+        db.session.execute(
+            update(MessagingJob).where(MessagingJob.id == job_id).values(error_message=str(e))
+        )
+        _finish(job_id, 'failed', CampaignStatus.FAILED)
+
+
+def _get_sender(job_type: str, params: Dict):
+    """Função que envia um lote de destinatários conforme o tipo do job"""
+    if job_type == 'bulk_whatsapp':
+        return lambda recipients: whatsapp_service.send_bulk_messages(
+            recipients=recipients,
+            template=params['template'],
+            delay=params.get('delay', 2)
+        )
+
+    return lambda recipients: email_service.send_bulk_emails(
+        recipients=recipients,
+        subject_template=params['subject_template'],
+        html_template=params['html_template'],
+        text_template=params.get('text_template'),
+        delay=params.get('delay', 1)
+    )
+
+
+def _add_progress(job_id: str, campaign_id: int, channel: str, successful: int, failed: int):
+    """Soma atomicamente o resultado de um lote a job e campanha (sem commit)"""
+    if not successful and not failed:
+        return
+
+    db.session.execute(
+        update(MessagingJob).where(MessagingJob.id == job_id).values(
+            processed=MessagingJob.processed + successful + failed,
+            successful=MessagingJob.successful + successful,
+            failed=MessagingJob.failed + failed
+        )
+    )
+
+    Campaign.apply_status_deltas(campaign_id, channel, {
+        MessageStatus.SENT: successful,
+        MessageStatus.FAILED: failed
+    })
+
+
+def _finish(job_id: str, status: str, campaign_status: CampaignStatus):
+    """Finaliza job e campanha uma única vez, mesmo com execuções concorrentes"""
+    now = datetime.utcnow()
+    finished = db.session.execute(
+        update(MessagingJob).where(
+            MessagingJob.id == job_id,
+            MessagingJob.status.in_(('queued', 'running'))
+        ).values(status=status, finished_at=now)
+    ).rowcount
+    db.session.commit()
+
+    if not finished:
+        return
+
+    job = db.session.get(MessagingJob, job_id)
+    db.session.refresh(job)
+
+    # A campanha só conclui quando o último job dela terminar; com outro job
+    # pausado ela fica pausada
+    job_counts = dict(db.session.execute(
+        select(MessagingJob.status, func.count(MessagingJob.id)).where(
+            MessagingJob.campaign_id == job.campaign_id
+        ).group_by(MessagingJob.status)
+    ).all())
+    active_jobs = job_counts.get('queued', 0) + job_counts.get('running', 0)
+    if campaign_status == CampaignStatus.COMPLETED and job_counts.get('paused'):
+        campaign_status = CampaignStatus.PAUSED
+
+    if not active_jobs or campaign_status != CampaignStatus.COMPLETED:
+        campaign_values = {'status': campaign_status}
+        if campaign_status == CampaignStatus.COMPLETED:
+            campaign_values['completed_at'] = now
+        db.session.execute(update(Campaign).where(Campaign.id == job.campaign_id).values(**campaign_values))
+        db.session.commit()
+
+    # Contadores finais exatos, independentemente de desvios durante o envio
+    campaign = db.session.get(Campaign, job.campaign_id)
+    if campaign:
+        campaign.update_statistics()
+
+    AuditLog.log_action(
+        user_id=job.created_by,
+        action_type=f'{job.job_type.upper()}_{status.upper()}',
+        resource_type='MessagingJob',
+        resource_id=job.id,
+        new_values=job.to_dict(),
+        success=status != 'failed',
+        error_message=job.error_message
+    )
@@ -0,0 +1,293 @@
+import json
+import uuid
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+from sqlalchemy import select, update, func, or_, and_, bindparam
+from src.models.user import db
+from src.models.campaign import CampaignMessage, MessageStatus
+from src.services.message_store import bulk_insert
+
+logger = logging.getLogger(__name__)
+
+# Bancos que suportam SELECT ... FOR UPDATE SKIP LOCKED
+SKIP_LOCKED_DIALECTS = ('postgresql', 'mysql', 'mariadb', 'oracle')
+
+
+class OutboxItem:
+    """Mensagem reservada por um worker"""
+
+    __slots__ = ('id', 'recipient', 'token')
+
+    def __init__(self, id: int, recipient: Dict, token: str):
+        self.id = id
+        self.recipient = recipient
+        self.token = token
+
+
+class CampaignOutbox:
+    """
+    Fila durável de envio de uma campanha sobre a tabela CampaignMessage
+
+    Os destinatários são gravados como PENDING antes do envio. Workers
+    reservam lotes com um lease (owner + expiração); ao terminar o lote, os
+    status são gravados em lote, apenas se o lease ainda pertencer ao worker.
+    Lease e tentativas são colunas do canal, então os jobs de email e de
+    WhatsApp de uma mesma campanha não bloqueiam nem consomem as tentativas
+    um do outro.
+    Leases expirados (worker que caiu) voltam a ser reservados
+    automaticamente; mensagens que esgotam as tentativas viram FAILED.
+    """
+
+    def __init__(self, campaign_id: int, channel: str, owner: str = None,
+                 lease_seconds: int = 300, max_attempts: int = 3):
+        self.campaign_id = campaign_id
+        self.channel = channel
+        self.owner = owner or uuid.uuid4().hex
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        if channel == 'whatsapp':
+            self.status_column = CampaignMessage.whatsapp_status
+            self.sent_at_column = CampaignMessage.whatsapp_sent_at
+            self.error_column = CampaignMessage.whatsapp_error_message
+            self.lease_owner_column = CampaignMessage.whatsapp_lease_owner
+            self.lease_expires_column = CampaignMessage.whatsapp_lease_expires_at
+            self.attempts_column = CampaignMessage.whatsapp_attempts
+        else:
+            self.status_column = CampaignMessage.email_status
+            self.sent_at_column = CampaignMessage.email_sent_at
+            self.error_column = CampaignMessage.email_error_message
+            self.lease_owner_column = CampaignMessage.email_lease_owner
+            self.lease_expires_column = CampaignMessage.email_lease_expires_at
+            self.attempts_column = CampaignMessage.email_attempts
+
+    @staticmethod
+    def enqueue(campaign_id: int, channels: List[str], recipients: List[Dict]) -> int:
+        """
+        Materializa os destinatários como mensagens pendentes (sem commit)
+
+        Cada mensagem fica pendente em todos os canais informados, para que
+        campanhas de email e WhatsApp compartilhem as mesmas linhas.
+        """
+        status = {
+            'whatsapp_status' if channel == 'whatsapp' else 'email_status': MessageStatus.PENDING
+            for channel in channels
+        }
+        now = datetime.utcnow()
+
+        rows = [{
+            'campaign_id': campaign_id,
+            'recipient_name': recipient.get('name') or recipient.get('nome') or '',
+            'recipient_email': recipient.get('email'),
+            'recipient_phone': recipient.get('phone'),
+            'recipient_registry': str(recipient.get('registry') or recipient.get('registro') or ''),
+            **status,
+            'additional_data': json.dumps({'recipient': recipient}),
+            'email_attempts': 0,
+            'whatsapp_attempts': 0,
+            'created_at': now,
+            'updated_at': now
+        } for recipient in recipients]
+
+        return bulk_insert(CampaignMessage, rows)
+
+    def _claimable(self, now: datetime):
+        """Condição das mensagens que podem ser reservadas"""
+        return and_(
+            CampaignMessage.campaign_id == self.campaign_id,
+            self.status_column == MessageStatus.PENDING,
+            self.attempts_column < self.max_attempts,
+            or_(
+                self.lease_expires_column.is_(None),
+                self.lease_expires_column < now
+            )
+        )
+
+    def claim(self, batch_size: int) -> List[OutboxItem]:
+        """
+        Reserva até batch_size mensagens pendentes para este worker
+
+        Em bancos servidores as linhas são travadas com SKIP LOCKED (ou
+        READPAST no SQL Server), de modo que workers concorrentes pegam lotes
+        distintos sem esperar uns pelos outros. No SQLite a reserva é um único
+        UPDATE, serializado pelo próprio banco. A condição é repetida no UPDATE
+        para que uma linha reservada por outro worker nunca seja tomada.
+        """
+        now = datetime.utcnow()
+        token = f"{self.owner}:{uuid.uuid4().hex[:8]}"
+        dialect = db.session.get_bind().dialect.name
+
+        candidates = select(CampaignMessage.id).where(
+            self._claimable(now)
+        ).order_by(CampaignMessage.id).limit(batch_size)
+
+        if dialect in SKIP_LOCKED_DIALECTS:
+            ids = db.session.execute(candidates.with_for_update(skip_locked=True)).scalars().all()
+            if not ids:
+                db.session.commit()
+                return []
+            target = CampaignMessage.id.in_(ids)
+        elif dialect == 'mssql':
+            candidates = candidates.with_hint(CampaignMessage, 'WITH (UPDLOCK, ROWLOCK, READPAST)', 'mssql')
+            ids = db.session.execute(candidates).scalars().all()
+            if not ids:
+                db.session.commit()
+                return []
+            target = CampaignMessage.id.in_(ids)
+        else:
+            target = CampaignMessage.id.in_(candidates.scalar_subquery())
+
+        db.session.execute(
+            update(CampaignMessage).where(
+                target,
+                self._claimable(now)
+            ).values({
+                self.lease_owner_column.key: token,
+                self.lease_expires_column.key: now + timedelta(seconds=self.lease_seconds),
+                self.attempts_column.key: self.attempts_column + 1
+            }).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        rows = db.session.execute(
+            select(CampaignMessage.id, CampaignMessage.additional_data).where(
+                self.lease_owner_column == token
+            ).order_by(CampaignMessage.id)
+        ).all()
+
+        return [OutboxItem(row.id, self._load_recipient(row.additional_data), token) for row in rows]
+
+    def _load_recipient(self, additional_data: str) -> Dict:
+        try:
+            return json.loads(additional_data or '{}').get('recipient', {})
+        except ValueError:
+            return {}
+
+    def complete(self, items: List[OutboxItem], results: List[Dict]) -> Tuple[int, int]:
+        """
+        Grava em lote o resultado dos envios e libera os leases (sem commit)
+
+        Itens com resultado 'paused' voltam a ficar pendentes sem consumir
+        tentativa. Se o lease de um item já tiver expirado e sido tomado por
+        outro worker, a gravação deste worker é descartada.
+
+        Returns:
+            (enviadas, falhas) efetivamente gravadas
+        """
+        table = CampaignMessage.__table__
+        now = datetime.utcnow()
+        status_name = self.status_column.key
+        sent_at_name = self.sent_at_column.key
+        error_name = self.error_column.key
+        lease_owner_name = self.lease_owner_column.key
+        lease_expires_name = self.lease_expires_column.key
+        attempts_name = self.attempts_column.key
+
+        finished, released = [], []
+        for item, result in zip(items, results):
+            if result.get('paused'):
+                released.append({'b_id': item.id, 'b_token': item.token})
+                continue
+
+            data = {'recipient': item.recipient}
+            if result.get('message_id'):
+                data['message_id'] = result['message_id']
+
+            finished.append({
+                'b_id': item.id,
+                'b_token': item.token,
+                'b_status': MessageStatus.SENT if result['success'] else MessageStatus.FAILED,
+                'b_sent_at': now if result['success'] else None,
+                'b_error': None if result['success'] else result.get('error'),
+                'b_data': json.dumps(data)
+            })
+
+        successful = failed = 0
+        owned = and_(
+            table.c.id == bindparam('b_id'),
+            table.c[lease_owner_name] == bindparam('b_token')
+        )
+
+        finish = table.update().where(owned).values({
+            status_name: bindparam('b_status'),
+            sent_at_name: bindparam('b_sent_at'),
+            error_name: bindparam('b_error'),
+            'additional_data': bindparam('b_data'),
+            lease_owner_name: None,
+            lease_expires_name: None,
+            'updated_at': now
+        })
+
+        sent_rows = [row for row in finished if row['b_status'] == MessageStatus.SENT]
+        failed_rows = [row for row in finished if row['b_status'] == MessageStatus.FAILED]
+        if sent_rows:
+            successful = self._execute_counted(finish, sent_rows)
+        if failed_rows:
+            failed = self._execute_counted(finish, failed_rows)
+
+        if released:
+            db.session.execute(
+                table.update().where(owned).values({
+                    lease_owner_name: None,
+                    lease_expires_name: None,
+                    attempts_name: table.c[attempts_name] - 1
+                }),
+                released
+            )
+
+        return successful, failed
+
+    @staticmethod
+    def _execute_counted(statement, rows: List[Dict]) -> int:
+        """
+        Executa o UPDATE para cada conjunto de parâmetros e retorna as linhas alteradas
+
+        O rowcount de um executemany só é confiável se o driver o informar
+        (supports_sane_multi_rowcount); pyodbc com fast_executemany e
+        psycopg2 não informam, e nesses o UPDATE é feito linha a linha.
+        """
+        if db.session.get_bind().dialect.supports_sane_multi_rowcount:
+            return db.session.execute(statement, rows).rowcount
+        return sum(db.session.execute(statement, row).rowcount for row in rows)
+
+    def fail_exhausted(self) -> int:
+        """Marca como FAILED as mensagens que esgotaram as tentativas (sem commit)"""
+        now = datetime.utcnow()
+        result = db.session.execute(
+            update(CampaignMessage).where(
+                CampaignMessage.campaign_id == self.campaign_id,
+                self.status_column == MessageStatus.PENDING,
+                self.attempts_column >= self.max_attempts,
+                or_(
+                    self.lease_expires_column.is_(None),
+                    self.lease_expires_column < now
+                )
+            ).values({
+                self.status_column.key: MessageStatus.FAILED,
+                self.error_column.key: 'Número máximo de tentativas excedido',
+                self.lease_owner_column.key: None,
+                self.lease_expires_column.key: None,
+                'updated_at': now
+            }).execution_options(synchronize_session=False)
+        )
+        return result.rowcount or 0
+
+    def pending_count(self) -> int:
+        """Mensagens ainda pendentes (incluindo as reservadas por outros workers)"""
+        return db.session.execute(
+            select(func.count(CampaignMessage.id)).where(
+                CampaignMessage.campaign_id == self.campaign_id,
+                self.status_column == MessageStatus.PENDING
+            )
+        ).scalar() or 0
+
+    def next_lease_expiry(self):
+        """Expiração do lease ativo mais próximo, se houver"""
+        return db.session.execute(
+            select(func.min(self.lease_expires_column)).where(
+                CampaignMessage.campaign_id == self.campaign_id,
+                self.status_column == MessageStatus.PENDING,
+                self.lease_expires_column.isnot(None)
+            )
+        ).scalar()
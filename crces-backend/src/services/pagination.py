@@ -0,0 +1,86 @@
+import json
+import base64
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(value: Any, id: int) -> str:
+    """Cursor opaco com a posição (valor de ordenação, id) do último item"""
+    if isinstance(value, datetime):
+        payload = {'t': 'dt', 'v': value.isoformat(), 'id': id}
+    else:
+        payload = {'v': value, 'id': id}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """Decodifica um cursor gerado por encode_cursor (ValueError se inválido)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value = payload['v']
+        if payload.get('t') == 'dt':
+            value = datetime.fromisoformat(value)
+        return value, int(payload['id'])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError('Cursor inválido') from e
+
+
+def keyset_page(query, sort_column, id_column, cursor: Optional[str], limit: int,
+                descending: bool = True, include_total: bool = False) -> Dict:
+    """
+    Pagina por posição (keyset) em vez de OFFSET
+
+    Ordena por (sort_column, id_column) e busca apenas os itens depois do
+    cursor, o que usa o índice sobre essas colunas e custa o mesmo em
+    qualquer profundidade. O total (COUNT) só é calculado se pedido.
+
+    Args:
+        query: Query já filtrada e sem ordenação
+        cursor: Cursor devolvido pela página anterior ('' ou None na primeira)
+        limit: Itens por página (no mínimo 1)
+
+    Returns:
+        {'items', 'next_cursor', 'has_next'} e, se pedido, 'total'
+    """
+    limit = max(1, limit)
+    total = None
+    if include_total:
+        total = query.order_by(None).count()
+
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        if descending:
+            after = or_(sort_column < value, and_(sort_column == value, id_column < last_id))
+        else:
+            after = or_(sort_column > value, and_(sort_column == value, id_column > last_id))
+        query = query.filter(after)
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    # Um item a mais indica se há próxima página, sem COUNT
+    items = query.limit(limit + 1).all()
+    has_next = len(items) > limit
+    items = items[:limit]
+
+    next_cursor = None
+    if has_next:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+
+    page = {'items': items, 'next_cursor': next_cursor, 'has_next': has_next}
+    if include_total:
+        page['total'] = total
+    return page
+
+
+def cursor_pagination(page: Dict, limit: int) -> Dict:
+    """Bloco 'pagination' da resposta no modo cursor"""
+    pagination = {'limit': limit, 'next_cursor': page['next_cursor'], 'has_next': page['has_next']}
+    if 'total' in page:
+        pagination['total'] = page['total']
+    return pagination
@@ -0,0 +1,158 @@
+import os
+import atexit
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHasherBusy(Exception):
+    """Fila de verificações de senha cheia (a requisição deve ser recusada)"""
+
+
+def _check(password: str, password_hash: str) -> bool:
+    """Executado no processo do pool"""
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError:
+        # Hash em formato inválido
+        return False
+
+
+def _hash(password: str, rounds: int) -> str:
+    """Executado no processo do pool"""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _pool_context():
+    """
+    Contexto dos processos do pool
+
+    Nunca fork: o processo do Flask/Celery já tem threads (sink de auditoria,
+    pools de conexão) e um fork copiaria locks presos por elas. forkserver
+    parte de um processo limpo; spawn onde forkserver não existe (Windows).
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def hash_rounds(password_hash: str) -> Optional[int]:
+    """Custo (log2 das rodadas) de um hash bcrypt '$2b$12$...'"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """
+    bcrypt fora das threads que atendem requisições
+
+    As verificações e os hashes rodam em um pool de processos limitado
+    (bcrypt é CPU puro e disputaria o GIL e os workers do Flask). No
+    máximo workers + max_queue operações ficam pendentes; acima disso a
+    chamada falha na hora com PasswordHasherBusy em vez de enfileirar um
+    pico de logins. Com workers=0 tudo roda na própria thread
+    (desenvolvimento). Hashes com custo diferente de rounds são refeitos
+    no próximo login (ver needs_rehash).
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 32, rounds: int = 12):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+
+        self._slots = threading.BoundedSemaphore(workers + max_queue) if workers else None
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'checks': 0,
+            'hashes': 0,
+            'rejected': 0,
+            'pool_restarts': 0
+        }
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Criado no primeiro uso: o processo já está configurado quando os workers são criados
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context())
+            return self._pool
+
+    def _run(self, function, *args):
+        if not self.workers:
+            return function(*args)
+
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise PasswordHasherBusy('Fila de verificação de senhas cheia')
+
+        try:
+            pool = self._get_pool()
+            try:
+                return pool.submit(function, *args).result()
+            except BrokenProcessPool:
+                # Um processo do pool morreu: recria o pool e executa aqui desta vez
+                logger.error("Pool de hash de senhas quebrado, recriando")
+                self._count('pool_restarts')
+                with self._pool_lock:
+                    if self._pool is pool:
+                        self._pool = None
+                pool.shutdown(wait=False)
+                return function(*args)
+        finally:
+            self._slots.release()
+
+    def check(self, password: str, password_hash: str) -> bool:
+        """
+        Verifica a senha contra o hash bcrypt
+
+        Raises:
+            PasswordHasherBusy: Se a fila de verificações estiver cheia
+        """
+        self._count('checks')
+        return self._run(_check, password, password_hash)
+
+    def hash(self, password: str) -> str:
+        """
+        Gera o hash bcrypt da senha no custo configurado
+
+        Raises:
+            PasswordHasherBusy: Se a fila de verificações estiver cheia
+        """
+        self._count('hashes')
+        return self._run(_hash, password, self.rounds)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Se o hash foi gerado com um custo diferente do configurado"""
+        return hash_rounds(password_hash) != self.rounds
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({'workers': self.workers, 'max_queue': self.max_queue, 'rounds': self.rounds})
+        return stats
+
+    def shutdown(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(
+    workers=int(os.getenv('PASSWORD_HASH_WORKERS', '2')),
+    max_queue=int(os.getenv('PASSWORD_HASH_MAX_QUEUE', '32')),
+    rounds=int(os.getenv('BCRYPT_LOG_ROUNDS', '12'))
+)
+atexit.register(password_hasher.shutdown)
@@ -0,0 +1,206 @@
+import os
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _estimate(previous: int, current: int, elapsed: float, window: float) -> float:
+    """Contagem aproximada da janela deslizante: o balde anterior pesa pela parte ainda coberta"""
+    return previous * (1 - elapsed / window) + current
+
+
+def _retry_after(previous: int, current: int, elapsed: float, window: float, limit: int) -> float:
+    """Segundos até a contagem aproximada ficar abaixo do limite"""
+    if current >= limit:
+        # Só o balde atual já estoura: espera ele virar o anterior e decair
+        return (window - elapsed) + window * (1 - limit / current)
+    if previous:
+        return max(window * (1 - (limit - current) / previous) - elapsed, 0.0)
+    return 0.0
+
+
+class MemoryRateLimitBackend:
+    """
+    Contadores em memória do processo (desenvolvimento ou worker único)
+
+    Cada chave guarda só dois baldes (índice do atual, contagem anterior e
+    atual), então a consulta é O(1). As chaves ficam em ordem LRU, limitadas
+    a max_keys, e as paradas há mais de duas janelas são removidas a cada
+    sweep_interval segundos.
+    """
+
+    def __init__(self, max_keys: int = 100000, sweep_interval: float = 60.0):
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+
+        # chave -> [índice do balde atual, contagem anterior, contagem atual, janela]
+        self._counters: 'OrderedDict[str, list]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def hit(self, key: str, limit: int, window: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        bucket = int(now // window)
+
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = [bucket, 0, 0, window]
+                if len(self._counters) > self.max_keys:
+                    self._counters.popitem(last=False)
+            else:
+                self._counters.move_to_end(key)
+                if counter[0] != bucket:
+                    # Avançou um balde: o atual vira o anterior; mais que isso, zera
+                    counter[1] = counter[2] if bucket - counter[0] == 1 else 0
+                    counter[2] = 0
+                    counter[0] = bucket
+
+            previous, current = counter[1], counter[2]
+            elapsed = now - bucket * window
+            if _estimate(previous, current, elapsed, window) >= limit:
+                return False, _retry_after(previous, current, elapsed, window, limit)
+
+            counter[2] += 1
+            return True, 0.0
+
+    def _sweep(self, now: float):
+        """Remove chaves sem uso há mais de duas janelas (chamado com o lock)"""
+        stale = [key for key, counter in self._counters.items() if now // counter[3] - counter[0] >= 2]
+        for key in stale:
+            del self._counters[key]
+        self._next_sweep = now + self.sweep_interval
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {'backend': 'memory', 'keys': len(self._counters), 'max_keys': self.max_keys}
+
+
+class RedisRateLimitBackend:
+    """
+    Contadores no Redis, compartilhados por todos os workers
+
+    Cada balde é uma chave própria com expiração de duas janelas (o Redis
+    faz a limpeza). Leitura, decisão e incremento acontecem em um script
+    Lua, de forma atômica e em uma única ida ao servidor. Os baldes são
+    definidos pelo relógio de cada worker (mantido em NTP).
+    """
+
+    # KEYS: balde anterior, balde atual; ARGV: limite, janela (ms), decorrido (ms)
+    SCRIPT = """
+local previous = tonumber(redis.call('GET', KEYS[1]) or '0')
+local current = tonumber(redis.call('GET', KEYS[2]) or '0')
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local elapsed = tonumber(ARGV[3])
+if previous * (1 - elapsed / window) + current >= limit then
+    return {0, previous, current}
+end
+redis.call('INCR', KEYS[2])
+redis.call('PEXPIRE', KEYS[2], window * 2)
+return {1, previous, current + 1}
+"""
+
+    def __init__(self, url: str, prefix: str = 'ratelimit', client=None):
+        self.url = url
+        self.prefix = prefix
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._client = client
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def hit(self, key: str, limit: int, window: float) -> Tuple[bool, float]:
+        now_ms = int(time.time() * 1000)
+        window_ms = int(window * 1000)
+        bucket = now_ms // window_ms
+        elapsed_ms = now_ms - bucket * window_ms
+
+        allowed, previous, current = self._script(
+            keys=[f'{self.prefix}:{key}:{bucket - 1}', f'{self.prefix}:{key}:{bucket}'],
+            args=[limit, window_ms, elapsed_ms]
+        )
+        if allowed:
+            return True, 0.0
+        return False, _retry_after(int(previous), int(current), elapsed_ms / 1000, window, limit)
+
+    def get_stats(self) -> Dict:
+        return {'backend': 'redis', 'url': self.url.rsplit('@', 1)[-1], 'prefix': self.prefix}
+
+
+class RateLimiter:
+    """
+    Limite de requisições por janela deslizante aproximada
+
+    Usa dois baldes de tamanho fixo por chave: a contagem estimada é o balde
+    atual mais a fração do anterior que ainda cai na janela. O custo e a
+    memória por chave são constantes, independentemente do limite. Se o
+    Redis ficar indisponível, a verificação passa para o backend em memória
+    do processo em vez de derrubar a requisição.
+    """
+
+    def __init__(self, backend, fallback: MemoryRateLimitBackend = None):
+        self.backend = backend
+        self.fallback = fallback or (backend if isinstance(backend, MemoryRateLimitBackend)
+                                     else MemoryRateLimitBackend())
+        self._backend_down = False
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'allowed': 0,
+            'limited': 0,
+            'backend_errors': 0
+        }
+
+    def hit(self, key: str, limit: int, window: float) -> Tuple[bool, int]:
+        """
+        Registra uma requisição para a chave
+
+        Returns:
+            (permitida, segundos até a próxima tentativa)
+        """
+        try:
+            allowed, retry_after = self.backend.hit(key, limit, window)
+            if self._backend_down:
+                self._backend_down = False
+                logger.info("Backend de rate limit restabelecido")
+        except Exception as e:
+            if not self._backend_down:
+                self._backend_down = True
+                logger.error(f"Erro no backend de rate limit, usando memória local: {e}")
+            self._count('backend_errors')
+            allowed, retry_after = self.fallback.hit(key, limit, window)
+
+        self._count('allowed' if allowed else 'limited')
+        return allowed, 0 if allowed else max(1, int(math.ceil(retry_after)))
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update(self.backend.get_stats())
+        return stats
+
+
+def _create_backend():
+    backend = os.getenv('RATE_LIMIT_BACKEND', 'memory').lower()
+    if backend == 'redis':
+        url = os.getenv('RATE_LIMIT_REDIS_URL') or os.getenv('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
+        try:
+            return RedisRateLimitBackend(url)
+        except Exception as e:
+            logger.error(f"Rate limit no Redis indisponível ({e}), usando memória local")
+    return MemoryRateLimitBackend(max_keys=int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000')))
+
+
+rate_limiter = RateLimiter(_create_backend())
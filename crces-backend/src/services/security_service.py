@@ -10,6 +10,8 @@ from functools import wraps
 from flask import request, jsonify, g
 import jwt
 from werkzeug.security import check_password_hash
+from src.services.rate_limiter import rate_limiter
+from src.services.token_verification import TokenVerifier, revocation_list
 
 logger = logging.getLogger(__name__)
 
@@ -17,10 +19,14 @@ class SecurityService:
     """Serviço de segurança com rate limiting, validação e auditoria"""
     
     def __init__(self):
-        self.rate_limits = {}  # {ip: {endpoint: [timestamps]}}
+        self.limiter = rate_limiter
         self.failed_attempts = {}  # {ip: {count, last_attempt}}
         self.blocked_ips = set()
         self.jwt_secret = os.getenv('JWT_SECRET_KEY', secrets.token_hex(32))
+        self.token_verifier = TokenVerifier(
+            self.jwt_secret, revocation_list,
+            max_entries=int(os.getenv('TOKEN_CACHE_SIZE', '10000'))
+        )
         
         # Configurações de rate limiting
         self.rate_limit_config = {
@@ -32,6 +38,9 @@ class SecurityService:
         # Configurações de bloqueio
         self.max_failed_attempts = 5
         self.block_duration = 1800  # 30 minutos
+        self.cleanup_interval = 60
+        self._next_cleanup = time.time() + self.cleanup_interval
+        self._retry_after = {}  # {(ip, endpoint): segundos} da última recusa
     
     def rate_limit(self, endpoint_type: str = 'api'):
         """Decorator para rate limiting"""
@@ -52,44 +61,27 @@ class SecurityService:
         return decorator
     
     def is_rate_limited(self, ip: str, endpoint_type: str) -> bool:
-        """Verifica se o IP está sendo rate limited"""
+        """Verifica se o IP está sendo rate limited (e conta a requisição)"""
+        if time.time() >= self._next_cleanup:
+            self.cleanup_expired_blocks()
+        
         if ip in self.blocked_ips:
+            self._retry_after[(ip, endpoint_type)] = self.block_duration
             return True
         
         config = self.rate_limit_config.get(endpoint_type, self.rate_limit_config['api'])
-        current_time = time.time()
-        
-        # Inicializa estrutura se não existir
-        if ip not in self.rate_limits:
-            self.rate_limits[ip] = {}
-        
-        if endpoint_type not in self.rate_limits[ip]:
-            self.rate_limits[ip][endpoint_type] = []
-        
-        # Remove timestamps antigos
-        window_start = current_time - config['window']
-        self.rate_limits[ip][endpoint_type] = [
-            ts for ts in self.rate_limits[ip][endpoint_type] 
-            if ts > window_start
-        ]
+        allowed, retry_after = self.limiter.hit(f'{endpoint_type}:{ip}', config['requests'], config['window'])
         
-        # Verifica se excedeu o limite
-        if len(self.rate_limits[ip][endpoint_type]) >= config['requests']:
-            return True
+        if allowed:
+            self._retry_after.pop((ip, endpoint_type), None)
+            return False
         
-        # Adiciona timestamp atual
-        self.rate_limits[ip][endpoint_type].append(current_time)
-        return False
+        self._retry_after[(ip, endpoint_type)] = retry_after
+        return True
     
     def get_retry_after(self, ip: str, endpoint_type: str) -> int:
         """Retorna tempo em segundos para próxima tentativa"""
-        config = self.rate_limit_config.get(endpoint_type, self.rate_limit_config['api'])
-        
-        if ip in self.rate_limits and endpoint_type in self.rate_limits[ip]:
-            oldest_request = min(self.rate_limits[ip][endpoint_type])
-            return int(config['window'] - (time.time() - oldest_request))
-        
-        return 0
+        return self._retry_after.pop((ip, endpoint_type), 0)
     
     def record_failed_attempt(self, ip: str):
         """Registra tentativa de login falhada"""
@@ -115,8 +107,9 @@ class SecurityService:
             self.blocked_ips.remove(ip)
     
     def cleanup_expired_blocks(self):
-        """Remove bloqueios expirados"""
+        """Remove bloqueios expirados (chamado periodicamente por is_rate_limited)"""
         current_time = time.time()
+        self._next_cleanup = current_time + self.cleanup_interval
         expired_ips = []
         
         for ip in list(self.failed_attempts.keys()):
@@ -261,16 +254,16 @@ class SecurityService:
             'username': user_data['username'],
             'role': user_data.get('role', 'user'),
             'exp': datetime.utcnow() + timedelta(seconds=expires_in),
-            'iat': datetime.utcnow()
+            'iat': datetime.utcnow(),
+            'jti': secrets.token_hex(16)
         }
         
         return jwt.encode(payload, self.jwt_secret, algorithm='HS256')
     
     def verify_jwt_token(self, token: str) -> Optional[Dict]:
-        """Verifica e decodifica token JWT"""
+        """Verifica e decodifica token JWT (com cache dos já verificados e revogação)"""
         try:
-            payload = jwt.decode(token, self.jwt_secret, algorithms=['HS256'])
-            return payload
+            return self.token_verifier.verify(token)
         except jwt.ExpiredSignatureError:
             logger.warning("Token JWT expirado")
             return None
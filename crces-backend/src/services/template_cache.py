@@ -0,0 +1,55 @@
+from typing import Dict, Optional
+from src.models.user import db
+from src.models.template import EmailTemplate, WhatsAppTemplate
+from src.services.versioned_cache import VersionedCache
+
+
+def _load_email_template(template_id) -> Optional[Dict]:
+    template = db.session.get(EmailTemplate, template_id)
+    if template is None:
+        return None
+    return {
+        'id': template.id,
+        'version': template.version,
+        'updated_at': template.updated_at,
+        'is_active': template.is_active,
+        'subject': template.subject,
+        'html_content': template.html_content,
+        'text_content': template.text_content
+    }
+
+
+def _load_whatsapp_template(template_id) -> Optional[Dict]:
+    template = db.session.get(WhatsAppTemplate, template_id)
+    if template is None:
+        return None
+    return {
+        'id': template.id,
+        'version': template.version,
+        'updated_at': template.updated_at,
+        'is_active': template.is_active,
+        'message_content': template.message_content
+    }
+
+
+email_template_cache = VersionedCache('email_template', _load_email_template, models=(EmailTemplate,))
+whatsapp_template_cache = VersionedCache('whatsapp_template', _load_whatsapp_template, models=(WhatsAppTemplate,))
+
+
+def _template_key(template_id) -> Optional[int]:
+    try:
+        return int(template_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_email_template(template_id) -> Optional[Dict]:
+    """Snapshot do template de email (id, versão, conteúdo) via cache; None se não existe"""
+    key = _template_key(template_id)
+    return email_template_cache.get(key) if key is not None else None
+
+
+def get_whatsapp_template(template_id) -> Optional[Dict]:
+    """Snapshot do template de WhatsApp via cache; None se não existe"""
+    key = _template_key(template_id)
+    return whatsapp_template_cache.get(key) if key is not None else None
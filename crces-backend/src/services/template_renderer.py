@@ -0,0 +1,161 @@
+import os
+import re
+import logging
+import threading
+from collections import ChainMap, OrderedDict
+from typing import Callable, Dict, FrozenSet, Hashable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Só {{variavel}} (serviços de envio)
+PLACEHOLDER_DOUBLE = re.compile(r'\{\{([^{}]*)\}\}')
+
+# {{variavel}} ou {variavel} (templates salvos); a busca pela esquerda reproduz
+# a ordem das substituições antigas: '{{{x}}}' vira '{' + valor + '}'
+PLACEHOLDER_ANY = re.compile(r'\{\{([^{}]*)\}\}|\{([^{}]*)\}')
+
+
+# Nomes considerados variáveis nos relatórios (blocos CSS como '{ color: red }' não)
+_VARIABLE_NAME = re.compile(r'\w+')
+
+
+class CompiledTemplate:
+    """
+    Template dividido uma única vez em trechos literais e variáveis
+
+    render() monta a saída com um único join, sem percorrer o texto de
+    novo. Placeholders sem valor permanecem como estão no texto, como nas
+    substituições com str.replace.
+    """
+
+    __slots__ = ('source', 'variables', '_parts', '_slots')
+
+    def __init__(self, source: str, pattern=PLACEHOLDER_DOUBLE):
+        self.source = source
+
+        # Trechos do texto; nas posições de variável fica o placeholder original
+        self._parts: List[str] = []
+        # (posição em _parts, nome da variável)
+        self._slots = []
+
+        position = 0
+        for match in pattern.finditer(source):
+            if match.start() > position:
+                self._parts.append(source[position:match.start()])
+            name = match.group(1) if match.group(1) is not None else match.group(2)
+            self._slots.append((len(self._parts), name))
+            self._parts.append(match.group(0))
+            position = match.end()
+        if position < len(source):
+            self._parts.append(source[position:])
+
+        self.variables: FrozenSet[str] = frozenset(
+            name for _, name in self._slots if _VARIABLE_NAME.fullmatch(name)
+        )
+
+    def render(self, variables, convert: Callable = str) -> str:
+        """Substitui as variáveis (mapping nome -> valor) convertidas com convert"""
+        if not self._slots:
+            return self.source
+
+        parts = list(self._parts)
+        for index, name in self._slots:
+            if name in variables:
+                parts[index] = convert(variables[name])
+        return ''.join(parts)
+
+    def missing(self, provided: Iterable[str]) -> List[str]:
+        """Variáveis usadas no template que não estão em provided"""
+        return sorted(self.variables.difference(provided))
+
+
+class TemplateCache:
+    """
+    Cache LRU de templates compilados
+
+    A chave padrão é o próprio texto; templates salvos usam
+    (tipo, id, versão, campo). Em um acerto o texto guardado é comparado
+    com o atual, então uma edição sem troca de versão recompila em vez de
+    renderizar conteúdo antigo.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+
+        self._entries: 'OrderedDict[Hashable, CompiledTemplate]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0
+        }
+
+    def get(self, source: str, key: Hashable = None, pattern=PLACEHOLDER_DOUBLE,
+            declared: Optional[Iterable[str]] = None) -> CompiledTemplate:
+        """
+        Template compilado para o texto
+
+        Args:
+            declared: Variáveis disponíveis do template; as usadas fora dessa
+                lista são registradas no log ao compilar
+        """
+        cache_key = (pattern.pattern, source if key is None else key)
+
+        with self._lock:
+            compiled = self._entries.get(cache_key)
+            if compiled is not None and (compiled.source is source or compiled.source == source):
+                self._entries.move_to_end(cache_key)
+                self._stats['hits'] += 1
+                return compiled
+            self._stats['misses'] += 1
+
+        compiled = CompiledTemplate(source, pattern)
+        if declared is not None:
+            undeclared = compiled.missing(declared)
+            if undeclared:
+                logger.warning(f"Template{' ' + str(key) if key else ''} usa variáveis não declaradas: {', '.join(undeclared)}")
+
+        with self._lock:
+            self._entries[cache_key] = compiled
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+        return compiled
+
+    def get_stats(self) -> Dict:
+        """Retorna contadores de acerto/falha e ocupação"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+
+        stats['max_entries'] = self.max_entries
+        total = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / total, 4) if total else 0.0
+        return stats
+
+
+template_cache = TemplateCache(max_entries=int(os.getenv('TEMPLATE_CACHE_SIZE', '256')))
+
+
+def render_variables(template: str, recipient: Dict, global_vars: Dict = None) -> str:
+    """
+    Substitui {{variavel}} pelos dados do destinatário e, na falta deles,
+    pelas variáveis globais
+    """
+    compiled = template_cache.get(template)
+    return compiled.render(ChainMap(recipient, global_vars) if global_vars else recipient)
+
+
+def report_missing_variables(templates: Iterable[Optional[str]], recipient: Dict, global_vars: Dict = None):
+    """Registra no log as variáveis dos templates que o destinatário não fornece"""
+    provided = set(recipient)
+    if global_vars:
+        provided.update(global_vars)
+
+    missing = set()
+    for template in templates:
+        if template:
+            missing.update(template_cache.get(template).missing(provided))
+    if missing:
+        logger.warning(f"Variáveis sem valor no envio (mantidas no texto): {', '.join(sorted(missing))}")
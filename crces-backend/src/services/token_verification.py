@@ -0,0 +1,226 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import jwt
+from celery import shared_task
+from sqlalchemy import select, delete
+from src.models.user import db, RevokedToken
+
+logger = logging.getLogger(__name__)
+
+# Validade máxima de um token emitido (refresh token): revogações de usuário valem por esse tempo
+MAX_TOKEN_LIFETIME = timedelta(days=int(os.getenv('JWT_MAX_LIFETIME_DAYS', '30')))
+
+# Margem relida a cada sincronização: revoked_at é o relógio de quem gravou,
+# e a linha pode ficar visível depois (commit tardio, relógios defasados)
+SETTLE_SECONDS = float(os.getenv('TOKEN_REVOCATION_SETTLE_SECONDS', '60'))
+
+
+class RevocationList:
+    """
+    Conjunto de tokens revogados, consultado sem ir ao banco
+
+    As revogações ficam na tabela revoked_token (compartilhada pelos
+    workers) e em memória: jtis revogados e, por usuário, o instante até o
+    qual todos os tokens emitidos deixam de valer (troca de roles,
+    desativação). Cada processo busca as revogações novas de outros
+    workers a cada sync_interval segundos, pelas linhas com revoked_at a
+    partir da sincronização anterior menos settle_seconds. Não usa o id
+    como marca d'água: em transações concorrentes um id menor pode ser
+    confirmado depois de um maior e nunca seria lido. Quem revoga aplica
+    na hora; nos demais workers um token revogado ainda é aceito por até
+    sync_interval segundos. Com sync_interval=0 cada verificação
+    sincroniza (uma consulta pelo índice de revoked_at) e a revogação vale
+    na hora em todos os workers.
+    """
+
+    def __init__(self, sync_interval: float = 5.0, settle_seconds: float = 60.0):
+        self.sync_interval = sync_interval
+        self.settle_seconds = settle_seconds
+
+        self._jtis: Dict[str, float] = {}  # jti -> expira em (epoch)
+        self._users: Dict[int, float] = {}  # user_id -> revogado até (epoch)
+        self._synced_at: Optional[datetime] = None  # Início da última sincronização (UTC)
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
+
+    def is_revoked(self, payload: Dict) -> bool:
+        """Se o token (payload já verificado) foi revogado"""
+        if time.monotonic() >= self._next_sync:
+            self.sync()
+
+        jti = payload.get('jti')
+        if jti is not None and jti in self._jtis:
+            return True
+
+        revoked_until = self._users.get(_user_key(payload))
+        # iat tem precisão de segundos: um token do mesmo segundo da revogação também cai
+        return revoked_until is not None and payload.get('iat', 0) <= revoked_until
+
+    def revoke_token(self, jti: str, user_id=None, expires_at: Optional[float] = None):
+        """Revoga um token (logout); expires_at é o exp do token"""
+        expires_at = expires_at or time.time() + MAX_TOKEN_LIFETIME.total_seconds()
+        with self._lock:
+            self._jtis[jti] = expires_at
+        self._persist(jti=jti, user_id=_to_int(user_id), expires_at=datetime.utcfromtimestamp(expires_at))
+
+    def revoke_user(self, user_id):
+        """Revoga todos os tokens já emitidos para o usuário"""
+        now = datetime.utcnow()
+        user_id = _to_int(user_id)
+        with self._lock:
+            self._users[user_id] = _epoch(now)
+        self._persist(jti=None, user_id=user_id, revoked_at=now, expires_at=now + MAX_TOKEN_LIFETIME)
+
+    def _persist(self, **values):
+        db.session.add(RevokedToken(**values))
+        db.session.commit()
+
+    def sync(self):
+        """Carrega as revogações gravadas por outros processos e descarta as expiradas"""
+        self._next_sync = time.monotonic() + self.sync_interval
+        try:
+            started_at = datetime.utcnow()
+            query = select(RevokedToken)
+            if self._synced_at is not None:
+                query = query.where(RevokedToken.revoked_at >= self._synced_at - timedelta(seconds=self.settle_seconds))
+            rows = db.session.execute(query).scalars().all()
+        except Exception as e:
+            logger.error(f"Erro ao sincronizar tokens revogados: {e}")
+            return
+
+        now = time.time()
+        with self._lock:
+            for row in rows:
+                if row.jti:
+                    self._jtis[row.jti] = _epoch(row.expires_at)
+                elif row.user_id is not None:
+                    self._users[row.user_id] = max(self._users.get(row.user_id, 0), _epoch(row.revoked_at))
+            self._synced_at = started_at
+
+            for jti in [jti for jti, expires_at in self._jtis.items() if expires_at < now]:
+                del self._jtis[jti]
+            horizon = now - MAX_TOKEN_LIFETIME.total_seconds()
+            for user_id in [user_id for user_id, until in self._users.items() if until < horizon]:
+                del self._users[user_id]
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'revoked_tokens': len(self._jtis),
+                'revoked_users': len(self._users),
+                'synced_at': self._synced_at.isoformat() if self._synced_at else None,
+                'sync_interval': self.sync_interval
+            }
+
+
+class TokenVerifier:
+    """
+    Verificação de JWT com cache dos tokens já verificados
+
+    A assinatura e as datas são verificadas uma vez; o payload fica em um
+    LRU indexado pelo SHA-256 do token até o exp do próprio token. A
+    revogação é consultada a cada chamada (em memória).
+    """
+
+    def __init__(self, secret: str, revocations: RevocationList, max_entries: int = 10000,
+                 algorithms: tuple = ('HS256',)):
+        self.secret = secret
+        self.revocations = revocations
+        self.max_entries = max_entries
+        self.algorithms = list(algorithms)
+
+        # digest -> (payload, exp)
+        self._entries: 'OrderedDict[bytes, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'revoked': 0
+        }
+
+    def verify(self, token: str) -> Optional[Dict]:
+        """
+        Payload do token, ou None se inválido, expirado ou revogado
+
+        Raises:
+            jwt.ExpiredSignatureError, jwt.InvalidTokenError: Na verificação completa
+        """
+        digest = hashlib.sha256(token.encode('utf-8')).digest()
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and now < entry[1]:
+                self._entries.move_to_end(digest)
+                self._stats['hits'] += 1
+                payload = entry[0]
+            else:
+                payload = None
+                self._stats['misses'] += 1
+
+        if payload is None:
+            payload = jwt.decode(token, self.secret, algorithms=self.algorithms)
+            expires_at = payload.get('exp')
+            if expires_at is not None:
+                with self._lock:
+                    self._entries[digest] = (payload, expires_at)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+
+        if self.revocations.is_revoked(payload):
+            with self._lock:
+                self._stats['revoked'] += 1
+            return None
+        return payload
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        stats['max_entries'] = self.max_entries
+        return stats
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _user_key(payload: Dict) -> Optional[int]:
+    """Usuário do token: user_id (SecurityService) ou sub (flask_jwt_extended)"""
+    return _to_int(payload.get('user_id', payload.get('sub')))
+
+
+def _epoch(value: datetime) -> float:
+    """Datetime UTC sem fuso (como gravado no banco) em segundos epoch"""
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+revocation_list = RevocationList(
+    sync_interval=float(os.getenv('TOKEN_REVOCATION_SYNC_SECONDS', '5')),
+    settle_seconds=SETTLE_SECONDS
+)
+
+
+def prune_revoked_tokens() -> int:
+    """Remove da tabela as revogações cujos tokens já expiraram"""
+    result = db.session.execute(delete(RevokedToken).where(RevokedToken.expires_at < datetime.utcnow()))
+    db.session.commit()
+    return result.rowcount
+
+
+@shared_task(name='auth.prune_revoked_tokens')
+def prune_revoked_tokens_task():
+    """Tarefa periódica de limpeza dos tokens revogados"""
+    removed = prune_revoked_tokens()
+    if removed:
+        logger.info(f"Tokens revogados expirados removidos: {removed}")
+    return removed
@@ -0,0 +1,169 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Hashable, Tuple
+from sqlalchemy import event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from src.models.user import db
+from src.models.cache import CacheVersion
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre leituras do contador de versão (atraso máximo entre workers)
+CACHE_CHECK_INTERVAL = float(os.getenv('CACHE_VERSION_CHECK_SECONDS', '2'))
+
+# Chave em session.info com os caches alterados até o commit
+_PENDING_KEY = 'versioned_cache_bump'
+
+# Modelo -> caches que dependem dele
+_caches_by_model: Dict[type, list] = {}
+
+
+class VersionedCache:
+    """
+    Cache read-through em memória, invalidado por um contador de versão
+
+    get(key) chama loader(key) só na primeira vez; o valor (ou None) fica
+    em um LRU. Escritas nos modelos observados incrementam, após o commit,
+    o contador na tabela cache_version e limpam o cache local. Os demais
+    processos leem esse contador (uma consulta por chave primária) no
+    máximo a cada check_interval segundos e se limpam quando ele muda. ttl
+    limita a idade das entradas caso um incremento se perca.
+
+    Os valores devem ser imutáveis (ou tratados como tal): snapshots, não
+    objetos ORM ligados a uma sessão.
+    """
+
+    def __init__(self, name: str, loader: Callable, models: Tuple[type, ...] = (),
+                 max_entries: int = 1000, check_interval: float = None, ttl: float = 300.0):
+        self.name = name
+        self.loader = loader
+        self.max_entries = max_entries
+        self.check_interval = CACHE_CHECK_INTERVAL if check_interval is None else check_interval
+        self.ttl = ttl
+
+        # chave -> (valor, carregado em)
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._next_check = 0.0
+        # Incrementada a cada limpeza: carga iniciada antes dela não é guardada
+        self._generation = 0
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'version_checks': 0
+        }
+
+        for model in models:
+            _caches_by_model.setdefault(model, []).append(self)
+
+    def get(self, key: Hashable):
+        """Valor da chave, carregado do banco na primeira vez"""
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._check_version(now)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[0]
+            self._stats['misses'] += 1
+            generation = self._generation
+
+        value = self.loader(key)
+
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (value, time.monotonic())
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        """Descarta as entradas deste processo"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._stats['invalidations'] += 1
+
+    def _check_version(self, now: float):
+        self._next_check = now + self.check_interval
+        try:
+            version = db.session.execute(
+                select(CacheVersion.version).where(CacheVersion.name == self.name)
+            ).scalar() or 0
+        except Exception as e:
+            logger.error(f"Erro ao ler a versão do cache {self.name}: {e}")
+            return
+
+        with self._lock:
+            self._stats['version_checks'] += 1
+            changed = self._version is not None and version != self._version
+            self._version = version
+        if changed:
+            self.clear()
+
+    def bump(self):
+        """Incrementa a versão compartilhada (outros processos se limpam) e limpa este"""
+        try:
+            with db.engine.begin() as connection:
+                values = {'version': CacheVersion.version + 1, 'updated_at': datetime.utcnow()}
+                result = connection.execute(
+                    update(CacheVersion).where(CacheVersion.name == self.name).values(**values)
+                )
+                if not result.rowcount:
+                    connection.execute(CacheVersion.__table__.insert().values(
+                        name=self.name, version=1, updated_at=datetime.utcnow()
+                    ))
+        except IntegrityError:
+            # Outro processo criou a linha ao mesmo tempo
+            with db.engine.begin() as connection:
+                connection.execute(update(CacheVersion).where(CacheVersion.name == self.name).values(
+                    version=CacheVersion.version + 1, updated_at=datetime.utcnow()
+                ))
+        except Exception as e:
+            logger.error(f"Erro ao incrementar a versão do cache {self.name}: {e}")
+        self.clear()
+
+    def get_stats(self) -> Dict:
+        """Retorna contadores de acerto/falha e ocupação"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['version'] = self._version
+
+        stats['max_entries'] = self.max_entries
+        total = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / total, 4) if total else 0.0
+        return stats
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_writes(session, flush_context):
+    if not _caches_by_model:
+        return
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        caches = _caches_by_model.get(type(instance))
+        if caches:
+            session.info.setdefault(_PENDING_KEY, set()).update(caches)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_after_commit(session):
+    for cache in session.info.pop(_PENDING_KEY, ()):
+        cache.bump()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_writes(session):
+    session.info.pop(_PENDING_KEY, None)
+
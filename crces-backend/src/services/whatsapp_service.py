@@ -1,11 +1,16 @@
 import requests
-import json
 import time
+import random
 import logging
-from datetime import datetime
+from email.utils import parsedate_to_datetime
 from typing import List, Dict, Optional
 import os
-from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from src.services.bulk_dispatcher import BulkDispatcher, LaneLimit
+from src.services.media_cache import MediaPayloadCache
+from src.services.rate_controller import AdaptiveRateController, SUCCESS, classify_http_status
+from src.services.template_renderer import render_variables, report_missing_variables
 
 logger = logging.getLogger(__name__)
 
@@ -16,18 +21,161 @@ class WhatsAppService:
         self.api_url = os.getenv('WHATSAPP_API_URL', 'http://localhost:8080')
         self.api_key = os.getenv('WHATSAPP_API_KEY', '')
         self.instance_name = os.getenv('WHATSAPP_INSTANCE', 'crces-instance')
+        
+        # Concorrência, timeouts e política de retentativa
+        self.max_in_flight = int(os.getenv('WHATSAPP_MAX_IN_FLIGHT', '4'))
+        self.timeout = (
+            float(os.getenv('WHATSAPP_CONNECT_TIMEOUT', '5')),
+            float(os.getenv('WHATSAPP_READ_TIMEOUT', '30'))
+        )
+        self.max_retries = int(os.getenv('WHATSAPP_MAX_RETRIES', '4'))
+        self.backoff_base = float(os.getenv('WHATSAPP_BACKOFF_BASE', '1'))
+        self.backoff_max = float(os.getenv('WHATSAPP_BACKOFF_MAX', '60'))
+        
+        # Sessão compartilhada entre threads: o pool do adapter comporta todos
+        # os envios simultâneos e bloqueia em vez de abrir conexões extras
         self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=self.max_in_flight + 2,
+            pool_block=True,
+            max_retries=0
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         
-        # Headers padrão
+        # Headers padrão (não devem ser alterados após a inicialização)
         self.session.headers.update({
             'Content-Type': 'application/json',
             'apikey': self.api_key
         })
+        
+        # Dispatcher com N envios simultâneos por instância
+        self.dispatcher = BulkDispatcher(
+            max_workers=self.max_in_flight,
+            default_limit=LaneLimit(concurrency=self.max_in_flight),
+            controller_factory=self._create_rate_controller
+        )
+        
+        # Arquivos codificados uma única vez para envios repetidos
+        self.media_cache = MediaPayloadCache(
+            max_bytes=int(os.getenv('WHATSAPP_MEDIA_CACHE_MB', '64')) * 1024 * 1024
+        )
+    
+    def _create_rate_controller(self, instance: str, limit: LaneLimit, default_interval: float) -> AdaptiveRateController:
+        """
+        Cria o controle adaptativo de taxa da instância
+        
+        Parte do limite da faixa (não do delay por mensagem das rotas), com
+        rajada do tamanho da concorrência para que os envios simultâneos
+        comecem juntos; os 429/503 da API reduzem a taxa a partir daí.
+        """
+        max_rate = limit.rate or float(os.getenv('WHATSAPP_MAX_RATE', '1'))
+        
+        return AdaptiveRateController(
+            initial_rate=max_rate,
+            min_rate=float(os.getenv('WHATSAPP_MIN_RATE', '0.05')),
+            max_rate=max_rate,
+            increase_step=float(os.getenv('WHATSAPP_RATE_STEP', '0.02')),
+            burst=limit.concurrency,
+            failure_threshold=float(os.getenv('WHATSAPP_PAUSE_FAILURE_RATE', '0.5')),
+            pause_seconds=float(os.getenv('WHATSAPP_PAUSE_SECONDS', '600'))
+        )
+    
+    def _classify_result(self, result: Dict) -> str:
+        """Desfecho de um envio para o controle de taxa"""
+        if result.get('success'):
+            return SUCCESS
+        return classify_http_status(result.get('status_code'))
+    
+    def get_rate_stats(self) -> Dict:
+        """Retorna a taxa atual e contadores do controle de taxa por instância"""
+        return self.dispatcher.get_stats()
+    
+    # Status que indicam que a requisição não foi processada e pode ser repetida
+    RETRY_STATUSES = (429, 503)
+    
+    # Métodos que podem ser repetidos mesmo se a API já os tiver recebido
+    IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+    
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """
+        Executa uma requisição na Evolution API com timeout e retentativas
+        
+        Repete em 429/503 (respeitando Retry-After) e em falhas de conexão,
+        com backoff exponencial e jitter. Um POST só é repetido se a falha
+        ocorreu antes do envio (conexão recusada, DNS, timeout de conexão):
+        uma conexão caída ou timeout de leitura depois do envio pode ter sido
+        processado pela API, e repetir enviaria a mensagem duas vezes.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        url = f"{self.api_url}{path}"
+        idempotent = method.upper() in self.IDEMPOTENT_METHODS
+        
+        for attempt in range(self.max_retries + 1):
+            is_last = attempt == self.max_retries
+            
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                if is_last or not (idempotent or self._not_sent(e)):
+                    raise
+                wait = self._backoff(attempt)
+                logger.warning(f"Falha de conexão com a Evolution API ({e}), nova tentativa em {wait:.1f}s")
+                time.sleep(wait)
+                continue
+            except requests.exceptions.Timeout as e:
+                if is_last or not idempotent:
+                    raise
+                wait = self._backoff(attempt)
+                logger.warning(f"Timeout na Evolution API ({e}), nova tentativa em {wait:.1f}s")
+                time.sleep(wait)
+                continue
+            
+            if response.status_code not in self.RETRY_STATUSES or is_last:
+                return response
+            
+            wait = self._retry_after(response)
+            if wait is None:
+                wait = self._backoff(attempt)
+            logger.warning(f"Evolution API respondeu {response.status_code}, nova tentativa em {wait:.1f}s")
+            time.sleep(wait)
+        
+        return response
+    
+    @staticmethod
+    def _not_sent(error: requests.exceptions.ConnectionError) -> bool:
+        """Se a falha de conexão ocorreu antes de a requisição ser enviada"""
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+    
+    def _backoff(self, attempt: int) -> float:
+        """Backoff exponencial com jitter completo"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    def _retry_after(self, response: requests.Response) -> Optional[float]:
+        """Interpreta o header Retry-After (segundos ou data HTTP)"""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        
+        try:
+            return min(self.backoff_max, max(0.0, float(value)))
+        except ValueError:
+            pass
+        
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return min(self.backoff_max, max(0.0, retry_at.timestamp() - time.time()))
+        except (TypeError, ValueError):
+            return None
     
     def check_connection(self) -> bool:
         """Verifica se a conexão com a API está funcionando"""
         try:
-            response = self.session.get(f"{self.api_url}/instance/connectionState/{self.instance_name}")
+            response = self._request('GET', f"/instance/connectionState/{self.instance_name}")
             if response.status_code == 200:
                 data = response.json()
                 return data.get('instance', {}).get('state') == 'open'
@@ -61,8 +209,9 @@ class WhatsAppService:
                 "text": message
             }
             
-            response = self.session.post(
-                f"{self.api_url}/message/sendText/{self.instance_name}",
+            response = self._request(
+                'POST',
+                f"/message/sendText/{self.instance_name}",
                 json=payload
             )
             
@@ -76,7 +225,8 @@ class WhatsAppService:
                 logger.error(f"Erro ao enviar mensagem: {response.status_code} - {response.text}")
                 return {
                     'success': False,
-                    'error': f"HTTP {response.status_code}: {response.text}"
+                    'error': f"HTTP {response.status_code}: {response.text}",
+                    'status_code': response.status_code
                 }
                 
         except Exception as e:
@@ -97,22 +247,19 @@ class WhatsAppService:
                     'error': 'Arquivo não encontrado'
                 }
             
-            # Lê o arquivo e converte para base64
-            import base64
-            with open(document_path, 'rb') as file:
-                file_data = base64.b64encode(file.read()).decode('utf-8')
-            
-            file_name = Path(document_path).name
+            # Arquivo em base64 (codificado apenas no primeiro envio)
+            media = self.media_cache.get(document_path)
             
             payload = {
                 "number": formatted_phone,
-                "media": file_data,
-                "fileName": file_name,
+                "media": media.data,
+                "fileName": media.file_name,
                 "caption": caption
             }
             
-            response = self.session.post(
-                f"{self.api_url}/message/sendMedia/{self.instance_name}",
+            response = self._request(
+                'POST',
+                f"/message/sendMedia/{self.instance_name}",
                 json=payload
             )
             
@@ -126,7 +273,8 @@ class WhatsAppService:
                 logger.error(f"Erro ao enviar documento: {response.status_code} - {response.text}")
                 return {
                     'success': False,
-                    'error': f"HTTP {response.status_code}: {response.text}"
+                    'error': f"HTTP {response.status_code}: {response.text}",
+                    'status_code': response.status_code
                 }
                 
         except Exception as e:
@@ -144,102 +292,82 @@ class WhatsAppService:
             recipients: Lista de destinatários com dados
             template: Template da mensagem com variáveis
             variables: Variáveis globais para substituição
-            delay: Delay entre envios em segundos
+            delay: Mantido por compatibilidade; o ritmo vem dos limites da
+                instância (WHATSAPP_MAX_IN_FLIGHT, WHATSAPP_MAX_RATE) e se
+                ajusta ao resultado. Se a instância for pausada por excesso de
+                falhas, os destinatários restantes retornam com 'paused': True
         """
-        results = []
+        def send_to_recipient(recipient: Dict, index: int) -> Dict:
+            # Substitui variáveis no template
+            message = self.replace_variables(template, recipient, variables)
+            
+            # Envia mensagem
+            result = self.send_text_message(recipient['phone'], message)
+            result['recipient'] = recipient
+            result['index'] = index
+            
+            # Log do resultado
+            if result['success']:
+                logger.info(f"Mensagem enviada para {recipient['phone']}: {result['message_id']}")
+            else:
+                logger.error(f"Falha ao enviar para {recipient['phone']}: {result['error']}")
+            
+            return result
         
-        for i, recipient in enumerate(recipients):
-            try:
-                # Substitui variáveis no template
-                message = self.replace_variables(template, recipient, variables)
-                
-                # Envia mensagem
-                result = self.send_text_message(recipient['phone'], message)
-                result['recipient'] = recipient
-                result['index'] = i
-                
-                results.append(result)
-                
-                # Log do resultado
-                if result['success']:
-                    logger.info(f"Mensagem enviada para {recipient['phone']}: {result['message_id']}")
-                else:
-                    logger.error(f"Falha ao enviar para {recipient['phone']}: {result['error']}")
-                
-                # Delay entre envios
-                if i < len(recipients) - 1:
-                    time.sleep(delay)
-                    
-            except Exception as e:
-                logger.error(f"Erro ao processar destinatário {recipient}: {e}")
-                results.append({
-                    'success': False,
-                    'error': str(e),
-                    'recipient': recipient,
-                    'index': i
-                })
+        if recipients:
+            report_missing_variables((template,), recipients[0], variables)
         
-        return results
+        return self.dispatcher.dispatch(
+            recipients,
+            send_to_recipient,
+            lane_func=lambda recipient: self.instance_name,
+            outcome_func=self._classify_result
+        )
     
     def send_bulk_documents(self, recipients: List[Dict], document_path: str, caption_template: str = "", delay: int = 3) -> List[Dict]:
         """Envia documentos em massa"""
-        results = []
+        def send_to_recipient(recipient: Dict, index: int) -> Dict:
+            # Substitui variáveis na legenda
+            caption = self.replace_variables(caption_template, recipient) if caption_template else ""
+            
+            # Envia documento
+            result = self.send_document(recipient['phone'], document_path, caption)
+            result['recipient'] = recipient
+            result['index'] = index
+            
+            # Log do resultado
+            if result['success']:
+                logger.info(f"Documento enviado para {recipient['phone']}: {result['message_id']}")
+            else:
+                logger.error(f"Falha ao enviar documento para {recipient['phone']}: {result['error']}")
+            
+            return result
         
-        for i, recipient in enumerate(recipients):
-            try:
-                # Substitui variáveis na legenda
-                caption = self.replace_variables(caption_template, recipient) if caption_template else ""
-                
-                # Envia documento
-                result = self.send_document(recipient['phone'], document_path, caption)
-                result['recipient'] = recipient
-                result['index'] = i
-                
-                results.append(result)
-                
-                # Log do resultado
-                if result['success']:
-                    logger.info(f"Documento enviado para {recipient['phone']}: {result['message_id']}")
-                else:
-                    logger.error(f"Falha ao enviar documento para {recipient['phone']}: {result['error']}")
-                
-                # Delay entre envios
-                if i < len(recipients) - 1:
-                    time.sleep(delay)
-                    
-            except Exception as e:
-                logger.error(f"Erro ao processar destinatário {recipient}: {e}")
-                results.append({
-                    'success': False,
-                    'error': str(e),
-                    'recipient': recipient,
-                    'index': i
-                })
+        if recipients:
+            report_missing_variables((caption_template,), recipients[0])
         
-        return results
+        return self.dispatcher.dispatch(
+            recipients,
+            send_to_recipient,
+            lane_func=lambda recipient: self.instance_name,
+            outcome_func=self._classify_result
+        )
+    
+    def get_media_cache_stats(self) -> Dict:
+        """Retorna métricas do cache de mídia"""
+        return self.media_cache.get_stats()
     
     def replace_variables(self, template: str, recipient: Dict, global_vars: Dict = None) -> str:
         """Substitui variáveis no template"""
-        message = template
-        
-        # Substitui variáveis do destinatário
-        for key, value in recipient.items():
-            placeholder = f"{{{{{key}}}}}"
-            message = message.replace(placeholder, str(value))
-        
-        # Substitui variáveis globais
-        if global_vars:
-            for key, value in global_vars.items():
-                placeholder = f"{{{{{key}}}}}"
-                message = message.replace(placeholder, str(value))
-        
-        return message
+        # Template compilado uma vez (cache) e montado com um único join
+        return render_variables(template, recipient, global_vars)
     
     def get_message_status(self, message_id: str) -> Dict:
         """Verifica status de uma mensagem"""
         try:
-            response = self.session.get(
-                f"{self.api_url}/chat/findMessages/{self.instance_name}",
+            response = self._request(
+                'GET',
+                f"/chat/findMessages/{self.instance_name}",
                 params={'id': message_id}
             )
             
@@ -266,8 +394,9 @@ class WhatsAppService:
         try:
             formatted_phone = self.format_phone_number(phone)
             
-            response = self.session.get(
-                f"{self.api_url}/chat/whatsappNumbers/{self.instance_name}",
+            response = self._request(
+                'GET',
+                f"/chat/whatsappNumbers/{self.instance_name}",
                 params={'numbers': [formatted_phone]}
             )
             
@@ -0,0 +1,89 @@
+import os
+import tempfile
+
+# Banco SQLite descartável e serviços em modo síncrono; precisa estar no
+# ambiente antes de importar src.main
+_DATABASE_DIR = tempfile.mkdtemp(prefix='crces-tests-')
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(_DATABASE_DIR, 'test.db')}",
+    'CAMPAIGN_SCHEDULER_ENABLED': 'false',
+    'AUDIT_SINK_MODE': 'sync',
+    'PASSWORD_HASH_WORKERS': '0',
+    'BCRYPT_LOG_ROUNDS': '4'
+})
+
+from contextlib import contextmanager
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from src.main import app as flask_app, create_initial_data
+from src.models.user import db, User
+from src.models.campaign import Campaign, CampaignType
+from src.services.outbox_service import CampaignOutbox
+
+
+@pytest.fixture(scope='session')
+def app():
+    with flask_app.app_context():
+        create_initial_data()
+    return flask_app
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def admin_headers(app):
+    with app.app_context():
+        admin = User.query.filter_by(username='admin').first()
+        token = create_access_token(identity=str(admin.id))
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture
+def campaign(app):
+    """Campanha de email e WhatsApp com mensagens pendentes na outbox"""
+    with app.app_context():
+        campaign = Campaign(name='Campanha de teste', type=CampaignType.BOTH, created_by=1)
+        db.session.add(campaign)
+        db.session.flush()
+        CampaignOutbox.enqueue(campaign.id, ['email', 'whatsapp'], [
+            {'name': f'Destinatário {i}', 'email': f'dest{i}@example.com', 'phone': f'2799999{i:04d}'}
+            for i in range(20)
+        ])
+        db.session.commit()
+        return campaign.id
+
+
+@contextmanager
+def recorded_statements(app):
+    """Lista (sql, parâmetros) de tudo o que o bloco executa no banco"""
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def statements(app):
+    """Fábrica de recorded_statements para a aplicação de teste"""
+    return lambda: recorded_statements(app)
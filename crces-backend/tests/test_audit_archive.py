@@ -0,0 +1,66 @@
+import gzip
+import json
+import os
+from datetime import date, datetime
+
+import pytest
+
+from src.models.user import db
+from src.models.audit import AuditArchive
+from src.services import audit_archive
+
+
+@pytest.fixture
+def archived_month(app, tmp_path, monkeypatch):
+    """Parte de janeiro/2001 no manifesto, com o arquivo em um ARCHIVE_DIR temporário"""
+    monkeypatch.setattr(audit_archive, 'ARCHIVE_DIR', str(tmp_path))
+    relative_path = os.path.join('2001', 'audit_2001_01_part001.jsonl.gz')
+    os.makedirs(tmp_path / '2001')
+    with gzip.open(tmp_path / relative_path, 'wt', encoding='utf-8') as archive:
+        archive.write(json.dumps({
+            'id': 1, 'action_type': 'LOGIN', 'resource_type': 'User', 'username': 'arquivado',
+            'success': True, 'event_count': 1, 'created_at': '2001-01-15T12:00:00'
+        }) + '\n')
+
+    with app.app_context():
+        entry = AuditArchive(
+            month=date(2001, 1, 1), part=1, path=relative_path, row_count=1,
+            min_log_id=1, max_log_id=1,
+            first_created_at=datetime(2001, 1, 15, 12), last_created_at=datetime(2001, 1, 15, 12),
+            size_bytes=os.path.getsize(tmp_path / relative_path), sha256='0' * 64
+        )
+        db.session.add(entry)
+        db.session.commit()
+        entry_id = entry.id
+
+    yield tmp_path / relative_path
+
+    with app.app_context():
+        db.session.delete(db.session.get(AuditArchive, entry_id))
+        db.session.commit()
+
+
+def test_relative_archive_dir_is_resolved_from_the_app_root():
+    assert os.path.isabs(audit_archive.ARCHIVE_DIR)
+    assert audit_archive.ARCHIVE_DIR.startswith(audit_archive.APP_ROOT)
+
+
+def test_listing_reads_archived_month(client, admin_headers, archived_month):
+    response = client.get('/api/audit/logs?date_from=2001-01-01&date_to=2001-02-01', headers=admin_headers)
+    assert response.status_code == 200
+    assert [log['username'] for log in response.get_json()['logs']] == ['arquivado']
+
+
+@pytest.mark.parametrize('request_args', [
+    ('get', '/api/audit/logs?date_from=2001-01-01&date_to=2001-02-01', None),
+    ('get', '/api/audit/logs?date_from=2001-01-01&date_to=2001-02-01&cursor=', None),
+    ('post', '/api/audit/logs/export', {'date_from': '2001-01-01', 'date_to': '2001-02-01'}),
+    ('post', '/api/audit/logs/export', {'date_from': '2001-01-01', 'date_to': '2001-02-01', 'format': 'csv'}),
+])
+def test_missing_archive_file_is_reported(client, admin_headers, archived_month, request_args):
+    method, url, body = request_args
+    os.remove(archived_month)
+
+    response = getattr(client, method)(url, json=body, headers=admin_headers)
+    assert response.status_code == 503
+    assert response.get_json()['message'] == 'Logs arquivados do período indisponíveis no servidor'
@@ -0,0 +1,20 @@
+import json
+
+import pytest
+
+from src.models.audit import AuditLog
+
+
+@pytest.mark.parametrize('export_format', ['csv', 'ndjson'])
+def test_streamed_export_is_audited_with_row_count(app, client, admin_headers, export_format):
+    response = client.post('/api/audit/logs/export', json={'format': export_format}, headers=admin_headers)
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    rows = len(body.strip().splitlines()) - (1 if export_format == 'csv' else 0)
+
+    with app.app_context():
+        log = AuditLog.query.filter_by(action_type='EXPORT', resource_type='AuditLog').order_by(
+            AuditLog.id.desc()
+        ).first()
+        assert log is not None
+        assert json.loads(log.new_values) == {'count': rows, 'format': export_format, 'filters': {'format': export_format}}
@@ -0,0 +1,52 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+from src.models.user import db
+from src.models.audit import AuditLog
+from src.services.audit_rollup import get_rollup_rows, roll_up_audit_logs
+from src.services.message_store import bulk_insert
+
+
+def _expected(day_from):
+    """Contagem de referência direto dos logs, um a um"""
+    counts = Counter()
+    for log in AuditLog.query.filter(AuditLog.created_at >= datetime.combine(day_from, datetime.min.time())):
+        key = (log.created_at.date(), log.action_type, log.resource_type, log.username, bool(log.success))
+        counts[key] += log.event_count or 1
+    return counts
+
+
+def _rows(day_from):
+    return Counter({(row.day, row.action_type, row.resource_type, row.username, row.success): row.count
+                    for row in get_rollup_rows(day_from)})
+
+
+def _seed(days_ago, recorded_minutes_ago=0):
+    now = datetime.utcnow()
+    bulk_insert(AuditLog, [
+        {'action_type': action, 'resource_type': 'Campaign', 'username': username, 'success': success,
+         'event_count': event_count, 'created_at': now - timedelta(days=days_ago, minutes=i),
+         'recorded_at': now - timedelta(minutes=recorded_minutes_ago)}
+        for i, (action, username, success, event_count) in enumerate([
+            ('UPDATE', 'admin', True, 1),
+            ('UPDATE', 'admin', True, 3),
+            ('DELETE', None, False, 1),
+            ('LOGIN', 'operador', True, None),
+        ])
+    ])
+    db.session.commit()
+
+
+def test_rollup_rows_match_raw_logs_before_and_after_rolling_up(app_context):
+    day_from = datetime.utcnow().date() - timedelta(days=10)
+    _seed(days_ago=2, recorded_minutes_ago=10)
+    _seed(days_ago=20, recorded_minutes_ago=10)
+
+    # Cauda ainda não agregada, somada no banco
+    assert _rows(day_from) == _expected(day_from)
+
+    roll_up_audit_logs()
+    # Logs recentes ficam para a próxima rodada e seguem na cauda
+    _seed(days_ago=0)
+
+    assert _rows(day_from) == _expected(day_from)
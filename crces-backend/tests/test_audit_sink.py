@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from src.models.user import db
+from src.models.audit import AuditLog
+from src.services.audit_sink import AuditSink
+
+
+def make_row(resource_type, index=0, **columns):
+    return dict({
+        'action_type': 'SINK_TEST',
+        'resource_type': resource_type,
+        'resource_id': str(index),
+        'created_at': datetime.utcnow()
+    }, **columns)
+
+
+def stored(app, resource_type):
+    with app.app_context():
+        rows = AuditLog.query.filter_by(resource_type=resource_type).order_by(AuditLog.id).all()
+        db.session.remove()
+    return rows
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def make_sink(app):
+    """Fábrica de AuditSink com thread própria (sem os ganchos de atexit/fork do init_app)"""
+    sinks = []
+
+    def factory(**options):
+        sink = AuditSink(**dict({'mode': 'buffered', 'flush_interval': 0.05}, **options))
+        sink.app = app
+        sink._start()
+        sinks.append(sink)
+        return sink
+
+    yield factory
+    for sink in sinks:
+        sink.shutdown()
+
+
+@pytest.fixture
+def stalled_sink(app):
+    """AuditSink com a thread de gravação parada: a fila só enche"""
+    release = threading.Event()
+    sink = AuditSink(mode='buffered', max_queue=2)
+    sink.app = app
+    sink._pid = os.getpid()
+    sink._thread = threading.Thread(target=release.wait, daemon=True)
+    sink._thread.start()
+    yield sink
+    release.set()
+    sink._thread.join()
+
+
+def test_full_batch_is_written_without_waiting_for_the_interval(app, make_sink):
+    sink = make_sink(batch_size=5, flush_interval=2)
+    for index in range(5):
+        sink.submit(AuditLog, make_row('SinkBatch', index))
+
+    assert wait_for(lambda: sink.get_stats()['written'] == 5, timeout=1)
+    assert [row.resource_id for row in stored(app, 'SinkBatch')] == ['0', '1', '2', '3', '4']
+    assert sink.get_stats()['batches'] == 1
+
+
+def test_partial_batch_is_written_after_the_interval(app, make_sink):
+    sink = make_sink(batch_size=100)
+    for index in range(3):
+        sink.submit(AuditLog, make_row('SinkInterval', index))
+
+    assert wait_for(lambda: len(stored(app, 'SinkInterval')) == 3)
+    assert sink.get_stats()['sync_writes'] == 0
+
+
+def test_full_queue_writes_synchronously(app, app_context, stalled_sink):
+    for index in range(4):
+        stalled_sink.submit(AuditLog, make_row('SinkOverflow', index))
+
+    stats = stalled_sink.get_stats()
+    assert (stats['enqueued'], stats['overflows'], stats['sync_writes']) == (2, 2, 2)
+    assert [row.resource_id for row in stored(app, 'SinkOverflow')] == ['2', '3']
+
+
+def test_expired_window_overflow_is_written_outside_the_lock(app, app_context, stalled_sink, monkeypatch):
+    stalled_sink.coalesce_rules = {'SINK_COALESCED': 0.01}
+    for index in range(2):
+        stalled_sink.submit(AuditLog, make_row('SinkFiller', index))
+
+    held = []
+    write_now = stalled_sink._write_now
+    monkeypatch.setattr(stalled_sink, '_write_now', lambda model, row: (
+        held.append(stalled_sink._coalesce_lock.locked()), write_now(model, row)
+    ))
+
+    stalled_sink.submit(AuditLog, make_row('SinkWindow', action_type='SINK_COALESCED'))
+    stalled_sink.submit(AuditLog, make_row('SinkWindow', action_type='SINK_COALESCED'))
+    time.sleep(0.02)
+    stalled_sink.submit(AuditLog, make_row('SinkWindow', action_type='SINK_COALESCED'))
+
+    assert held == [False]
+    assert [row.event_count for row in stored(app, 'SinkWindow')] == [2]
+
+
+def test_shutdown_writes_queue_and_open_windows(app, make_sink):
+    sink = make_sink(batch_size=100, flush_interval=0.2, coalesce_rules={'SINK_COALESCED': 300})
+    for index in range(3):
+        sink.submit(AuditLog, make_row('SinkShutdown', index))
+    for _ in range(4):
+        sink.submit(AuditLog, make_row('SinkShutdown', 'c', action_type='SINK_COALESCED'))
+
+    sink.shutdown()
+
+    assert not sink._thread.is_alive()
+    rows = stored(app, 'SinkShutdown')
+    assert sorted((row.resource_id, row.event_count) for row in rows) == [('0', 1), ('1', 1), ('2', 1), ('c', 4)]
+    assert sink.get_stats()['queue_size'] == 0
+
+
+def test_poison_row_is_dropped_and_the_rest_of_the_batch_written(app, make_sink):
+    sink = make_sink(batch_size=3, flush_interval=0.01)
+    sink.submit(AuditLog, make_row('SinkPoison', 0))
+    sink.submit(AuditLog, make_row('SinkPoison', 1, action_type=None))
+    sink.submit(AuditLog, make_row('SinkPoison', 2))
+
+    assert wait_for(lambda: sink.get_stats()['dropped'] == 1)
+    assert [row.resource_id for row in stored(app, 'SinkPoison')] == ['0', '2']
+
+    # A thread segue gravando depois do descarte
+    sink.submit(AuditLog, make_row('SinkPoison', 3))
+    assert wait_for(lambda: len(stored(app, 'SinkPoison')) == 3)
+    assert sink.get_stats()['written'] == 3
+
+
+def test_forked_child_starts_its_own_thread(make_sink):
+    sink = make_sink()
+    parent_thread = sink._thread
+
+    pid = os.fork()
+    if pid == 0:
+        # O gancho que o init_app registra com os.register_at_fork
+        sink._after_fork()
+        ok = sink._buffering() and sink._thread is not parent_thread and sink._pid == os.getpid()
+        os._exit(0 if ok else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert sink._buffering() and sink._thread is parent_thread
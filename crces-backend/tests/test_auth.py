@@ -0,0 +1,20 @@
+import pytest
+
+from src.services.rate_limiter import rate_limiter
+
+
+@pytest.mark.parametrize('payload', [
+    {'username': ['admin'], 'password': 'senha'},
+    {'username': {'$ne': ''}, 'password': 'senha'},
+    {'username': 123, 'password': 'senha'},
+    {'username': 'admin', 'password': ['senha']},
+    {'username': 'admin', 'password': 123},
+    ['admin', 'senha'],
+])
+def test_login_rejects_non_string_credentials_before_rate_limit(client, monkeypatch, payload):
+    def hit(*args):
+        raise AssertionError('rate limit consultado')
+    monkeypatch.setattr(rate_limiter, 'hit', hit)
+
+    response = client.post('/api/auth/login', json=payload)
+    assert response.status_code == 400
@@ -0,0 +1,67 @@
+import pytest
+
+from src.models.user import db, User, Role
+from src.services import versioned_cache as versioned_cache_module
+from src.services.authorization import load_permissions, permission_cache
+from src.services.versioned_cache import VersionedCache
+
+
+class FakeClock:
+    """Substitui time.monotonic() do módulo versioned_cache"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(versioned_cache_module, 'time', clock)
+    return clock
+
+
+def _cache_version_queries(recorded):
+    return sum(1 for statement, _ in recorded if 'FROM cache_version' in statement)
+
+
+def test_default_check_interval_is_nonzero():
+    assert permission_cache.check_interval > 0
+
+
+def test_checks_between_version_reads_do_not_query(app_context, clock, statements):
+    # Outro worker: mesmo contador de versão, cache próprio
+    worker = VersionedCache('permissions', load_permissions, check_interval=2)
+    admin = User.query.filter_by(username='admin').first()
+    assert 'manage_users' in worker.get(admin.id)
+
+    with statements() as recorded:
+        for _ in range(20):
+            worker.get(admin.id)
+    assert not recorded
+
+    clock.now += 2
+    with statements() as recorded:
+        worker.get(admin.id)
+    assert _cache_version_queries(recorded) == 1
+
+
+def test_removed_role_is_stale_for_at_most_the_check_interval(app_context, clock):
+    worker = VersionedCache('permissions', load_permissions, check_interval=2)
+    user = User(username='perde_role', email='perde_role@example.com', salt='s')
+    user.password_hash = 'x'
+    user.roles.append(Role.query.filter_by(name='admin').first())
+    db.session.add(user)
+    db.session.commit()
+    assert 'manage_users' in worker.get(user.id)
+
+    # Outro processo retira o role (o listener incrementa a versão no commit)
+    user.roles.clear()
+    db.session.commit()
+
+    clock.now += 1.9
+    assert 'manage_users' in worker.get(user.id)
+    clock.now += 0.1
+    assert 'manage_users' not in worker.get(user.id)
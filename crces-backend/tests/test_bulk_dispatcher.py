@@ -0,0 +1,51 @@
+from src.services.bulk_dispatcher import BulkDispatcher, LaneLimit
+from src.services.rate_controller import AdaptiveRateController
+
+
+def _dispatcher():
+    return BulkDispatcher(
+        max_workers=2,
+        default_limit=LaneLimit(concurrency=2),
+        controller_factory=lambda lane, limit, default_interval: AdaptiveRateController(
+            initial_rate=1000, max_rate=1000, burst=10, min_samples=4, pause_seconds=300
+        )
+    )
+
+
+def _send(success):
+    return lambda item, index: {'success': success, 'index': index}
+
+
+def _lane(item):
+    return 'provedor'
+
+
+def test_concurrent_sends_share_the_lane_controller():
+    dispatcher = _dispatcher()
+
+    dispatcher.dispatch(list(range(3)), _send(True), _lane)
+    dispatcher.dispatch(list(range(3)), _send(True), _lane)
+
+    stats = dispatcher.get_stats()
+    assert list(stats) == ['provedor']
+    assert stats['provedor']['successes'] == 6
+
+
+def test_pause_holds_until_reset():
+    dispatcher = _dispatcher()
+
+    results = dispatcher.dispatch(list(range(10)), _send(False), _lane)
+    assert any(result.get('paused') for result in results)
+
+    # Outro envio pelo mesmo provedor respeita a pausa
+    results = dispatcher.dispatch(list(range(3)), _send(True), _lane)
+    assert all(result.get('paused') for result in results)
+
+    # Job novo ou retomado: a pausa e a taxa reduzida ficam para trás
+    dispatcher.reset_controllers()
+    results = dispatcher.dispatch(list(range(3)), _send(True), _lane)
+    assert all(result['success'] for result in results)
+
+    stats = dispatcher.get_stats()['provedor']
+    assert not stats['paused'] and stats['rate'] >= 1000
+    assert stats['pauses'] == 1
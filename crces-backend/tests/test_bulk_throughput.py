@@ -0,0 +1,90 @@
+import os
+import time
+
+import pytest
+
+from src.models.user import db
+from src.models.campaign import Campaign, CampaignType, CampaignMessage, MessageStatus
+from src.services.outbox_service import CampaignOutbox
+
+# Meta de vazão da persistência em lote (linhas/s). Medido no SQLite local:
+# enqueue ~30-45 mil linhas/s, complete ~25-35 mil linhas/s, contra ~7-11 mil
+# linhas/s com um objeto ORM por mensagem. A meta fica abaixo da medição para
+# tolerar máquinas mais lentas; em SQL Server (fast_executemany) ajuste com
+# BULK_BENCHMARK_MIN_ROWS_PER_SECOND.
+MIN_ROWS_PER_SECOND = float(os.getenv('BULK_BENCHMARK_MIN_ROWS_PER_SECOND', '10000'))
+
+# O lote deve continuar bem à frente da gravação objeto a objeto
+MIN_SPEEDUP_OVER_ORM = 2.0
+
+ROWS = 10000
+RUNS = 3
+
+pytestmark = pytest.mark.benchmark
+
+
+def _recipients(count):
+    return [
+        {'name': f'Destinatário {i}', 'email': f'dest{i}@example.com', 'registry': f'ES-{i:06d}'}
+        for i in range(count)
+    ]
+
+
+def _new_campaign() -> int:
+    campaign = Campaign(name='Benchmark', type=CampaignType.EMAIL)
+    db.session.add(campaign)
+    db.session.commit()
+    return campaign.id
+
+
+def _best_rate(rows, run) -> float:
+    """Maior vazão (linhas/s) entre RUNS execuções; run recebe uma campanha nova"""
+    best = None
+    for _ in range(RUNS):
+        campaign_id = _new_campaign()
+        elapsed = run(campaign_id)
+        best = elapsed if best is None else min(best, elapsed)
+    return rows / best
+
+
+def _timed(function, *args) -> float:
+    started = time.perf_counter()
+    function(*args)
+    db.session.commit()
+    return time.perf_counter() - started
+
+
+def test_enqueue_throughput(app_context):
+    recipients = _recipients(ROWS)
+
+    def orm_add(campaign_id):
+        for recipient in recipients:
+            db.session.add(CampaignMessage(
+                campaign_id=campaign_id,
+                recipient_name=recipient['name'],
+                recipient_email=recipient['email'],
+                recipient_registry=recipient['registry'],
+                email_status=MessageStatus.PENDING
+            ))
+
+    bulk = _best_rate(ROWS, lambda campaign_id: _timed(CampaignOutbox.enqueue, campaign_id, ['email'], recipients))
+    orm = _best_rate(ROWS, lambda campaign_id: _timed(orm_add, campaign_id))
+
+    assert bulk >= MIN_ROWS_PER_SECOND, f'enqueue: {bulk:.0f} linhas/s'
+    assert bulk >= orm * MIN_SPEEDUP_OVER_ORM, f'enqueue: {bulk:.0f} linhas/s em lote, {orm:.0f} objeto a objeto'
+
+
+def test_complete_throughput(app_context):
+    recipients = _recipients(ROWS)
+
+    def complete(campaign_id):
+        CampaignOutbox.enqueue(campaign_id, ['email'], recipients)
+        db.session.commit()
+        outbox = CampaignOutbox(campaign_id, 'email', owner='benchmark')
+        items = outbox.claim(ROWS)
+        assert len(items) == ROWS
+        return _timed(outbox.complete, items, [{'success': True}] * ROWS)
+
+    rate = _best_rate(ROWS, complete)
+
+    assert rate >= MIN_ROWS_PER_SECOND, f'complete: {rate:.0f} linhas/s'
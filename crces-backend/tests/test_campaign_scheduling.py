@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.user import db
+from src.models.campaign import Campaign, CampaignType, CampaignStatus
+from src.models.template import EmailTemplate
+from src.services.campaign_scheduler import start_scheduled_campaign
+
+
+@pytest.fixture
+def email_template(app):
+    with app.app_context():
+        template = EmailTemplate(name='Agendamento', subject='Olá {{nome}}', html_content='<p>{{nome}}</p>')
+        db.session.add(template)
+        db.session.commit()
+        return template.id
+
+
+def _payload(email_template, **fields):
+    return {
+        'name': 'Campanha agendada',
+        'type': 'email',
+        'email_template_id': email_template,
+        'scheduled_at': (datetime.utcnow() + timedelta(days=1)).isoformat(),
+        **fields
+    }
+
+
+@pytest.mark.parametrize('criteria', [None, {}, {'recipients': []}, {'recipients': [{'nome': 'Sem email'}]}])
+def test_create_scheduled_campaign_requires_recipients(client, admin_headers, email_template, criteria):
+    payload = _payload(email_template, selection_criteria=criteria)
+
+    response = client.post('/api/campaigns/', json=payload, headers=admin_headers)
+
+    assert response.status_code == 400
+    assert 'selection_criteria.recipients' in response.get_json()['message']
+
+
+def test_create_scheduled_campaign_with_recipients(client, admin_headers, email_template):
+    payload = _payload(email_template, selection_criteria={'recipients': [{'email': 'a@example.com'}]})
+
+    response = client.post('/api/campaigns/', json=payload, headers=admin_headers)
+
+    assert response.status_code == 201
+    assert response.get_json()['campaign']['status'] == 'scheduled'
+
+
+def test_update_to_scheduled_requires_recipients(client, admin_headers, email_template):
+    draft = _payload(email_template)
+    del draft['scheduled_at']
+    campaign_id = client.post('/api/campaigns/', json=draft, headers=admin_headers).get_json()['campaign']['id']
+    scheduled_at = (datetime.utcnow() + timedelta(days=1)).isoformat()
+
+    response = client.put(f'/api/campaigns/{campaign_id}', json={'scheduled_at': scheduled_at}, headers=admin_headers)
+    assert response.status_code == 400
+
+    response = client.put(f'/api/campaigns/{campaign_id}', json={
+        'scheduled_at': scheduled_at,
+        'selection_criteria': {'recipients': [{'email': 'a@example.com'}]}
+    }, headers=admin_headers)
+    assert response.status_code == 200
+    assert response.get_json()['campaign']['status'] == 'scheduled'
+
+
+def test_scheduled_campaign_without_recipients_fails(app_context):
+    # Agendada antes da validação das rotas
+    campaign = Campaign(name='Sem destinatários', type=CampaignType.EMAIL, created_by=1,
+                        status=CampaignStatus.SCHEDULED, scheduled_at=datetime.utcnow() - timedelta(minutes=1))
+    db.session.add(campaign)
+    db.session.commit()
+
+    assert start_scheduled_campaign(campaign.id) is None
+
+    db.session.refresh(campaign)
+    assert campaign.status == CampaignStatus.FAILED
@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy import update
+
+from src.models.user import db
+from src.models.campaign import CampaignMessage, MessageStatus
+from src.services.outbox_service import CampaignOutbox
+
+
+@pytest.mark.parametrize('sane_multi_rowcount', [True, False])
+def test_complete_counts_only_rows_still_leased(app_context, campaign, monkeypatch, sane_multi_rowcount):
+    # pyodbc (fast_executemany) e psycopg2 não informam o rowcount do lote
+    monkeypatch.setattr(db.session.get_bind().dialect, 'supports_sane_multi_rowcount', sane_multi_rowcount)
+    outbox = CampaignOutbox(campaign, 'email', owner='test')
+    items = outbox.claim(6)
+
+    # Lease do primeiro item expirou e foi tomado por outro worker
+    db.session.execute(update(CampaignMessage).where(CampaignMessage.id == items[0].id).values(
+        email_lease_owner='outro-worker'
+    ))
+
+    results = [{'success': True}] * 3 + [{'success': False, 'error': 'recusado'}] * 3
+    assert outbox.complete(items, results) == (2, 3)
+    db.session.commit()
+
+    statuses = [db.session.get(CampaignMessage, item.id).email_status for item in items]
+    assert statuses == [MessageStatus.PENDING] + [MessageStatus.SENT] * 2 + [MessageStatus.FAILED] * 3
@@ -0,0 +1,23 @@
+import pytest
+
+from src.models.campaign import CampaignMessage
+from src.services.pagination import keyset_page
+
+
+@pytest.mark.parametrize('limit', [0, -5])
+def test_keyset_page_clamps_limit(app_context, campaign, limit):
+    query = CampaignMessage.query.filter_by(campaign_id=campaign)
+
+    page = keyset_page(query, CampaignMessage.created_at, CampaignMessage.id, None, limit)
+
+    assert len(page['items']) == 1
+    assert page['has_next'] and page['next_cursor']
+
+
+@pytest.mark.parametrize('limit', ['0', '-5', 'abc'])
+def test_cursor_listings_accept_any_limit(client, admin_headers, campaign, limit):
+    for url in (f'/api/campaigns/{campaign}/messages?cursor=&limit={limit}', f'/api/audit/logs?cursor=&limit={limit}'):
+        response = client.get(url, headers=admin_headers)
+
+        assert response.status_code == 200, url
+        assert response.get_json()['pagination']['limit'] >= 1
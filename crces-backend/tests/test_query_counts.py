@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.user import db, User, Role, Permission
+from src.models.template import EmailTemplate, WhatsAppTemplate
+from src.models.campaign import Campaign, CampaignType
+from src.models.audit import AuditLog
+from src.services.message_store import bulk_insert
+from src.services.outbox_service import CampaignOutbox
+
+# Consultas de infraestrutura com intervalo próprio (sincronização das
+# revogações, versões dos caches): variam com o tempo, não com a listagem
+IGNORED_TABLES = ('revoked_token', 'cache_version')
+
+
+def _count_queries(client, headers, statements, url) -> int:
+    """Consultas feitas por uma requisição (a primeira aquece os caches)"""
+    assert client.get(url, headers=headers).status_code == 200
+
+    with statements() as recorded:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+
+    return sum(
+        1 for statement, _ in recorded
+        if not any(f'FROM {table}' in statement or f'INTO {table}' in statement for table in IGNORED_TABLES)
+    )
+
+
+def _assert_constant(client, headers, statements, url, seed):
+    """O número de consultas não cresce com o número de linhas listadas"""
+    seed(3)
+    few = _count_queries(client, headers, statements, url)
+    seed(20)
+    many = _count_queries(client, headers, statements, url)
+    assert many == few, f'{url}: {few} consultas com poucas linhas, {many} com muitas (N+1?)'
+
+
+def _seed_users(app):
+    def seed(count):
+        with app.app_context():
+            role = Role.query.filter_by(name='operator_junior').first()
+            for _ in range(count):
+                number = User.query.count()
+                user = User(username=f'usuario{number}', email=f'usuario{number}@example.com', salt='s')
+                user.password_hash = 'x'
+                user.roles.append(role)
+                db.session.add(user)
+            db.session.commit()
+    return seed
+
+
+def _seed_roles(app):
+    def seed(count):
+        with app.app_context():
+            permissions = Permission.query.all()
+            for _ in range(count):
+                role = Role(name=f'role{Role.query.count()}', description='Role de teste')
+                role.permissions.extend(permissions[:3])
+                db.session.add(role)
+            db.session.commit()
+    return seed
+
+
+def _seed_templates(app, model, **content):
+    def seed(count):
+        with app.app_context():
+            for _ in range(count):
+                db.session.add(model(name=f'Template {model.query.count()}', **content))
+            db.session.commit()
+    return seed
+
+
+def _seed_campaigns(app):
+    def seed(count):
+        with app.app_context():
+            for _ in range(count):
+                db.session.add(Campaign(name=f'Campanha {Campaign.query.count()}', type=CampaignType.EMAIL))
+            db.session.commit()
+    return seed
+
+
+def _seed_messages(app, campaign_id):
+    def seed(count):
+        with app.app_context():
+            CampaignOutbox.enqueue(campaign_id, ['email'], [
+                {'name': 'Destinatário', 'email': f'dest{i}@example.com'} for i in range(count)
+            ])
+            db.session.commit()
+    return seed
+
+
+def _seed_audit_logs(app):
+    def seed(count):
+        with app.app_context():
+            now = datetime.utcnow()
+            bulk_insert(AuditLog, [
+                {'action_type': 'UPDATE', 'resource_type': 'Campaign', 'username': 'admin',
+                 'created_at': now - timedelta(minutes=i)}
+                for i in range(count)
+            ])
+            db.session.commit()
+    return seed
+
+
+def test_users_list_query_count(app, client, admin_headers, statements):
+    _assert_constant(client, admin_headers, statements, '/api/users/?per_page=100', _seed_users(app))
+
+
+def test_roles_list_query_count(app, client, admin_headers, statements):
+    _assert_constant(client, admin_headers, statements, '/api/users/roles', _seed_roles(app))
+
+
+@pytest.mark.parametrize('include_content', ['false', 'true'])
+def test_email_templates_list_query_count(app, client, admin_headers, statements, include_content):
+    seed = _seed_templates(app, EmailTemplate, subject='Assunto', html_content='<p>{{nome}}</p>')
+    _assert_constant(client, admin_headers, statements,
+                     f'/api/templates/email?per_page=100&include_content={include_content}', seed)
+
+
+@pytest.mark.parametrize('include_content', ['false', 'true'])
+def test_whatsapp_templates_list_query_count(app, client, admin_headers, statements, include_content):
+    seed = _seed_templates(app, WhatsAppTemplate, message_content='Olá {{nome}}')
+    _assert_constant(client, admin_headers, statements,
+                     f'/api/templates/whatsapp?per_page=100&include_content={include_content}', seed)
+
+
+def test_templates_list_without_content_does_not_select_content(client, admin_headers, statements):
+    with statements() as recorded:
+        assert client.get('/api/templates/email', headers=admin_headers).status_code == 200
+        assert client.get('/api/templates/whatsapp', headers=admin_headers).status_code == 200
+
+    # Só as consultas que trazem linhas (o COUNT da paginação não lê as colunas)
+    selects = [
+        statement for statement, _ in recorded
+        if '_template' in statement and not statement.startswith('SELECT count(')
+    ]
+    assert selects
+    for statement in selects:
+        assert 'html_content' not in statement and 'message_content' not in statement, statement
+
+
+def test_campaigns_list_query_count(app, client, admin_headers, statements):
+    _assert_constant(client, admin_headers, statements, '/api/campaigns/?per_page=100', _seed_campaigns(app))
+
+
+def test_campaign_messages_list_query_count(app, client, admin_headers, statements, campaign):
+    _assert_constant(client, admin_headers, statements,
+                     f'/api/campaigns/{campaign}/messages?per_page=200', _seed_messages(app, campaign))
+
+
+def test_audit_logs_list_query_count(app, client, admin_headers, statements):
+    _assert_constant(client, admin_headers, statements, '/api/audit/logs?per_page=100', _seed_audit_logs(app))
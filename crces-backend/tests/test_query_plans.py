@@ -0,0 +1,109 @@
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from src.models.user import db
+from src.models.campaign import Campaign, CampaignStatus
+from src.services.outbox_service import CampaignOutbox
+from src.services.campaign_scheduler import scheduler
+
+# Cada consulta frequente é capturada da execução real (rota ou serviço) e
+# repetida com EXPLAIN QUERY PLAN no SQLite, com os mesmos parâmetros
+
+
+def _plan(statement, parameters) -> str:
+    rows = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+    return ' | '.join(row[-1] for row in rows)
+
+
+def _plans(recorded, table: str, contains: str = '') -> list:
+    """Planos das consultas sobre a tabela (que contêm o trecho informado)"""
+    plans = [
+        _plan(statement, parameters)
+        for statement, parameters in recorded
+        if f'FROM {table}' in statement and contains in statement and not statement.startswith('INSERT')
+    ]
+    assert plans, f'nenhuma consulta em {table} contendo {contains!r} foi executada'
+    return plans
+
+
+def _assert_uses(plans: list, index: str):
+    for plan in plans:
+        assert re.search(rf'INDEX {index}\b', plan), plan
+
+
+def test_campaign_messages_listing_uses_campaign_created_index(app, client, admin_headers, campaign, statements):
+    for query_string in ('', '?cursor=', '?cursor=&status=pending'):
+        with statements() as recorded:
+            response = client.get(f'/api/campaigns/{campaign}/messages{query_string}', headers=admin_headers)
+        assert response.status_code == 200
+
+        with app.app_context():
+            _assert_uses(_plans(recorded, 'campaign_message', 'ORDER BY'),
+                         'ix_campaign_message_campaign_created_id')
+
+
+@pytest.mark.parametrize('channel', ['email', 'whatsapp'])
+def test_outbox_pending_count_uses_status_index(app_context, campaign, statements, channel):
+    outbox = CampaignOutbox(campaign, channel, owner='test')
+    with statements() as recorded:
+        assert outbox.pending_count() == 20
+
+    _assert_uses(_plans(recorded, 'campaign_message'), f'ix_campaign_message_campaign_{channel}_status')
+
+
+@pytest.mark.parametrize('channel', ['email', 'whatsapp'])
+def test_outbox_claim_uses_status_index(app_context, campaign, statements, channel):
+    outbox = CampaignOutbox(campaign, channel, owner='test')
+    with statements() as recorded:
+        assert len(outbox.claim(5)) == 5
+
+    _assert_uses(_plans(recorded, 'campaign_message', 'LIMIT'), f'ix_campaign_message_campaign_{channel}_status')
+
+
+@pytest.mark.parametrize('channel', ['email', 'whatsapp'])
+def test_outbox_next_lease_expiry_uses_partial_lease_index(app_context, campaign, statements, channel):
+    outbox = CampaignOutbox(campaign, channel, owner='test')
+    outbox.claim(5)
+    with statements() as recorded:
+        assert outbox.next_lease_expiry() is not None
+
+    _assert_uses(_plans(recorded, 'campaign_message'), f'ix_campaign_message_{channel}_leased')
+
+
+def test_scheduler_reload_uses_status_scheduled_index(app, campaign, statements):
+    with app.app_context():
+        db.session.execute(update(Campaign).where(Campaign.id == campaign).values(
+            status=CampaignStatus.SCHEDULED,
+            scheduled_at=datetime.utcnow() + timedelta(hours=1)
+        ))
+        db.session.commit()
+
+    with statements() as recorded:
+        scheduler.reload()
+
+    with app.app_context():
+        _assert_uses(_plans(recorded, 'campaign'), 'ix_campaign_status_scheduled_at')
+
+
+def test_audit_log_listing_uses_created_index(app, client, admin_headers, statements):
+    date_from = (datetime.utcnow() - timedelta(days=7)).isoformat()
+    for query_string in (f'?date_from={date_from}', f'?date_from={date_from}&cursor='):
+        with statements() as recorded:
+            response = client.get(f'/api/audit/logs{query_string}', headers=admin_headers)
+        assert response.status_code == 200
+
+        with app.app_context():
+            _assert_uses(_plans(recorded, 'audit_log', 'ORDER BY'), 'ix_audit_log_created_id')
+
+
+def test_audit_health_counters_use_action_and_failure_indexes(app, client, admin_headers, statements):
+    with statements() as recorded:
+        response = client.get('/api/audit/health', headers=admin_headers)
+    assert response.status_code == 200
+
+    with app.app_context():
+        _assert_uses(_plans(recorded, 'audit_log', "action_type = ?"), 'ix_audit_log_action_created')
+        _assert_uses(_plans(recorded, 'audit_log', "success = 0"), 'ix_audit_log_failures')
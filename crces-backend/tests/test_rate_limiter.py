@@ -0,0 +1,131 @@
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')
+
+from src.services import rate_limiter as rate_limiter_module
+from src.services.rate_limiter import MemoryRateLimitBackend, RateLimiter, RedisRateLimitBackend
+
+WINDOW = 60.0
+LIMIT = 10
+
+# Início de um balde (múltiplo exato da janela)
+START = 1_000_000 * WINDOW
+
+
+class FakeClock:
+    """Substitui o módulo time do rate_limiter: time() e monotonic() andam juntos"""
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock(START)
+    monkeypatch.setattr(rate_limiter_module, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def _backend(server, prefix='ratelimit') -> RedisRateLimitBackend:
+    """Backend de um worker: conexão própria ao mesmo servidor Redis"""
+    return RedisRateLimitBackend('redis://fake', prefix=prefix, client=fakeredis.FakeRedis(server=server))
+
+
+def _hits(backend, count, key='login:user'):
+    return [backend.hit(key, LIMIT, WINDOW) for _ in range(count)]
+
+
+def test_allows_up_to_limit_then_blocks(clock, server):
+    backend = _backend(server)
+
+    results = _hits(backend, LIMIT + 1)
+
+    assert all(allowed for allowed, _ in results[:LIMIT])
+    allowed, retry_after = results[LIMIT]
+    assert not allowed
+    assert 0 < retry_after <= 2 * WINDOW
+
+
+def test_window_edge_weights_previous_bucket(clock, server):
+    backend = _backend(server)
+
+    # Limite esgotado no fim de um balde
+    clock.now = START + WINDOW - 0.1
+    assert all(allowed for allowed, _ in _hits(backend, LIMIT))
+
+    # Virada do balde: o anterior ainda cobre a janela inteira
+    clock.now = START + WINDOW
+    assert not backend.hit('login:user', LIMIT, WINDOW)[0]
+
+    # Metade da janela: o anterior pesa 5, sobram 5
+    clock.now = START + WINDOW * 1.5
+    results = _hits(backend, 6)
+    assert [allowed for allowed, _ in results] == [True] * 5 + [False]
+
+    # Duas janelas depois nada do que foi contado pesa mais
+    clock.now = START + WINDOW * 3
+    assert all(allowed for allowed, _ in _hits(backend, LIMIT))
+
+
+def test_matches_memory_backend_decisions(clock, server):
+    redis_backend = _backend(server)
+    memory_backend = MemoryRateLimitBackend()
+
+    for offset in (0, 10, 59.9, 60, 75, 90, 119.9, 121, 185, 300):
+        clock.now = START + offset
+        for _ in range(4):
+            redis_allowed, redis_retry = redis_backend.hit('k', LIMIT, WINDOW)
+            memory_allowed, memory_retry = memory_backend.hit('k', LIMIT, WINDOW)
+            assert redis_allowed == memory_allowed, offset
+            assert redis_retry == pytest.approx(memory_retry, abs=0.01), offset
+
+
+def test_workers_share_counters(clock, server):
+    workers = [RateLimiter(_backend(server)) for _ in range(3)]
+
+    decisions = [workers[index % 3].hit('login:user', LIMIT, WINDOW)[0] for index in range(LIMIT + 3)]
+
+    assert decisions == [True] * LIMIT + [False] * 3
+    # Nenhum worker caiu para a memória local
+    assert all(worker.get_stats()['backend_errors'] == 0 for worker in workers)
+
+
+def test_keys_and_prefixes_are_isolated(clock, server):
+    first, other_prefix = _backend(server), _backend(server, prefix='other')
+
+    assert all(allowed for allowed, _ in _hits(first, LIMIT, key='a'))
+    assert not first.hit('a', LIMIT, WINDOW)[0]
+    assert first.hit('b', LIMIT, WINDOW)[0]
+    assert other_prefix.hit('a', LIMIT, WINDOW)[0]
+
+
+def test_bucket_keys_expire_after_two_windows(clock, server):
+    backend = _backend(server)
+    backend.hit('login:user', LIMIT, WINDOW)
+
+    client = fakeredis.FakeRedis(server=server)
+    keys = client.keys('ratelimit:login:user:*')
+    assert len(keys) == 1
+    assert 0 < client.pttl(keys[0]) <= WINDOW * 2 * 1000
+
+
+def test_falls_back_to_memory_when_redis_is_down(clock, server):
+    limiter = RateLimiter(_backend(server))
+    server.connected = False
+
+    decisions = [limiter.hit('login:user', LIMIT, WINDOW)[0] for _ in range(LIMIT + 1)]
+
+    assert decisions == [True] * LIMIT + [False]
+    assert limiter.get_stats()['backend_errors'] == LIMIT + 1
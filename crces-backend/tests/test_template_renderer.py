@@ -0,0 +1,128 @@
+import importlib.util
+import random
+from collections import ChainMap
+from pathlib import Path
+
+import pytest
+
+from src.services.template_renderer import CompiledTemplate, PLACEHOLDER_ANY
+
+# Cópia do backend (só biblioteca padrão): carregada pelo caminho, pois o
+# pacote também se chama src
+_BACKEND_RENDERER = Path(__file__).resolve().parents[2] / 'backend' / 'src' / 'services' / 'template_renderer.py'
+_spec = importlib.util.spec_from_file_location('backend_template_renderer', _BACKEND_RENDERER)
+backend_renderer = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(backend_renderer)
+
+
+# Laços com str.replace substituídos pelos templates compilados
+
+def replace_double(template, recipient, global_vars=None):
+    """EmailService/WhatsAppService.replace_variables"""
+    content = template
+    for key, value in recipient.items():
+        content = content.replace(f"{{{{{key}}}}}", str(value))
+    if global_vars:
+        for key, value in global_vars.items():
+            content = content.replace(f"{{{{{key}}}}}", str(value))
+    return content
+
+
+def replace_any(template, variables):
+    """EmailTemplate/WhatsAppTemplate.render"""
+    for name, value in variables.items():
+        str_value = str(value) if value is not None else ''
+        template = template.replace(f'{{{{{name}}}}}', str_value)
+        template = template.replace(f'{{{name}}}', str_value)
+    return template
+
+
+def replace_single(template, variables):
+    """Template.render do backend"""
+    for key, value in variables.items():
+        template = template.replace('{' + key + '}', str(value))
+    return template
+
+
+def render_any(template, variables):
+    return CompiledTemplate(template, PLACEHOLDER_ANY).render(
+        variables, lambda value: str(value) if value is not None else ''
+    )
+
+
+def render_double(template, recipient, global_vars=None):
+    return CompiledTemplate(template).render(ChainMap(recipient, global_vars) if global_vars else recipient)
+
+
+def render_single(template, variables):
+    return backend_renderer.CompiledTemplate(template).render(variables)
+
+
+NAMES = ['nome', 'email', 'x', 'valor_total']
+TOKENS = NAMES + ['{', '}', '{{', '}}', ' ', 'Olá ', '<p>', '</p>', '{ color: red }', 'body {margin: 0}', '\n']
+
+
+def _random_case(rng):
+    template = ''.join(rng.choice(TOKENS) for _ in range(rng.randint(0, 30)))
+    # Valores sem chaves e com '#', que nomes de variável não têm: nenhum valor
+    # inserido forma um placeholder novo com o texto ao redor
+    variables = {name: f'#{rng.randint(0, 99)}' for name in NAMES if rng.random() < 0.7}
+    return template, variables
+
+
+CASES = [
+    ('Olá {{nome}}, seu email é {{email}}', {'nome': 'Ana', 'email': 'ana@example.com'}),
+    ('{{{x}}}', {'x': 'valor'}),
+    ('{{{{x}}}}', {'x': 'valor'}),
+    ('{x}} {{x}', {'x': 'valor'}),
+    ('<style>body { color: red } .a {margin:0}</style>{{nome}}', {'nome': 'Ana'}),
+    ('Olá {{nome}} {{sem_valor}} {sem_valor}', {'nome': 'Ana'}),
+    ('{{nome}}{nome}{{nome}', {'nome': 'Ana'}),
+    ('', {'nome': 'Ana'}),
+    ('Sem variáveis', {}),
+]
+
+
+@pytest.mark.parametrize('template, variables', CASES)
+def test_curated_cases_match_replace_loops(template, variables):
+    assert render_double(template, variables) == replace_double(template, variables)
+    assert render_any(template, variables) == replace_any(template, variables)
+    assert render_single(template, variables) == replace_single(template, variables)
+
+
+def test_random_templates_match_replace_loops():
+    rng = random.Random(20261017)
+    for _ in range(3000):
+        template, variables = _random_case(rng)
+        assert render_double(template, variables) == replace_double(template, variables), (template, variables)
+        assert render_any(template, variables) == replace_any(template, variables), (template, variables)
+        assert render_single(template, variables) == replace_single(template, variables), (template, variables)
+
+
+def test_recipient_values_take_precedence_over_globals():
+    recipient, global_vars = {'nome': 'Ana'}, {'nome': 'Global', 'data': '01/01'}
+    template = '{{nome}} em {{data}}'
+
+    assert render_double(template, recipient, global_vars) == replace_double(template, recipient, global_vars)
+    assert render_double(template, recipient, global_vars) == 'Ana em 01/01'
+
+
+def test_none_values_render_empty():
+    assert render_any('Olá {nome}!', {'nome': None}) == replace_any('Olá {nome}!', {'nome': None}) == 'Olá !'
+
+
+# Desvio documentado: os laços antigos varriam de novo os valores já
+# inseridos; os templates compilados inserem os valores como estão
+
+def test_values_are_not_expanded_again():
+    recipient = {'nome': '{{cpf}}', 'cpf': '123.456.789-00'}
+
+    assert replace_double('Olá {{nome}}', recipient) == 'Olá 123.456.789-00'
+    assert render_double('Olá {{nome}}', recipient) == 'Olá {{cpf}}'
+
+
+def test_substitution_does_not_form_new_placeholders():
+    variables = {'z': '', 'y': 'Y'}
+
+    assert replace_any('{{y{z}}', variables) == '{Y'
+    assert render_any('{{y{z}}', variables) == '{{y}'
@@ -0,0 +1,86 @@
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.user import db, RevokedToken
+from src.services import token_verification as token_verification_module
+from src.services.token_verification import RevocationList
+
+
+class FakeClock:
+    """Substitui time.monotonic() do módulo; time() continua o real"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return time.time()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(token_verification_module, 'time', clock)
+    return clock
+
+
+def _payload(user_id=1):
+    return {'jti': uuid.uuid4().hex, 'sub': str(user_id), 'iat': int(time.time()) - 60}
+
+
+def test_revoking_worker_applies_immediately(app_context, clock):
+    worker = RevocationList(sync_interval=5)
+    payload = _payload()
+
+    worker.revoke_token(payload['jti'], 1)
+
+    assert worker.is_revoked(payload)
+
+
+def test_other_workers_see_revocation_within_sync_interval(app_context, clock):
+    revoking, other = RevocationList(sync_interval=5), RevocationList(sync_interval=5)
+    payload = _payload()
+    assert not other.is_revoked(payload)
+
+    revoking.revoke_token(payload['jti'], 1)
+
+    # Dentro do intervalo o outro worker ainda aceita o token
+    clock.now += 4.9
+    assert not other.is_revoked(payload)
+
+    # Passado o intervalo a revogação vale em todos
+    clock.now += 0.1
+    assert other.is_revoked(payload)
+
+
+def test_zero_sync_interval_revokes_immediately_everywhere(app_context, clock):
+    revoking, other = RevocationList(sync_interval=0), RevocationList(sync_interval=0)
+    payload = _payload(user_id=2)
+    assert not other.is_revoked(payload)
+
+    revoking.revoke_user(2)
+
+    assert other.is_revoked(payload)
+    assert other.get_stats()['sync_interval'] == 0
+
+
+def test_late_commit_with_lower_id_is_not_missed(app_context, clock):
+    worker = RevocationList(sync_interval=0, settle_seconds=60)
+    early, late = _payload(), _payload()
+    now = datetime.utcnow()
+
+    # Outra transação já confirmou um id maior...
+    db.session.add(RevokedToken(id=900001, jti=early['jti'], revoked_at=now, expires_at=now + timedelta(hours=1)))
+    db.session.commit()
+    assert worker.is_revoked(early)
+
+    # ...e um id menor, gravado antes, só fica visível depois
+    db.session.add(RevokedToken(id=900000, jti=late['jti'], revoked_at=now - timedelta(seconds=5),
+                                expires_at=now + timedelta(hours=1)))
+    db.session.commit()
+    assert worker.is_revoked(late)
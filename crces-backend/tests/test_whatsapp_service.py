@@ -0,0 +1,75 @@
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from src.services import whatsapp_service as whatsapp_service_module
+from src.services.whatsapp_service import WhatsAppService
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(whatsapp_service_module.time, 'sleep', lambda seconds: None)
+    return WhatsAppService()
+
+
+def _refused():
+    """Falha antes do envio: a conexão nem foi aberta"""
+    reason = NewConnectionError(None, 'Connection refused')
+    return requests.exceptions.ConnectionError(MaxRetryError(None, '/message', reason))
+
+
+def _dropped():
+    """Conexão caída depois do envio: a API pode ter processado a requisição"""
+    return requests.exceptions.ConnectionError(ProtocolError('Connection aborted.'))
+
+
+def _ok():
+    response = requests.Response()
+    response.status_code = 200
+    return response
+
+
+def _session(monkeypatch, service, outcomes):
+    calls = []
+
+    def request(method, url, **kwargs):
+        calls.append(method)
+        outcome = outcomes[len(calls) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(service.session, 'request', request)
+    return calls
+
+
+def test_post_is_retried_when_not_sent(monkeypatch, service):
+    calls = _session(monkeypatch, service, [_refused(), requests.exceptions.ConnectTimeout(), _ok()])
+
+    assert service._request('POST', '/message/sendText/x').status_code == 200
+    assert len(calls) == 3
+
+
+@pytest.mark.parametrize('error', [_dropped(), requests.exceptions.ReadTimeout()])
+def test_post_is_not_retried_after_it_may_have_been_sent(monkeypatch, service, error):
+    calls = _session(monkeypatch, service, [error, _ok()])
+
+    with pytest.raises(requests.exceptions.RequestException):
+        service._request('POST', '/message/sendText/x')
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize('error', [_dropped(), requests.exceptions.ReadTimeout()])
+def test_get_is_retried_on_any_connection_failure(monkeypatch, service, error):
+    calls = _session(monkeypatch, service, [error, _ok()])
+
+    assert service._request('GET', '/instance/connectionState/x').status_code == 200
+    assert len(calls) == 2
+
+
+def test_rate_controller_starts_from_lane_limits(service):
+    controller = service.dispatcher.get_controller(service.instance_name, default_interval=2)
+
+    # O delay antigo das rotas (2s) não limita mais a taxa inicial
+    assert controller.rate == controller.max_rate
+    assert controller.burst == service.max_in_flight